@@ -1,39 +1,131 @@
 # algorithms.py
 import math
+from pixel_buffer import PixelBuffer
 
 def get_connected_pixels(grid, start_r, start_c):
     """
-    Performs a Breadth-First Search (BFS) to find all connected pixels 
-    matching the color at (start_r, start_c).
+    Finds all pixels 4-connected to (start_r, start_c) with exactly its color.
     
+    `grid` may be a PixelBuffer or a list-of-rows grid.
     Returns: A list of (r, c) tuples.
     """
-    rows = len(grid)
-    cols = len(grid[0]) if rows > 0 else 0
-    
-    target_color = grid[start_r][start_c]
-    
-    queue = [(start_r, start_c)]
-    visited = set()
-    connected_pixels = []
-    
-    # Standard BFS Loop
-    while queue:
-        r, c = queue.pop(0)
-        
-        if (r, c) in visited: continue
-        visited.add((r, c))
-        
-        if grid[r][c] == target_color:
-            connected_pixels.append((r, c))
-            
-            # Check Neighbors (Up, Down, Left, Right)
-            if r > 0: queue.append((r-1, c))
-            if r < rows - 1: queue.append((r+1, c))
-            if c > 0: queue.append((r, c-1))
-            if c < cols - 1: queue.append((r, c+1))
-            
-    return connected_pixels
+    return flood_fill(grid, start_r, start_c)[0]
+
+def flood_fill(grid, start_r, start_c, connectivity=4, tolerance=0, contiguous=True):
+    """
+    Scanline flood fill. Finds the pixels matching the color at (start_r, start_c).
+
+    connectivity: 4 or 8 (diagonal neighbours also connect).
+    tolerance:    max per-channel RGB difference (0-255) still counted as a match.
+    contiguous:   False selects every matching pixel in the grid (global mode).
+
+    Returns: (pixels, bounds) where pixels is a list of (r, c) tuples and
+    bounds is the (r1, c1, r2, c2) bounding box, or None if nothing matched.
+    """
+    buf = PixelBuffer.from_grid(grid) if isinstance(grid, list) else grid
+    rows, cols, data = buf.rows, buf.cols, buf.data
+    if not (0 <= start_r < rows and 0 <= start_c < cols):
+        return [], None
+
+    # Matching is decided once per palette index, not once per pixel
+    match = match_table(buf.colors, buf.colors[data[start_r * cols + start_c]], tolerance)
+
+    if not contiguous:
+        pixels = [(pos // cols, pos % cols) for pos, idx in enumerate(data) if match[idx]]
+        return pixels, _pixel_bounds(pixels)
+
+    visited = bytearray(rows * cols)
+    spans, bounds = scan_spans(data, rows, cols, start_r, start_c, match, connectivity,
+                               visited, bytearray(b"\x01") * cols)
+    pixels = [(r, x) for r, lo, hi in spans for x in range(lo, hi + 1)]
+    return pixels, bounds
+
+def scan_spans(data, rows, cols, start_r, start_c, match, connectivity, visited, stamp):
+    """
+    Scanline core shared by flood_fill and the RegionIndex.
+
+    Cells are free while visited[pos] == 0; every span found is marked by
+    copying a slice of `stamp` (same type as `visited`, at least `cols` long).
+    Returns (spans, bounds): spans are (r, lo, hi) runs, inclusive.
+    """
+    spans = []
+    min_r = max_r = start_r
+    min_c = max_c = start_c
+    reach = 1 if connectivity == 8 else 0
+    stack = [(start_r, start_c)]
+
+    while stack:
+        r, c = stack.pop()
+        base = r * cols
+        if visited[base + c] or not match[data[base + c]]: continue
+
+        # 1. Extend the span left and right as far as it matches
+        lo = hi = c
+        while lo > 0 and not visited[base + lo - 1] and match[data[base + lo - 1]]: lo -= 1
+        while hi < cols - 1 and not visited[base + hi + 1] and match[data[base + hi + 1]]: hi += 1
+        visited[base + lo:base + hi + 1] = stamp[:hi - lo + 1]
+        spans.append((r, lo, hi))
+
+        if r < min_r: min_r = r
+        if r > max_r: max_r = r
+        if lo < min_c: min_c = lo
+        if hi > max_c: max_c = hi
+
+        # 2. Seed one point per matching run in the rows above and below
+        x1, x2 = max(lo - reach, 0), min(hi + reach, cols - 1)
+        for nr in (r - 1, r + 1):
+            if not (0 <= nr < rows): continue
+            nbase = nr * cols
+            in_run = False
+            for x in range(x1, x2 + 1):
+                if not visited[nbase + x] and match[data[nbase + x]]:
+                    if not in_run:
+                        stack.append((nr, x))
+                        in_run = True
+                else:
+                    in_run = False
+
+    return spans, (min_r, min_c, max_r, max_c)
+
+def match_table(colors, target, tolerance=0):
+    """Returns a bytearray flagging which palette indices match `target`."""
+    if tolerance <= 0:
+        return bytearray(1 if color == target else 0 for color in colors)
+    target_rgb = _hex_to_rgb(target)
+    table = bytearray(len(colors))
+    for i, color in enumerate(colors):
+        rgb = _hex_to_rgb(color)
+        if color == target:
+            table[i] = 1
+        elif rgb and target_rgb:
+            table[i] = max(abs(a - b) for a, b in zip(rgb, target_rgb)) <= tolerance
+    return table
+
+def _hex_to_rgb(color):
+    """Parses '#RRGGBB' (or '#RGB') into a tuple; returns None for anything else."""
+    digits = color.lstrip("#")
+    if len(digits) == 3: digits = "".join(ch * 2 for ch in digits)
+    if len(digits) != 6: return None
+    try:
+        return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        return None
+
+def _pixel_bounds(pixels):
+    if not pixels: return None
+    return (min(p[0] for p in pixels), min(p[1] for p in pixels),
+            max(p[0] for p in pixels), max(p[1] for p in pixels))
+
+def get_polyline_pixels(points):
+    """
+    Returns the cells of the Bresenham lines joining consecutive (r, c)
+    points, each cell once, in stroke order (no gaps between segments).
+    """
+    pixels = list(points[:1])
+    for (r1, c1), (r2, c2) in zip(points, points[1:]):
+        if (r1, c1) != (r2, c2):
+            pixels += get_line_pixels(r1, c1, r2, c2)[1:]
+    return list(dict.fromkeys(pixels))
 
 def get_line_pixels(start_r, start_c, end_r, end_c):
     """
@@ -1,6 +1,25 @@
 # animation_preview.py
 import tkinter as tk
-from settings import EMPTY_COLOR
+from collections import OrderedDict
+from document import _union_rect
+from onion import OnionSkins
+from settings import ONION_RANGE, PREVIEW_CACHE_PIXELS
+
+def color_runs(buf, r1, c1, r2, c2):
+    """Yields (r, c, colors) for each horizontal run of non-empty cells in the region."""
+    colors, data, cols = buf.colors, buf.data, buf.cols
+    for r in range(r1, r2 + 1):
+        start = r * cols
+        run = None
+        for c, idx in enumerate(data[start + c1:start + c2 + 1], c1):
+            if idx:
+                if run is None: run, cells = c, []
+                cells.append(colors[idx])
+            elif run is not None:
+                yield r, run, cells
+                run = None
+        if run is not None:
+            yield r, run, cells
 
 class AnimationPreview:
     def __init__(self, app_ref):
@@ -9,8 +28,19 @@ class AnimationPreview:
         self.current_frame_index = 0
         self.timer_id = None
         self.cached_frames = [] 
-        self.pixel_cache = []       
-        self.onion_cache = []      
+        self.frame_tabs = []        # EditorTab behind each cached frame
+        self.shown_frame_index = 0  # Frame currently drawn on the canvas
+        self.frame_versions = []    # Per cached frame: bumped whenever it changes
+        self.frame_dirty = []       # Per cached frame: cells changed since its image was rendered
+        self.images = OrderedDict() # ("frame" / "onion", frame) -> [PhotoImage at preview_scale, version],
+                                    # least recently shown first
+        self.image_pixels = 0       # Total size of images
+        self.frame_item = None      # The one canvas item showing the current frame
+        self.onions = OnionSkins()  # Onion skin buffer per cached frame
+        self.onion_versions = []    # Per onion skin: bumped whenever it changes
+        self.onion_dirty = []       # Per onion skin: cells changed since its image was rendered
+        self.onion_item = None      # The one canvas item showing the current frame's skin
+        self._scratch = None        # 1:1 staging image for _paint_image
         self.cache_created = False
         
         self.win = tk.Toplevel(self.app.root)
@@ -64,24 +94,39 @@ class AnimationPreview:
         self.var_onion_mode = tk.StringVar(value="off")
         
         tk.Radiobutton(ctrl_frame, text="Off", variable=self.var_onion_mode, 
-                       value="off", command=self.refresh_display).pack(side=tk.LEFT)
+                       value="off", command=self.onion_settings_changed).pack(side=tk.LEFT)
         tk.Radiobutton(ctrl_frame, text="Prev", variable=self.var_onion_mode, 
-                       value="prev", command=self.refresh_display).pack(side=tk.LEFT)
+                       value="prev", command=self.onion_settings_changed).pack(side=tk.LEFT)
         tk.Radiobutton(ctrl_frame, text="All", variable=self.var_onion_mode, 
-                       value="all", command=self.refresh_display).pack(side=tk.LEFT)
+                       value="all", command=self.onion_settings_changed).pack(side=tk.LEFT)
+        tk.Radiobutton(ctrl_frame, text="Range", variable=self.var_onion_mode, 
+                       value="range", command=self.onion_settings_changed).pack(side=tk.LEFT)
+
+        # Frames before / after the current one in "Range" mode
+        self.spin_onion_before = tk.Spinbox(ctrl_frame, from_=0, to=8, width=2, command=self.onion_settings_changed)
+        self.spin_onion_after = tk.Spinbox(ctrl_frame, from_=0, to=8, width=2, command=self.onion_settings_changed)
+        for label, spin in (("-", self.spin_onion_before), ("+", self.spin_onion_after)):
+            spin.delete(0, tk.END)
+            spin.insert(0, str(ONION_RANGE))
+            spin.bind("<Return>", lambda e: self.onion_settings_changed())
+            spin.bind("<FocusOut>", lambda e: self.onion_settings_changed())
+            tk.Label(ctrl_frame, text=label).pack(side=tk.LEFT)
+            spin.pack(side=tk.LEFT)
         
         # --- ISSUE 5 FIX: TOGGLE DEFAULT TRUE ---
         self.var_white_bg = tk.BooleanVar(value=True)
         tk.Checkbutton(ctrl_frame, text="White BG", variable=self.var_white_bg, 
                        command=self.toggle_bg_color).pack(side=tk.LEFT, padx=10)
 
+        tk.Button(ctrl_frame, text="💾 GIF", command=self.app.project_manager.export_gif).pack(side=tk.RIGHT, padx=5)
+
         tk.Label(ctrl_frame, text="Speed:").pack(side=tk.LEFT, padx=(5, 2))
-        self.lbl_speed_val = tk.Label(ctrl_frame, text="200ms", width=5)
+        self.lbl_speed_val = tk.Label(ctrl_frame, text=f"{self.app.preview_speed_ms}ms", width=5)
         self.lbl_speed_val.pack(side=tk.LEFT)
         
-        self.scale_speed = tk.Scale(ctrl_frame, from_=50, to=1000, orient=tk.HORIZONTAL, 
-                                    resolution=50, showvalue=0, command=self.update_speed_label)
-        self.scale_speed.set(200) 
+        self.scale_speed = tk.Scale(ctrl_frame, from_=10, to=1000, orient=tk.HORIZONTAL, 
+                                    resolution=10, showvalue=0, command=self.update_speed_label)
+        self.scale_speed.set(self.app.preview_speed_ms)
         self.scale_speed.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
 
         self.win.protocol("WM_DELETE_WINDOW", self.close_window)
@@ -93,43 +138,153 @@ class AnimationPreview:
 
     def update_speed_label(self, val):
         self.lbl_speed_val.config(text=f"{val}ms")
+        self.app.preview_speed_ms = int(val)
 
     def create_grid_objects(self):
+        """Creates the two canvas items: the onion skin, and the frame above it."""
         self.canvas.delete("all")
-        self.pixel_cache = [] 
-        self.onion_cache = [] 
-        
-        for r in range(self.app.rows):
-            row_items = []
-            for c in range(self.app.cols):
-                x1 = c * self.preview_scale
-                y1 = r * self.preview_scale
-                x2 = x1 + self.preview_scale
-                y2 = y1 + self.preview_scale
-                item_id = self.canvas.create_rectangle(x1, y1, x2, y2, fill="", outline="", state="hidden")
-                row_items.append(item_id)
-            self.onion_cache.append(row_items)
-
-        for r in range(self.app.rows):
-            for c in range(self.app.cols):
-                x1 = c * self.preview_scale
-                y1 = r * self.preview_scale
-                x2 = x1 + self.preview_scale
-                y2 = y1 + self.preview_scale
-                item_id = self.canvas.create_rectangle(x1, y1, x2, y2, fill="", outline="", state="hidden")
-                self.pixel_cache.append(item_id)
-            
+        self.onion_item = self.canvas.create_image(0, 0, anchor=tk.NW, state="hidden")
+        self.frame_item = self.canvas.create_image(0, 0, anchor=tk.NW, state="hidden")
         self.cache_created = True
 
-    def rebuild_frame_cache(self):
-        frames = []
-        tabs = self.app.notebook.tabs()
-        for i in range(len(tabs) - 1): 
-            tab_widget = self.app.root.nametowidget(tabs[i])
+    def _current_tabs(self):
+        tabs = []
+        notebook_tabs = self.app.notebook.tabs()
+        for i in range(len(notebook_tabs) - 1): 
+            tab_widget = self.app.root.nametowidget(notebook_tabs[i])
             tab = getattr(tab_widget, "tab_obj", None)
             if tab:
-                frames.append(tab.get_flattened_data())
+                tabs.append(tab)
+        return tabs
+
+    def rebuild_frame_cache(self):
+        """Full resync: takes a private copy of every frame."""
+        self.frame_tabs = self._current_tabs()
+        frames = []
+        for tab in self.frame_tabs:
+            tab.take_preview_dirty()
+            frames.append(tab.get_flattened_data().copy())
         self.cached_frames = frames
+        self.frame_versions = [0] * len(frames)
+        self.frame_dirty = [None] * len(frames)
+        self.images.clear()
+        self.image_pixels = 0
+        self.rebuild_onions()
+
+    def sync_frame(self, idx, tab, region):
+        """
+        Re-reads only `region` of one frame into its cached copy.
+        Returns the clipped region, or None if nothing visible changed.
+        """
+        cached = self.cached_frames[idx]
+        if (cached.rows, cached.cols) != (tab.rows, tab.cols):
+            self.cached_frames[idx] = tab.get_flattened_data().copy()
+            self._drop_image(("frame", idx))
+            self.frame_versions[idx] += 1
+            return (0, 0, tab.rows - 1, tab.cols - 1)
+        r1, c1, r2, c2 = region
+        r1, c1 = max(r1, 0), max(c1, 0)
+        r2, c2 = min(r2, cached.rows - 1), min(c2, cached.cols - 1)
+        if r1 > r2 or c1 > c2: return None
+        tab.flatten_into(cached, r1, c1, r2, c2)
+        self.frame_versions[idx] += 1
+        self.frame_dirty[idx] = _union_rect(self.frame_dirty[idx], r1, c1, r2, c2)
+        return (r1, c1, r2, c2)
+
+    # --- FRAME IMAGES ---
+    def frame_image(self, idx):
+        """The frame rasterized at preview_scale (see _image)."""
+        return self._image(("frame", idx), self.cached_frames[idx], self.frame_versions, self.frame_dirty)
+
+    def onion_image(self, idx):
+        """The frame's onion skin rasterized at preview_scale, or None when it shows no other frame."""
+        skin = self.onions.skins[idx] if idx < len(self.onions.skins) else None
+        if skin is None: return None
+        return self._image(("onion", idx), skin, self.onion_versions, self.onion_dirty)
+
+    def _image(self, key, buf, versions, dirty):
+        """
+        The image of `buf`, created on first use. Cached and only repainted
+        (over its changed cells) when the buffer's version moved on since
+        the image was rendered.
+        """
+        idx = key[1]
+        entry = self.images.pop(key, None)
+        if entry is None:
+            ps = self.preview_scale
+            entry = [tk.PhotoImage(master=self.canvas, width=buf.cols * ps, height=buf.rows * ps), None]
+            self.image_pixels += buf.rows * buf.cols * ps * ps
+            region = (0, 0, buf.rows - 1, buf.cols - 1) if buf.rows and buf.cols else None
+        else:
+            region = dirty[idx]
+        if entry[1] != versions[idx]:
+            if region:
+                self._paint_image(entry[0], buf, *region)
+            entry[1] = versions[idx]
+            dirty[idx] = None
+        self.images[key] = entry
+        self._evict_images(idx)
+        return entry[0]
+
+    def _drop_image(self, key):
+        entry = self.images.pop(key, None)
+        if entry:
+            self.image_pixels -= entry[0].width() * entry[0].height()
+
+    def _evict_images(self, keep):
+        """
+        Drops the least recently shown images while they total over
+        PREVIEW_CACHE_PIXELS, except the two of frame `keep`.
+        """
+        if self.image_pixels <= PREVIEW_CACHE_PIXELS: return
+        for key in list(self.images):
+            if self.image_pixels <= PREVIEW_CACHE_PIXELS: break
+            if key[1] != keep:
+                self._drop_image(key)
+
+    # --- ONION SKINS ---
+    def _onion_range(self, spin):
+        try:
+            return max(0, int(spin.get()))
+        except ValueError:
+            return ONION_RANGE
+
+    def onion_settings_changed(self):
+        settings = (self.var_onion_mode.get(), self._onion_range(self.spin_onion_before),
+                    self._onion_range(self.spin_onion_after))
+        if settings == (self.onions.mode, self.onions.before, self.onions.after): return
+        self.rebuild_onions()
+        self.refresh_display()
+
+    def rebuild_onions(self):
+        """
+        Builds every frame's onion skin for the current mode. Their images
+        are rendered when each frame is next shown.
+        """
+        self.onions.configure(self.cached_frames, self.var_onion_mode.get(),
+                              self._onion_range(self.spin_onion_before), self._onion_range(self.spin_onion_after))
+        self.onion_versions = [0] * len(self.onions.skins)
+        self.onion_dirty = [None] * len(self.onions.skins)
+        for key in [key for key in self.images if key[0] == "onion"]:
+            self._drop_image(key)
+
+    def _paint_image(self, image, buf, r1, c1, r2, c2):
+        """
+        Rasterizes a region of `buf` into `image` at preview_scale, leaving
+        empty cells transparent. Runs of colored cells are put into a 1:1
+        scratch image, which is then zoom-copied over the region.
+        """
+        scratch = self._scratch
+        if scratch is None or (scratch.height(), scratch.width()) != (buf.rows, buf.cols):
+            scratch = self._scratch = tk.PhotoImage(master=self.canvas, width=buf.cols, height=buf.rows)
+        scratch.blank()
+        for r, c, cells in color_runs(buf, r1, c1, r2, c2):
+            scratch.put("{" + " ".join(cells) + "}", to=(c, r))
+        ps = self.preview_scale
+        self.canvas.tk.call(str(image), "copy", str(scratch),
+                            "-from", c1, r1, c2 + 1, r2 + 1,
+                            "-to", c1 * ps, r1 * ps,
+                            "-zoom", ps, ps, "-compositingrule", "set")
 
     def toggle_bg_color(self):
         bg = "#FFFFFF" if self.var_white_bg.get() else "#cccccc"
@@ -145,13 +300,42 @@ class AnimationPreview:
         self.draw_scene(self.current_frame_index)
 
     def update_from_editor(self):
-        self.rebuild_frame_cache() 
-        self.draw_scene(self.current_frame_index)
+        """
+        Incremental sync: only frames whose tab reports changes are re-read.
+        Their images are repainted over the dirty region when next shown.
+        """
+        if self._current_tabs() != self.frame_tabs:
+            self.rebuild_frame_cache()
+            self.draw_scene(self.shown_frame_index)
+            return
+
+        redraw = False
+        resized = False
+        for idx, tab in enumerate(self.frame_tabs):
+            region = tab.take_preview_dirty()
+            if not region: continue
+            cached = self.cached_frames[idx]
+            region = self.sync_frame(idx, tab, region)
+            if not region: continue
+            if self.cached_frames[idx] is not cached:
+                resized = True
+            elif not resized:
+                # Patch the skins that show this frame; their images follow when shown
+                for i in self.onions.frame_changed(self.cached_frames, idx, region):
+                    self.onion_versions[i] += 1
+                    self.onion_dirty[i] = _union_rect(self.onion_dirty[i], *region)
+                    redraw = redraw or i == self.shown_frame_index
+            redraw = redraw or idx == self.shown_frame_index
+
+        if resized:
+            self.rebuild_onions()
+        if resized or redraw:
+            self.draw_scene(self.shown_frame_index)
 
     def animate(self):
         if not self.win.winfo_exists(): return
         
-        if not self.cached_frames: 
+        if not self.cached_frames or self._current_tabs() != self.frame_tabs: 
             self.rebuild_frame_cache()
             if not self.cached_frames: return
 
@@ -172,48 +356,17 @@ class AnimationPreview:
             self.timer_id = self.win.after(speed, self.animate)
 
     def draw_scene(self, frame_idx):
+        """Shows a frame: points the two canvas items at its ready frame and onion skin images."""
         if not self.cache_created or not self.cached_frames: return
         if frame_idx >= len(self.cached_frames): frame_idx = 0
-        
-        mode = self.var_onion_mode.get()
-        current_grid = self.cached_frames[frame_idx]
-
-        max_rows = min(self.app.rows, len(current_grid))
-        max_cols = min(self.app.cols, len(current_grid[0])) if max_rows > 0 else 0
-
-        for r in range(self.app.rows):
-            for c in range(self.app.cols):
-                onion_color = None
-                
-                if mode == "prev" and len(self.cached_frames) > 1:
-                    prev_idx = (frame_idx - 1) % len(self.cached_frames)
-                    if r < len(self.cached_frames[prev_idx]) and c < len(self.cached_frames[prev_idx][0]):
-                         onion_color = self.cached_frames[prev_idx][r][c]
-                
-                elif mode == "all":
-                    for i, frm in enumerate(self.cached_frames):
-                        if i == frame_idx: continue
-                        if r < len(frm) and c < len(frm[0]):
-                            if frm[r][c] != EMPTY_COLOR:
-                                onion_color = frm[r][c]
-                                break
-
-                onion_id = self.onion_cache[r][c]
-                if onion_color and onion_color != EMPTY_COLOR:
-                    self.canvas.itemconfig(onion_id, fill=onion_color, state="normal", stipple="gray50")
-                else:
-                    self.canvas.itemconfig(onion_id, state="hidden")
-
-                pixel_id = self.pixel_cache[r * self.app.cols + c]
-                
-                if r < max_rows and c < max_cols:
-                    color = current_grid[r][c]
-                    if color != EMPTY_COLOR:
-                        self.canvas.itemconfig(pixel_id, fill=color, state="normal")
-                    else:
-                        self.canvas.itemconfig(pixel_id, state="hidden")
-                else:
-                    self.canvas.itemconfig(pixel_id, state="hidden")
+        self.shown_frame_index = frame_idx
+
+        onion = self.onion_image(frame_idx)
+        if onion:
+            self.canvas.itemconfig(self.onion_item, image=onion, state="normal")
+        else:
+            self.canvas.itemconfig(self.onion_item, state="hidden")
+        self.canvas.itemconfig(self.frame_item, image=self.frame_image(frame_idx), state="normal")
 
     def close_window(self):
         if self.app.preview_window == self:
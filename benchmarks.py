@@ -0,0 +1,197 @@
+# benchmarks.py
+# Headless performance benchmarks for the algorithms, history and project I/O.
+#
+#   python benchmarks.py --out bench.json                   # full run
+#   python benchmarks.py --quick --compare bench.json       # flag regressions
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from array import array
+from algorithms import get_connected_pixels, get_ellipse_pixels, get_line_pixels
+from document import Document
+from history import HistoryBudget, HistoryManager
+from pixel_buffer import PixelBuffer
+from project_format import frame_to_text, parse_frame_text
+
+SIZES = (32, 256, 1024, 4096)
+FRAME_COUNTS = (1, 50, 500)
+QUICK_MAX_SIZE = 256
+QUICK_MAX_FRAMES = 50
+MIN_TIME = 0.2 # Seconds of repeated runs per case (at least one run)
+MAX_RUNS = 20 # Timed samples per case at most; fast cases time a batch of calls per sample
+THRESHOLD = 0.25 # Slowdown (vs the baseline's best time) reported as a regression
+
+def _pattern(size, colors=8):
+    """A size x size frame of diagonal color stripes, with an empty square in the middle."""
+    buf = PixelBuffer(size, size)
+    for i in range(colors):
+        buf.index_of(f"#{(i * 0x1F3A5B) & 0xFFFFFF:06X}")
+    data = buf.data
+    for r in range(size):
+        data[r * size:(r + 1) * size] = array(data.typecode, [1 + (r + c) // 4 % colors for c in range(size)])
+    quarter = size // 4
+    for r in range(quarter, size - quarter):
+        start = r * size + quarter
+        data[start:start + size - 2 * quarter] = array(data.typecode, bytes(size - 2 * quarter))
+    return buf
+
+# --- CASES ---
+# Each case takes its parameter and returns a function that runs one timed iteration.
+def case_connected_pixels(size):
+    buf = _pattern(size)
+    return lambda: get_connected_pixels(buf, size // 2, size // 2)
+
+def case_line_pixels(size):
+    return lambda: get_line_pixels(0, 0, size - 1, size // 3)
+
+def case_ellipse_pixels(size):
+    return lambda: get_ellipse_pixels(0, 0, size - 1, size - 1)
+
+def case_history_push_undo_redo(size):
+    buf = PixelBuffer(size, size)
+    manager = HistoryManager(budget=HistoryBudget())
+    side = max(1, size // 4)
+    square = [(r, c) for r in range(side) for c in range(side)]
+    colors = ["#FF0000", "#0000FF"]
+    def run():
+        manager.push_state(buf)
+        buf.fill_pixels(square, colors[0])
+        colors.reverse()
+        manager.undo(buf)
+        manager.redo(buf)
+    return run
+
+def case_frame_to_text(size):
+    buf = _pattern(size)
+    return lambda: frame_to_text(buf)
+
+def case_parse_frame_text(size):
+    text = frame_to_text(_pattern(size))
+    return lambda: parse_frame_text(text, size, size)
+
+def _round_trip(ext, frames, size=64):
+    doc = Document(rows=size, cols=size)
+    for i in range(frames):
+        doc.add_frame().pixels.blit_from(_pattern(size, colors=1 + i % 8), 0, 0, size - 1, size - 1)
+    def run():
+        # A fresh folder each time, so folder saves are never incremental
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "project" + ext)
+            doc.save(path)
+            loaded = Document.load(path)
+            for frame in loaded.frames:
+                frame.pixels # .pxp frames are decoded on first use
+            loaded.close()
+    return run
+
+def case_folder_round_trip(frames):
+    return _round_trip("", frames)
+
+def case_pxp_round_trip(frames):
+    return _round_trip(".pxp", frames)
+
+CASES = [
+    ("connected_pixels", case_connected_pixels, SIZES, "size"),
+    ("line_pixels", case_line_pixels, SIZES, "size"),
+    ("ellipse_pixels", case_ellipse_pixels, SIZES, "size"),
+    ("history_push_undo_redo", case_history_push_undo_redo, SIZES, "size"),
+    ("frame_to_text", case_frame_to_text, SIZES, "size"),
+    ("parse_frame_text", case_parse_frame_text, SIZES, "size"),
+    ("folder_round_trip", case_folder_round_trip, FRAME_COUNTS, "frames"),
+    ("pxp_round_trip", case_pxp_round_trip, FRAME_COUNTS, "frames"),
+]
+
+def case_key(name, kind, param):
+    return f"{name}[{param}x{param}]" if kind == "size" else f"{name}[{param} frames]"
+
+# --- RUNNING ---
+def _batch_sizes():
+    """1, 2, 5, 10, 20, 50, ..."""
+    base = 1
+    while True:
+        for step in (1, 2, 5): yield base * step
+        base *= 10
+
+def _time_batch(run, calls):
+    start = time.perf_counter()
+    for _ in range(calls): run()
+    return time.perf_counter() - start
+
+def time_case(run):
+    """
+    Repeats `run` for about MIN_TIME seconds. Like timeit's autorange, fast
+    cases are timed in batches of calls that take at least MIN_TIME / MAX_RUNS
+    each, so a microsecond case gets as long a measurement as a slow one.
+    MAX_RUNS only caps the samples of cases slower than that.
+    Returns (best, mean, runs), the times per call.
+    """
+    sample_time = MIN_TIME / MAX_RUNS
+    for calls in _batch_sizes():
+        elapsed = _time_batch(run, calls)
+        if elapsed >= sample_time: break
+    times, total = [elapsed / calls], elapsed
+    while len(times) < MAX_RUNS and total < MIN_TIME:
+        elapsed = _time_batch(run, calls)
+        times.append(elapsed / calls)
+        total += elapsed
+    return min(times), sum(times) / len(times), len(times) * calls
+
+def run_benchmarks(quick=False, only=None, log=print):
+    results = {}
+    for name, make, params, kind in CASES:
+        if only and not any(word in name for word in only): continue
+        for param in params:
+            if quick and param > (QUICK_MAX_SIZE if kind == "size" else QUICK_MAX_FRAMES): continue
+            key = case_key(name, kind, param)
+            best, mean, runs = time_case(make(param))
+            results[key] = {"best": best, "mean": mean, "runs": runs}
+            log(f"{key:<42} {best * 1000:10.2f} ms  (mean {mean * 1000:.2f} ms, {runs} runs)")
+    return results
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Returns [(key, baseline best, new best, ratio)] for cases more than `threshold` slower."""
+    regressions = []
+    for key, new in results.items():
+        old = baseline.get(key)
+        if not old or old["best"] <= 0: continue
+        ratio = new["best"] / old["best"]
+        if ratio > 1 + threshold:
+            regressions.append((key, old["best"], new["best"], ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pixel editor benchmarks.")
+    parser.add_argument("--quick", action="store_true",
+                        help=f"Only sizes up to {QUICK_MAX_SIZE} and up to {QUICK_MAX_FRAMES} frames")
+    parser.add_argument("--only", nargs="+", help="Run only cases whose name contains one of these words")
+    parser.add_argument("--out", help="Write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare against a previous JSON result file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Slowdown ratio reported as a regression (default: 0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.quick, args.only)
+    if args.out:
+        report = {
+            "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "date": time.strftime("%Y-%m-%d %H:%M:%S"), "quick": args.quick},
+            "results": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, "r") as f: baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\n{len(regressions)} regression(s) against {args.compare}")
+        for key, old, new, ratio in regressions:
+            print(f"SLOWER {key:<42} {old * 1000:.2f} ms -> {new * 1000:.2f} ms (x{ratio:.2f})")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
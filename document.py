@@ -0,0 +1,706 @@
+# document.py
+# Display-free document core: frames, selection, history and project files.
+# The tkinter UI (EditorTab / PixelEditor) is a view over these classes, and
+# batch jobs or tests can use them without importing tkinter.
+import os
+from settings import *
+from history import HistoryManager
+from algorithms import flood_fill
+from pixel_buffer import PixelBuffer
+from region_index import RegionIndex
+from project_format import (PROJECT_EXTENSION, ProjectReader, LoadedFrame, write_project,
+                            read_folder, read_frame_file, save_folder)
+
+def _union_rect(rect, r1, c1, r2, c2):
+    """Grows an (r1, c1, r2, c2) rectangle (or None) to include another one."""
+    if rect:
+        r1, c1 = min(r1, rect[0]), min(c1, rect[1])
+        r2, c2 = max(r2, rect[2]), max(c2, rect[3])
+    return (r1, c1, r2, c2)
+
+def _add_rect(rects, r1, c1, r2, c2):
+    """
+    Adds a rectangle to a list of them (or None), so cells changed far apart
+    stay in separate rectangles. It is merged with each rectangle it overlaps
+    or touches, as long as the merged box wastes at most JOURNAL_MERGE_SLACK
+    cells. Beyond JOURNAL_MAX_RECTS, the list collapses into one bounding box.
+    """
+    rects = list(rects) if rects else []
+    merged = True
+    while merged:
+        merged = False
+        for rect in rects:
+            if rect[0] > r2 + 1 or r1 > rect[2] + 1 or rect[1] > c2 + 1 or c1 > rect[3] + 1: continue
+            box = _union_rect(rect, r1, c1, r2, c2)
+            area = (box[2] - box[0] + 1) * (box[3] - box[1] + 1)
+            parts = (rect[2] - rect[0] + 1) * (rect[3] - rect[1] + 1) + (r2 - r1 + 1) * (c2 - c1 + 1)
+            if area <= parts + JOURNAL_MERGE_SLACK:
+                rects.remove(rect)
+                r1, c1, r2, c2 = box
+                merged = True
+                break
+    rects.append((r1, c1, r2, c2))
+    if len(rects) > JOURNAL_MAX_RECTS:
+        box = rects[0]
+        for rect in rects[1:]:
+            box = _union_rect(box, *rect)
+        rects = [box]
+    return rects
+
+class Layer:
+    """
+    One layer of a frame: its pixels, its own undo history, and whether it
+    is shown and editable. `source` (e.g. an entry of a .pxp file) is
+    decoded on first access.
+    """
+    def __init__(self, rows, cols, name="Layer 1", source=None, visible=True, locked=False):
+        self.name = name
+        self.visible = visible
+        self.locked = locked
+        self.source = source
+        self._pixels = None if source else PixelBuffer(rows, cols)
+        self.history_manager = HistoryManager()
+
+    @property
+    def pixels(self):
+        if self._pixels is None:
+            self._pixels = self.source.load()
+            self.source = None
+        return self._pixels
+
+    @pixels.setter
+    def pixels(self, buffer):
+        self._pixels = buffer
+        self.source = None
+
+    def copy(self):
+        return Layer(0, 0, self.name, LoadedFrame(self.pixels.copy()), self.visible, self.locked)
+
+    def info(self):
+        return {"name": self.name, "visible": self.visible, "locked": self.locked}
+
+class FrameDocument:
+    """
+    One frame of the animation without any UI: its layers, undo history,
+    selection/floating layer and symmetry. Tools operate on this interface.
+
+    `pixels` and `history_manager` are those of the active layer, so tools
+    only ever edit that one. Views, the preview and exports read `composite`.
+
+    `app` is whatever owns the frame (a Document, or the tkinter PixelEditor)
+    and provides notify_preview() and the clipboard. The draw_* methods are
+    hooks for a view; here they only keep caches consistent.
+    """
+    def __init__(self, app_ref, rows, cols, pixel_size, name="Frame", pixel_source=None):
+        self.app = app_ref 
+        self.name = name
+        self.rows = rows
+        self.cols = cols
+        self.pixel_size = pixel_size
+
+        # --- SYMMETRY STATE ---
+        self.mirror_x = False
+        self.mirror_y = False
+        
+        # --- LAYERS (bottom first) ---
+        # pixel_source (e.g. a frame in a .pxp file) is decoded on first access
+        self.layers = [Layer(rows, cols, source=pixel_source)]
+        self.active_layer = 0
+        # Visible layers merged, with the union of cells changed since the last
+        # merge. Only used with more than one layer (or a hidden one).
+        self._composite = None
+        self._composite_dirty = None
+
+        # Connected-region caches for Bucket/Wand, one per connectivity (4 or 8)
+        self.region_indexes = {}
+
+        # --- SELECTION STATE ---
+        self.sel_start = None 
+        self.sel_end = None    
+        
+        # Floating Layer
+        self.floating_pixels = None 
+        self.floating_offset = None 
+
+        # --- CHANGE TRACKING ---
+        # Union of cells changed since the animation preview last synced this frame
+        self.preview_dirty = None
+        # Rectangles of cells changed since they were last written to the recovery journal
+        self.journal_dirty = None
+
+    @property
+    def pixels(self):
+        return self.layers[self.active_layer].pixels
+
+    @pixels.setter
+    def pixels(self, buffer):
+        self.layers[self.active_layer].pixels = buffer
+
+    @property
+    def pixel_source(self):
+        """The undecoded source of a frame that is a single layer (None once decoded or with several)."""
+        return self.layers[0].source if len(self.layers) == 1 else None
+
+    @pixel_source.setter
+    def pixel_source(self, source):
+        self.layers[0].source = source
+
+    @property
+    def history_manager(self):
+        return self.layers[self.active_layer].history_manager
+
+    @property
+    def composite(self):
+        """
+        The visible layers merged bottom to top. A frame that is a single
+        visible layer is its own composite; otherwise the merge is cached and
+        redone only inside the cells invalidated since it was last read.
+        """
+        if len(self.layers) == 1 and self.layers[0].visible:
+            self._composite = None
+            return self.layers[0].pixels
+        if self._composite is None or (self._composite.rows, self._composite.cols) != (self.rows, self.cols):
+            self._composite = PixelBuffer(self.rows, self.cols)
+            self._composite_dirty = (0, 0, self.rows - 1, self.cols - 1)
+        if self._composite_dirty:
+            r1, c1, r2, c2 = self._composite_dirty
+            self._composite_dirty = None
+            r1, c1 = max(r1, 0), max(c1, 0)
+            r2, c2 = min(r2, self.rows - 1), min(c2, self.cols - 1)
+            if r1 <= r2 and c1 <= c2:
+                visible = [layer.pixels for layer in self.layers if layer.visible]
+                if visible:
+                    self._composite.blit_from(visible[0], r1, c1, r2, c2)
+                else:
+                    self._composite.clear_rect(r1, c1, r2, c2)
+                for buf in visible[1:]:
+                    self._composite.overlay_from(buf, r1, c1, r2, c2)
+        return self._composite
+
+    # --- LAYER STACK ---
+    @property
+    def layer_locked(self):
+        return self.layers[self.active_layer].locked
+
+    def select_layer(self, index):
+        """Makes another layer the one tools edit."""
+        if index == self.active_layer or not 0 <= index < len(self.layers): return
+        self.commit_selection()
+        self.active_layer = index
+        for region_index in self.region_indexes.values(): region_index.reset()
+
+    def add_layer(self, name=None):
+        """Adds an empty layer above the active one and selects it."""
+        self.commit_selection()
+        names = {layer.name for layer in self.layers}
+        count = len(self.layers) + 1
+        while name is None or name in names:
+            name, count = f"Layer {count}", count + 1
+        self.layers.insert(self.active_layer + 1, Layer(self.rows, self.cols, name))
+        self._drop_resize_history()
+        self.select_layer(self.active_layer + 1)
+
+    def remove_layer(self, index):
+        """Deletes a layer (a frame keeps at least one)."""
+        if len(self.layers) <= 1: return
+        self.commit_selection()
+        self._invalidate_layer(index)
+        self.layers.pop(index).history_manager.clear()
+        self.active_layer = min(self.active_layer - (index < self.active_layer), len(self.layers) - 1)
+        for region_index in self.region_indexes.values(): region_index.reset()
+        self.app.notify_preview()
+
+    def move_layer(self, index, step):
+        """Moves a layer `step` places up (positive) or down the stack."""
+        target = index + step
+        if not (0 <= index < len(self.layers) and 0 <= target < len(self.layers)): return
+        self.commit_selection()
+        active = self.layers[self.active_layer]
+        self.layers.insert(target, self.layers.pop(index))
+        self.active_layer = self.layers.index(active)
+        # Only cells where the moved layer has content can look different
+        self._invalidate_layer(target)
+        self.app.notify_preview()
+
+    def set_layer_visible(self, index, visible):
+        if self.layers[index].visible == visible: return
+        self.layers[index].visible = visible
+        self._invalidate_layer(index)
+        self.app.notify_preview()
+
+    def set_layer_locked(self, index, locked):
+        self.layers[index].locked = locked
+
+    def restore_layers(self, info, source_for):
+        """Replaces the layers with saved ones: [{name, visible, locked, entry}], source_for(entry) -> source."""
+        self.layers = [Layer(self.rows, self.cols, item["name"], source_for(item["entry"]),
+                             item.get("visible", True), item.get("locked", False)) for item in info]
+        self.active_layer = len(self.layers) - 1
+        self._drop_resize_history()
+        self._composite = None
+
+    def copy_layers_from(self, other):
+        """Makes this frame a copy of another frame's layers (Duplicate Frame)."""
+        self.layers = [layer.copy() for layer in other.layers]
+        self.active_layer = other.active_layer
+        self.rows, self.cols = other.rows, other.cols
+        self._drop_resize_history()
+        self._composite = None
+        self.draw_grid_lines()
+
+    def has_layer_stack(self):
+        """True if saving this frame needs more than its composite image."""
+        layer = self.layers[0]
+        return len(self.layers) > 1 or not layer.visible or layer.locked
+
+    def resize(self, rows, cols):
+        """Resizes every layer. Undoable for a single-layer frame only (each layer has its own history)."""
+        for layer in self.layers:
+            new_pixels = layer.pixels.resized(rows, cols)
+            if len(self.layers) == 1:
+                layer.history_manager.record_replace(layer.pixels, new_pixels)
+            else:
+                layer.history_manager.clear()
+            layer.pixels = new_pixels
+        self.rows, self.cols = rows, cols
+        self._composite = None
+        self.draw_grid_lines()
+
+    def _drop_resize_history(self):
+        """
+        An undoable resize only swaps one layer's buffer, so once a frame
+        has several layers, no layer may undo one on its own.
+        """
+        if len(self.layers) > 1:
+            for layer in self.layers:
+                layer.history_manager.drop_buffer_swaps()
+
+    def _invalidate_layer(self, index):
+        bounds = self.layers[index].pixels.content_bounds()
+        if bounds: self.invalidate(*bounds)
+
+
+    # --- VIEW HOOKS ---
+    def draw_grid_lines(self):
+        """Called when the whole frame changed (e.g. the buffer was swapped)."""
+        for index in self.region_indexes.values(): index.reset()
+        if self._composite is not None:
+            self._composite_dirty = (0, 0, self.rows - 1, self.cols - 1)
+
+    def draw_selection_overlay(self):
+        """Called when the selection box or floating layer changed."""
+        pass
+
+    def draw_pixel(self, r, c, color=None):
+        """Shows a temporary color for one cell (tool previews). No-op without a view."""
+        pass
+
+    def invalidate(self, r1, c1, r2=None, c2=None):
+        """Marks the cells (r1, c1)-(r2, c2) as changed."""
+        if r2 is None: r2, c2 = r1, c1
+        if self._composite is not None:
+            self._composite_dirty = _union_rect(self._composite_dirty, r1, c1, r2, c2)
+        self.preview_dirty = _union_rect(self.preview_dirty, r1, c1, r2, c2)
+        self.journal_dirty = _add_rect(self.journal_dirty, r1, c1, r2, c2)
+        for index in self.region_indexes.values(): index.invalidate(r1, c1, r2, c2)
+
+    def visual_move_selection(self, dr, dc):
+        """Moves the floating layer by (dr, dc) while it is being dragged."""
+        if not self.floating_pixels: return
+        self._mark_floating_dirty()
+        fr, fc = self.floating_offset
+        self.floating_offset = (fr + dr, fc + dc)
+        self._mark_floating_dirty()
+
+    # --- SELECTION ---
+    def get_selection_bounds(self):
+        if not self.sel_start or not self.sel_end: return None
+        r1, c1 = self.sel_start
+        r2, c2 = self.sel_end
+        return (min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2))
+
+    def point_in_selection(self, r, c):
+        if self.floating_pixels and self.floating_offset:
+             bounds = self.get_selection_bounds()
+             if not bounds: return False
+             orig_r1, orig_c1, orig_r2, orig_c2 = bounds
+             h, w = orig_r2 - orig_r1, orig_c2 - orig_c1
+             fr, fc = self.floating_offset
+             return (fr <= r <= fr + h) and (fc <= c <= fc + w)
+        bounds = self.get_selection_bounds()
+        if not bounds: return False
+        r1, c1, r2, c2 = bounds
+        return (r1 <= r <= r2) and (c1 <= c <= c2)
+
+    def commit_selection(self):
+        if self.floating_pixels and self.floating_offset:
+            self.save_state()
+            self.invalidate(*self._floating_bounds())
+            fr, fc = self.floating_offset
+            for (lr, lc), color in self.floating_pixels.items():
+                ar, ac = fr + lr, fc + lc
+                if 0 <= ar < self.rows and 0 <= ac < self.cols:
+                    if color != EMPTY_COLOR:
+                        self.pixels.set(ar, ac, color)
+            self.floating_pixels = None
+            self.floating_offset = None
+            self.app.notify_preview()
+            
+        self.sel_start = None
+        self.sel_end = None
+        self.draw_selection_overlay()
+
+    def _floating_bounds(self):
+        """Returns the (r1, c1, r2, c2) cells covered by the floating layer."""
+        fr, fc = self.floating_offset
+        h = max(k[0] for k in self.floating_pixels)
+        w = max(k[1] for k in self.floating_pixels)
+        return (fr, fc, fr + h, fc + w)
+
+    def lift_selection_to_float(self):
+        if self.floating_pixels: return 
+        bounds = self.get_selection_bounds()
+        if not bounds: return
+        self.save_state()
+        r1, c1, r2, c2 = bounds
+        self.floating_pixels = {}
+        self.floating_offset = (r1, c1)
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                self.floating_pixels[(r - r1, c - c1)] = self.pixels.get(r, c)
+                self.pixels.set(r, c, EMPTY_COLOR)
+        self.invalidate(r1, c1, r2, c2)
+        self.draw_selection_overlay()
+
+    def copy_to_clipboard(self):
+        if self.floating_pixels:
+            self.app.clipboard = self.floating_pixels.copy()
+            return True
+        bounds = self.get_selection_bounds()
+        if not bounds: return False
+        r1, c1, r2, c2 = bounds
+        data = {}
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                 data[(r - r1, c - c1)] = self.pixels.get(r, c)
+        self.app.clipboard = data
+        return True
+
+    def paste_from_clipboard(self, clipboard_data):
+        if not clipboard_data: return
+        self.commit_selection()
+        if not clipboard_data: return
+        max_r = max(k[0] for k in clipboard_data.keys())
+        max_c = max(k[1] for k in clipboard_data.keys())
+        self.sel_start = (0, 0)
+        self.sel_end = (max_r, max_c)
+        self.floating_pixels = clipboard_data.copy()
+        self.floating_offset = (0, 0)
+        self._mark_floating_dirty()
+        self.draw_selection_overlay()
+        self.app.notify_preview()
+
+    def move_selection_by_offset(self, dr, dc):
+        if not self.sel_start: return
+        if not self.floating_pixels: self.lift_selection_to_float()
+        self._mark_floating_dirty()
+        curr_r, curr_c = self.floating_offset
+        self.floating_offset = (curr_r + dr, curr_c + dc)
+        self._mark_floating_dirty()
+        self.draw_selection_overlay()
+        self.app.notify_preview()
+
+    # --- HISTORY METHODS ---
+    def save_state(self):
+        self.history_manager.push_state(self.pixels)
+        
+    def perform_undo(self):
+        result = self.history_manager.undo(self.pixels)
+        if result:
+            self._mark_floating_dirty()
+            self._restore_state(*result)
+            self.sel_start = None
+            self.sel_end = None
+            self.floating_pixels = None
+            self.draw_selection_overlay()
+            self.app.notify_preview()
+
+    def perform_redo(self):
+        result = self.history_manager.redo(self.pixels)
+        if result:
+            self._restore_state(*result)
+            self.app.notify_preview()
+
+    def _restore_state(self, buffer, region):
+        """Applies an undo/redo result, repainting only the region it changed."""
+        if region:
+            self.invalidate(*region)
+            return
+        # Whole-buffer edit (e.g. grid resize): swap the buffer in
+        self.pixels = buffer
+        self.rows = buffer.rows
+        self.cols = buffer.cols
+        self.preview_dirty = (0, 0, self.rows - 1, self.cols - 1)
+        self.journal_dirty = [self.preview_dirty]
+        self.draw_grid_lines()
+
+    def get_flattened_data(self):
+        """Returns the composite PixelBuffer with any active selection overlayed."""
+        if not self.floating_pixels:
+            return self.composite
+        
+        temp = self.composite.copy()
+        
+        if self.floating_offset:
+            fr, fc = self.floating_offset
+            for (lr, lc), color in self.floating_pixels.items():
+                r, c = fr + lr, fc + lc
+                if 0 <= r < self.rows and 0 <= c < self.cols:
+                    if color != EMPTY_COLOR:
+                        temp.set(r, c, color)
+        return temp
+
+    def find_region(self, r, c, connectivity=4, tolerance=0, contiguous=True):
+        """
+        flood_fill() for Bucket/Wand. Exact-color contiguous queries are answered
+        from the per-frame RegionIndex, so repeated clicks on an unchanged
+        frame don't recompute connectivity.
+        """
+        if tolerance == 0 and contiguous:
+            index = self.region_indexes.get(connectivity)
+            if index is None:
+                index = self.region_indexes[connectivity] = RegionIndex(connectivity)
+            return index.region_at(self.pixels, r, c)
+        return flood_fill(self.pixels, r, c, connectivity, tolerance, contiguous)
+
+    def flatten_into(self, dest, r1, c1, r2, c2):
+        """
+        Copies the cells (r1, c1)-(r2, c2), with any floating selection
+        overlayed, into `dest` (a PixelBuffer of the same size).
+        """
+        dest.blit_from(self.composite, r1, c1, r2, c2)
+        if self.floating_pixels and self.floating_offset:
+            fr, fc = self.floating_offset
+            for (lr, lc), color in self.floating_pixels.items():
+                r, c = fr + lr, fc + lc
+                if r1 <= r <= r2 and c1 <= c <= c2 and color != EMPTY_COLOR:
+                    dest.set(r, c, color)
+
+    def take_preview_dirty(self):
+        """Returns (and clears) the region changed since the preview last synced."""
+        region = self.preview_dirty
+        self.preview_dirty = None
+        return region
+
+    def take_journal_dirty(self):
+        """Returns (and clears) the rectangles changed since they were last journaled, clipped to the grid."""
+        rects = self.journal_dirty or ()
+        self.journal_dirty = None
+        clipped = []
+        for r1, c1, r2, c2 in rects:
+            r1, c1 = max(r1, 0), max(c1, 0)
+            r2, c2 = min(r2, self.rows - 1), min(c2, self.cols - 1)
+            if r1 <= r2 and c1 <= c2: clipped.append((r1, c1, r2, c2))
+        return clipped
+
+    def flattened_crop(self, r1, c1, r2, c2):
+        """Returns the cells (r1, c1)-(r2, c2), with any floating selection overlayed, as a new buffer."""
+        part = self.composite.crop(r1, c1, r2, c2)
+        if self.floating_pixels and self.floating_offset:
+            fr, fc = self.floating_offset
+            for (lr, lc), color in self.floating_pixels.items():
+                r, c = fr + lr, fc + lc
+                if r1 <= r <= r2 and c1 <= c <= c2 and color != EMPTY_COLOR:
+                    part.set(r - r1, c - c1, color)
+        return part
+
+    def _mark_floating_dirty(self):
+        if self.floating_pixels and self.floating_offset:
+            bounds = self._floating_bounds()
+            self.preview_dirty = _union_rect(self.preview_dirty, *bounds)
+            self.journal_dirty = _add_rect(self.journal_dirty, *bounds)
+
+    # --- PAINTING ---
+    def paint_pixel(self, r, c, color):
+        """
+        Central method to paint a pixel. 
+        Handles Bounds Checking, Visual Updates, and Symmetry.
+        """
+        # 1. Paint the primary pixel
+        self._set_single_pixel(r, c, color)
+
+        # 2. Handle Mirror X
+        if self.mirror_x:
+            mirror_c = (self.cols - 1) - c
+            self._set_single_pixel(r, mirror_c, color)
+            
+        # 3. Handle Mirror Y
+        if self.mirror_y:
+            mirror_r = (self.rows - 1) - r
+            self._set_single_pixel(mirror_r, c, color)
+            
+        # 4. Handle Mirror X + Y (The diagonal corner)
+        if self.mirror_x and self.mirror_y:
+            mirror_c = (self.cols - 1) - c
+            mirror_r = (self.rows - 1) - r
+            self._set_single_pixel(mirror_r, mirror_c, color)
+
+    def paint_pixels(self, cells, color):
+        """
+        Batch version of paint_pixel (with symmetry): writes only the cells
+        that change and invalidates their bounding box once.
+        """
+        rows, cols, pixels = self.rows, self.cols, self.pixels
+        targets = list(cells)
+        if self.mirror_x: targets += [(r, cols - 1 - c) for r, c in targets]
+        if self.mirror_y: targets += [(rows - 1 - r, c) for r, c in targets]
+        changed = [(r, c) for r, c in targets if 0 <= r < rows and 0 <= c < cols and pixels.set(r, c, color)]
+        if changed:
+            rs, cs = [r for r, _ in changed], [c for _, c in changed]
+            self.invalidate(min(rs), min(cs), max(rs), max(cs))
+
+    def _set_single_pixel(self, r, c, color):
+        """Internal helper to actually set data and schedule the repaint."""
+        if 0 <= r < self.rows and 0 <= c < self.cols:
+            if self.pixels.set(r, c, color):
+                self.invalidate(r, c)
+
+
+def container_entries(frames):
+    """
+    The entries and extra metadata of a .pxp save. Each frame is stored as
+    its composite, so lazy loading and the batch renderer read one entry per
+    frame; frames with several layers also store every layer after all the
+    frames. Undecoded frames are copied as their stored blobs.
+    """
+    entries, layer_entries, layers = [], [], {}
+    for i, frame in enumerate(frames):
+        source = frame.pixel_source
+        entries.append(bytes(source.blob()) if source and frame.layers[0].visible else frame.composite)
+        if frame.has_layer_stack():
+            layers[str(i)] = []
+            for layer in frame.layers:
+                layers[str(i)].append(dict(layer.info(), entry=len(frames) + len(layer_entries)))
+                layer_entries.append(bytes(layer.source.blob()) if layer.source else layer.pixels)
+    return entries + layer_entries, ({"frame_count": len(frames), "layers": layers} if layers else {})
+
+def recovery_frames(frames):
+    """
+    The frames of a recovery snapshot, built on the UI thread without
+    encoding anything: stored blobs are copied as-is, every other frame as a
+    buffer copy that the journal thread encodes.
+    """
+    entries = []
+    for frame in frames:
+        source = frame.pixel_source
+        if source and frame.layers[0].visible and not isinstance(source, LoadedFrame):
+            entries.append(bytes(source.blob()))
+        elif source and frame.layers[0].visible:
+            entries.append(source.load().copy())
+        else:
+            entries.append(frame.get_flattened_data().copy())
+    return entries
+
+def restore_saved_layers(frame, reader, index):
+    """Gives a frame loaded from a .pxp file its saved layers, if it has any."""
+    info = reader.meta.get("layers", {}).get(str(index))
+    if info:
+        frame.restore_layers(info, reader.lazy_frame)
+
+class Document:
+    """
+    A whole project without any UI. It provides the same app interface the
+    tools and frames use on the tkinter PixelEditor (active_tab, active_color,
+    fill options, clipboard, notify_preview), so they run unchanged on it.
+    """
+    def __init__(self, rows=DEFAULT_ROWS, cols=DEFAULT_COLS, pixel_size=DEFAULT_PIXEL_SIZE, palette=None):
+        self.rows = rows
+        self.cols = cols
+        self.pixel_size = pixel_size
+        self.current_palette = list(palette) if palette else []
+        self.frames = []
+        self.active_index = 0
+        self.path = None
+        self.reader = None # Open ProjectReader while frames of a .pxp are still undecoded
+
+        # Tool state
+        self.active_color = "#000000"
+        self.fill_connectivity = 4
+        self.fill_tolerance = 0
+        self.fill_contiguous = True
+        self.clipboard = None
+
+    # --- APP INTERFACE ---
+    def active_tab(self):
+        return self.frames[self.active_index] if self.frames else None
+
+    def set_active_color(self, color):
+        if color != EMPTY_COLOR:
+            self.active_color = color
+
+    def notify_preview(self):
+        pass # No preview without a UI
+
+    # --- FRAMES ---
+    def add_frame(self, pixel_source=None):
+        frame = FrameDocument(self, self.rows, self.cols, self.pixel_size,
+                              f"Frame {len(self.frames) + 1}", pixel_source)
+        self.frames.append(frame)
+        return frame
+
+    def meta(self):
+        return {
+            "rows": self.rows, 
+            "cols": self.cols, 
+            "pixel_size": self.pixel_size,
+            "palette": self.current_palette
+        }
+
+    # --- FILES ---
+    @classmethod
+    def load(cls, path):
+        """
+        Opens a .pxp file (frames are decoded on first use) or a folder project
+        (the folder, or any file inside it).
+        """
+        if path.endswith(PROJECT_EXTENSION):
+            reader = ProjectReader(path)
+            doc = cls._from_meta(reader.meta)
+            doc.reader = reader
+            for i in range(len(reader)):
+                restore_saved_layers(doc.add_frame(reader.lazy_frame(i)), reader, i)
+        else:
+            folder = path if os.path.isdir(path) else os.path.dirname(path)
+            meta, paths = read_folder(folder)
+            doc = cls._from_meta(meta)
+            for frame_path in paths:
+                doc.add_frame(LoadedFrame(read_frame_file(frame_path, doc.rows, doc.cols)))
+            if not paths: doc.add_frame()
+        doc.path = path
+        return doc
+
+    @classmethod
+    def _from_meta(cls, meta):
+        return cls(meta.get("rows", 33), meta.get("cols", 45), meta.get("pixel_size", 15),
+                   meta.get("palette"))
+
+    def save(self, path=None):
+        """Saves to `path` (default: where it was loaded from) as a .pxp file or a folder."""
+        path = path or self.path
+        if path.endswith(PROJECT_EXTENSION):
+            entries, extra = container_entries(self.frames)
+            self.close()
+            write_project(path, dict(self.meta(), **extra), entries)
+        else:
+            # Folder projects hold one image per frame: layers are saved merged
+            save_folder(path, self.meta(), [frame.composite for frame in self.frames])
+        self.path = path
+
+    def close(self):
+        """Releases the .pxp file, decoding any frames still read from it."""
+        if self.reader:
+            for frame in self.frames:
+                for layer in frame.layers:
+                    if layer.source: layer.pixels = layer.source.load()
+            self.reader.close()
+            self.reader = None
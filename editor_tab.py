@@ -1,41 +1,65 @@
 # editor_tab.py
 import tkinter as tk
+from collections import OrderedDict
 from settings import *
-from history import HistoryManager
-from algorithms import get_line_pixels
-
-class EditorTab:
-    """Represents a single Tab/Frame in the animation."""
-    def __init__(self, notebook, app_ref, rows, cols, pixel_size, name="Frame"):
-        self.app = app_ref 
-        self.rows = rows
-        self.cols = cols
-        self.pixel_size = pixel_size
+from algorithms import get_polyline_pixels
+from document import FrameDocument, _union_rect
+from renderer import RasterRenderer, max_zoom, zoom_budget, zoom_step
+from tracing import tracer
+
+# Tabs whose canvas currently exists, least recently shown first
+_live_views = OrderedDict()
+
+def _touch_view(tab):
+    """Marks a tab's view as just shown and releases the oldest hidden ones over the caps."""
+    _live_views.pop(tab, None)
+    _live_views[tab] = None
+    _trim_views(tab)
+
+def _trim_views(keep):
+    """
+    Releases hidden views, least recently shown first, while there are more
+    than MAX_LIVE_TABS or their zoom images go over the shared zoom budget.
+    """
+    for old in list(_live_views):
+        if len(_live_views) <= MAX_LIVE_TABS + 1 and not zoom_budget.over_limit(): break # +1 for the visible tab
+        if old is not keep and not old.frame.winfo_ismapped():
+            old.release_view()
+
+class EditorTab(FrameDocument):
+    """Represents a single Tab/Frame in the animation: a FrameDocument plus its canvas view."""
+    def __init__(self, notebook, app_ref, rows, cols, pixel_size, name="Frame", pixel_source=None):
+        super().__init__(app_ref, rows, cols, pixel_size, name, pixel_source)
         self.prev_right_click_pos = None
-
-        # --- SYMMETRY STATE ---
-        self.mirror_x = False
-        self.mirror_y = False
-        
-        # Data Structures
-        self.grid_data = [[EMPTY_COLOR for _ in range(self.cols)] for _ in range(self.rows)]
-        
-        self.history_manager = HistoryManager() 
-
-        self.rects = {} 
-
-        # --- SELECTION STATE ---
-        self.sel_start = None 
-        self.sel_end = None    
         self.sel_rect_id = None
-        
-        # Floating Layer
-        self.floating_pixels = None 
-        self.floating_offset = None 
+        self._locked_press = False # The current mouse press hit a locked layer
+
+        # --- RENDER SCHEDULING ---
+        # Union of cells changed since the last repaint, as (r1, c1, r2, c2)
+        self.dirty_rect = None
+        self._render_job = None
+        # Drag motion queued since the last idle tick: cells, event start times
+        # (while tracing) and the stroke function that applies them
+        self._motion = []
+        self._motion_starts = []
+        self._motion_apply = None
+        self._motion_job = None
 
         # UI Elements
+        # Only the notebook page exists up front; the canvas, scrollbars and
+        # rendered images are created when the tab is first shown.
         self.frame = tk.Frame(notebook)
-        
+        self.canvas = None
+        self.renderer = None
+        self.frame.bind("<Map>", self._on_map)
+
+    # --- VIEW LIFETIME ---
+    def _on_map(self, event=None):
+        if self.canvas is None:
+            self._build_view()
+        _touch_view(self)
+
+    def _build_view(self):
         self.v_scroll = tk.Scrollbar(self.frame, orient=tk.VERTICAL)
         self.h_scroll = tk.Scrollbar(self.frame, orient=tk.HORIZONTAL)
         self.canvas = tk.Canvas(self.frame, bg="#cccccc",
@@ -49,6 +73,8 @@ class EditorTab:
         self.h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
+        self.renderer = RasterRenderer(self.canvas)
+
         # Bindings
         self.canvas.bind("<Button-1>", self.on_click)      
         self.canvas.bind("<B1-Motion>", self.on_drag) 
@@ -59,49 +85,62 @@ class EditorTab:
         
         self.canvas.bind("<MouseWheel>", self._on_mousewheel)
         self.canvas.bind("<Shift-MouseWheel>", self._on_shift_mousewheel)
+        self.canvas.bind("<Control-MouseWheel>", self._on_control_mousewheel)
+        self.canvas.bind("<Control-Button-4>", self._on_control_mousewheel) # X11 wheel
+        self.canvas.bind("<Control-Button-5>", self._on_control_mousewheel)
 
         self.draw_grid_lines()
 
+    def release_view(self):
+        """Destroys the canvas and its images. The frame's data and history are kept."""
+        _live_views.pop(self, None)
+        if self.canvas is None: return
+        for widget in (self.canvas, self.v_scroll, self.h_scroll):
+            widget.destroy()
+        self.canvas = None
+        self.renderer = None
+        self.sel_rect_id = None
+
+    # --- DRAWING ---
     def draw_grid_lines(self):
+        super().draw_grid_lines()
+        self.dirty_rect = None # Everything is repainted below
+        if self.canvas is None: return # Drawn when the tab is shown
+        start = tracer.now() if tracer.enabled else None
         self.canvas.delete("all") 
-        self.rects = {} 
         self.sel_rect_id = None
 
+        # A new tab starts at the project's pixel size, which may be too large to cache
+        self.pixel_size = max(1, min(self.pixel_size, max_zoom(self.rows, self.cols)))
         width = self.cols * self.pixel_size
         height = self.rows * self.pixel_size
         self.canvas.config(scrollregion=(0, 0, width, height))
         
-        # 1. Draw Base Pixels
-        for r in range(self.rows):
-            for c in range(self.cols):
-                if r >= len(self.grid_data) or c >= len(self.grid_data[0]): continue
-                color = self.grid_data[r][c]
-                x1, y1 = c * self.pixel_size, r * self.pixel_size
-                rect = self.canvas.create_rectangle(x1, y1, x1+self.pixel_size, y1+self.pixel_size, 
-                                                    outline="", fill=color)
-                self.rects[(r, c)] = rect
-
-        # 2. Draw Floating Pixels (Tag them "floating")
-        if self.floating_pixels and self.floating_offset:
-            fr, fc = self.floating_offset
-            for (lr, lc), color in self.floating_pixels.items():
-                if color == EMPTY_COLOR: continue
-                ar, ac = fr + lr, fc + lc
-                x1, y1 = ac * self.pixel_size, ar * self.pixel_size
-                self.canvas.create_rectangle(x1, y1, x1+self.pixel_size, y1+self.pixel_size,
-                                             outline="", fill=color, tags="floating")
-
-        # 3. Draw Grid Lines
+        # 1. Draw Base Pixels (one image for the whole frame)
+        self.renderer.rebuild(self.composite, self.pixel_size)
+
+        # 2. Draw Grid Lines (one transparent overlay image)
         if self.app.show_grid:
-            grid_color = "#bbbbbb"
-            for c in range(self.cols + 1):
-                x = c * self.pixel_size
-                self.canvas.create_line(x, 0, x, height, fill=grid_color)
-            for r in range(self.rows + 1):
-                y = r * self.pixel_size
-                self.canvas.create_line(0, y, width, y, fill=grid_color)
-
-        # 4. Draw Selection Box (Tag it "ui")
+            self.renderer.draw_grid()
+
+        # 3. Floating layer + selection box
+        self.draw_selection_overlay()
+        if start is not None: tracer.flushed(start)
+
+    def draw_selection_overlay(self):
+        """Redraws only the floating layer and selection box, not the frame."""
+        if self.canvas is None: return
+        self.canvas.delete("floating")
+        self.canvas.delete("ui")
+        self.sel_rect_id = None
+
+        # 1. Draw Floating Pixels (one image tagged "floating", kept under the grid)
+        if self.floating_pixels and self.floating_offset:
+            self.renderer.draw_floating(self.floating_pixels, self.floating_offset)
+            if self.app.show_grid:
+                self.canvas.tag_raise("grid", "floating")
+
+        # 2. Draw Selection Box (Tag it "ui")
         if self.sel_start and self.sel_end:
             r1, c1, r2, c2 = self.get_selection_bounds()
             if self.floating_pixels:
@@ -124,9 +163,11 @@ class EditorTab:
     def visual_move_selection(self, dr, dc):
         """
         Moves the floating layer and selection box instantly using canvas.move
-        instead of redrawing the entire grid.
+        instead of redrawing the entire grid. Also updates floating_offset.
         """
         if not self.floating_pixels: return
+        super().visual_move_selection(dr, dc)
+        if self.canvas is None: return
         
         # Convert grid delta to pixel delta
         dx = dc * self.pixel_size
@@ -136,155 +177,103 @@ class EditorTab:
         self.canvas.move("floating", dx, dy)
         self.canvas.move("ui", dx, dy)
 
-    def get_selection_bounds(self):
-        if not self.sel_start or not self.sel_end: return None
-        r1, c1 = self.sel_start
-        r2, c2 = self.sel_end
-        return (min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2))
-
-    def point_in_selection(self, r, c):
-        if self.floating_pixels and self.floating_offset:
-             bounds = self.get_selection_bounds()
-             if not bounds: return False
-             orig_r1, orig_c1, orig_r2, orig_c2 = bounds
-             h, w = orig_r2 - orig_r1, orig_c2 - orig_c1
-             fr, fc = self.floating_offset
-             return (fr <= r <= fr + h) and (fc <= c <= fc + w)
-        bounds = self.get_selection_bounds()
-        if not bounds: return False
-        r1, c1, r2, c2 = bounds
-        return (r1 <= r <= r2) and (c1 <= c <= c2)
-
-    def commit_selection(self):
-        if self.floating_pixels and self.floating_offset:
-            self.save_state()
-            fr, fc = self.floating_offset
-            for (lr, lc), color in self.floating_pixels.items():
-                ar, ac = fr + lr, fc + lc
-                if 0 <= ar < self.rows and 0 <= ac < self.cols:
-                    if color != EMPTY_COLOR:
-                        self.grid_data[ar][ac] = color
-            self.floating_pixels = None
-            self.floating_offset = None
-            self.app.notify_preview()
-            
-        self.sel_start = None
-        self.sel_end = None
-        self.draw_grid_lines()
-
-    def lift_selection_to_float(self):
-        if self.floating_pixels: return 
-        bounds = self.get_selection_bounds()
-        if not bounds: return
-        self.save_state()
-        r1, c1, r2, c2 = bounds
-        self.floating_pixels = {}
-        self.floating_offset = (r1, c1)
-        for r in range(r1, r2 + 1):
-            for c in range(c1, c2 + 1):
-                self.floating_pixels[(r - r1, c - c1)] = self.grid_data[r][c]
-                self.grid_data[r][c] = EMPTY_COLOR
-        self.draw_grid_lines()
-
-    def copy_to_clipboard(self):
-        if self.floating_pixels:
-            self.app.clipboard = self.floating_pixels.copy()
-            return True
-        bounds = self.get_selection_bounds()
-        if not bounds: return False
-        r1, c1, r2, c2 = bounds
-        data = {}
-        for r in range(r1, r2 + 1):
-            for c in range(c1, c2 + 1):
-                 data[(r - r1, c - c1)] = self.grid_data[r][c]
-        self.app.clipboard = data
-        return True
-
-    def paste_from_clipboard(self, clipboard_data):
-        if not clipboard_data: return
-        self.commit_selection()
-        if not clipboard_data: return
-        max_r = max(k[0] for k in clipboard_data.keys())
-        max_c = max(k[1] for k in clipboard_data.keys())
-        self.sel_start = (0, 0)
-        self.sel_end = (max_r, max_c)
-        self.floating_pixels = clipboard_data.copy()
-        self.floating_offset = (0, 0)
-        self.draw_grid_lines()
-        self.app.notify_preview()
-
-    def move_selection_by_offset(self, dr, dc):
-        if not self.sel_start: return
-        if not self.floating_pixels: self.lift_selection_to_float()
-        curr_r, curr_c = self.floating_offset
-        self.floating_offset = (curr_r + dr, curr_c + dc)
-        self.draw_grid_lines()
-        self.app.notify_preview()
-
-    # --- HISTORY METHODS ---
-    def save_state(self):
-        self.history_manager.push_state(self.grid_data)
-        
-    def perform_undo(self):
-        new_state = self.history_manager.undo(self.grid_data)
-        if new_state:
-            self.grid_data = new_state
-            self.rows = len(self.grid_data)
-            self.cols = len(self.grid_data[0]) if self.rows > 0 else 0
-            self.sel_start = None
-            self.sel_end = None
-            self.floating_pixels = None
-            self.draw_grid_lines()
-            self.app.notify_preview()
-
-    def perform_redo(self):
-        new_state = self.history_manager.redo(self.grid_data)
-        if new_state:
-            self.grid_data = new_state
-            self.rows = len(self.grid_data)
-            self.cols = len(self.grid_data[0]) if self.rows > 0 else 0
-            self.draw_grid_lines()
-            self.app.notify_preview()
-
-    def get_flattened_data(self):
-        """Returns the grid with any active selection overlayed."""
-        if not self.floating_pixels:
-            return self.grid_data
-        
-        temp = [row[:] for row in self.grid_data]
-        
-        if self.floating_offset:
-            fr, fc = self.floating_offset
-            for (lr, lc), color in self.floating_pixels.items():
-                r, c = fr + lr, fc + lc
-                if 0 <= r < self.rows and 0 <= c < self.cols:
-                    if color != EMPTY_COLOR:
-                        temp[r][c] = color
-        return temp
+    def draw_hud(self, lines):
+        """Shows text lines in a box at the top-left of the visible canvas area (tag "hud")."""
+        self.clear_hud()
+        if self.canvas is None: return
+        x, y = self.canvas.canvasx(8), self.canvas.canvasy(8)
+        text = self.canvas.create_text(x + 6, y + 4, text="\n".join(lines), anchor=tk.NW,
+                                       fill="#00FF66", font=("Courier", 9), tags="hud")
+        x1, y1, x2, y2 = self.canvas.bbox(text)
+        self.canvas.create_rectangle(x1 - 6, y1 - 4, x2 + 6, y2 + 4, fill="#202020", outline="", tags="hud")
+        self.canvas.tag_raise(text)
+
+    def clear_hud(self):
+        if self.canvas is not None:
+            self.canvas.delete("hud")
 
     # --- DELEGATED EVENTS ---
-    def on_click(self, event):
+    def _event_cell(self, event):
+        """The (r, c) cell under a mouse event (may be out of bounds)."""
         canvas_x = self.canvas.canvasx(event.x)
         canvas_y = self.canvas.canvasy(event.y)
-        c = int(canvas_x // self.pixel_size)
-        r = int(canvas_y // self.pixel_size)
-        if self.app.active_tool:
-            self.app.active_tool.on_click(self, r, c, event)
+        return int(canvas_y // self.pixel_size), int(canvas_x // self.pixel_size)
+
+    def on_click(self, event):
+        r, c = self._event_cell(event)
+        tool = self.app.active_tool
+        if tool and self._blocked_by_lock(tool.edits_layer): return
+        self._run_tool("click", event, r, c)
 
     def on_drag(self, event):
-        canvas_x = self.canvas.canvasx(event.x)
-        canvas_y = self.canvas.canvasy(event.y)
-        c = int(canvas_x // self.pixel_size)
-        r = int(canvas_y // self.pixel_size)
-        if self.app.active_tool:
-            self.app.active_tool.on_drag(self, r, c, event)
+        if self._locked_press: return
+        r, c = self._event_cell(event)
+        tool = self.app.active_tool
+        if tool and tool.coalesce_motion:
+            self._queue_motion(event, r, c, lambda points: tool.on_stroke(self, points, event))
+        else:
+            self._run_tool("drag", event, r, c)
 
     def on_release(self, event):
-        if self.app.active_tool:
-            self.app.active_tool.on_release(self, event)
+        if self._locked_press:
+            self._locked_press = False
+            return
+        self.flush_motion()
+        self._run_tool("release", event, *self._event_cell(event))
+
+    def _blocked_by_lock(self, edits=True):
+        """True (with a toast) if a press would edit a locked layer. Its drag and release are then ignored too."""
+        self._locked_press = edits and self.layer_locked
+        if self._locked_press:
+            self.app.show_toast(f"{self.layers[self.active_layer].name} is locked")
+        return self._locked_press
+
+    def _run_tool(self, kind, event, *cell):
+        """Calls the active tool's on_<kind> handler, traced as one input event when tracing is on."""
+        tool = self.app.active_tool
+        if not tool: return
+        handler = getattr(tool, "on_" + kind)
+        if not tracer.enabled:
+            handler(self, *cell, event)
+            return
+        start = tracer.begin_event(event)
+        handler(self, *cell, event)
+        tracer.span("tool", f"{type(tool).__name__}.on_{kind}", start)
+        tracer.end_event(kind, start, self.dirty_rect is not None)
+
+    # --- MOTION COALESCING ---
+    def _queue_motion(self, event, r, c, apply):
+        """
+        Queues a drag event's cell. Tk runs idle callbacks only once its event
+        queue is empty, so however far the handlers fall behind, all motion
+        queued by then is applied by one apply(points) call.
+        """
+        if tracer.enabled: self._motion_starts.append(tracer.begin_event(event))
+        if not self._motion or self._motion[-1] != (r, c):
+            self._motion.append((r, c))
+        self._motion_apply = apply
+        if self._motion_job is None:
+            self._motion_job = self.frame.after_idle(self.flush_motion)
+
+    def flush_motion(self):
+        """Applies the queued motion as one stroke and repaints it right away."""
+        if self._motion_job is not None:
+            self.frame.after_cancel(self._motion_job)
+            self._motion_job = None
+        points, starts = self._motion, self._motion_starts
+        self._motion, self._motion_starts = [], []
+        if points:
+            stroke_start = tracer.now() if starts else None
+            self._motion_apply(points)
+            if stroke_start is not None: tracer.span("tool", "stroke", stroke_start, len(points))
+        for start in starts:
+            tracer.end_event("drag", start, self.dirty_rect is not None)
+        if self.dirty_rect: self.flush_render()
 
     # --- RIGHT CLICK OVERRIDES ---
     def start_eraser_override(self, event):
+        if self._blocked_by_lock(): return
+        start = tracer.begin_event(event) if tracer.enabled else None
         self.commit_selection()
         self.save_state()
         
@@ -297,26 +286,25 @@ class EditorTab:
         # Erase and initialize previous position
         self._manual_erase(r, c)
         self.prev_right_click_pos = (r, c)
+        if start is not None: tracer.end_event("erase", start, self.dirty_rect is not None)
     
     def drag_eraser_override(self, event):
-        canvas_x = self.canvas.canvasx(event.x)
-        canvas_y = self.canvas.canvasy(event.y)
-        c = int(canvas_x // self.pixel_size)
-        r = int(canvas_y // self.pixel_size)
-
-        # Interpolate line if we have a previous position
-        if self.prev_right_click_pos:
-            pr, pc = self.prev_right_click_pos
-            if (pr, pc) != (r, c):
-                pixels = get_line_pixels(pr, pc, r, c)
-                for lr, lc in pixels:
-                    self._manual_erase(lr, lc)
-        else:
-            self._manual_erase(r, c)
-            
-        self.prev_right_click_pos = (r, c)
+        if self._locked_press: return
+        r, c = self._event_cell(event)
+        self._queue_motion(event, r, c, self._erase_stroke)
+
+    def _erase_stroke(self, points):
+        # Interpolate from the previous position through every queued cell
+        start = [self.prev_right_click_pos] if self.prev_right_click_pos else []
+        self.paint_pixels(get_polyline_pixels(start + points), EMPTY_COLOR)
+        self.app.notify_preview()
+        self.prev_right_click_pos = points[-1]
 
     def stop_eraser_override(self, event):
+        if self._locked_press:
+            self._locked_press = False
+            return
+        self.flush_motion()
         self.prev_right_click_pos = None
 
     def _manual_erase(self, r, c):
@@ -329,35 +317,85 @@ class EditorTab:
 
     def _on_shift_mousewheel(self, event):
         self.canvas.xview_scroll(int(-1*(event.delta/120)), "units")
-    
-    def paint_pixel(self, r, c, color):
+
+    def _on_control_mousewheel(self, event):
+        steps = 1 if event.num == 4 or event.delta > 0 else -1
+        self.set_zoom(zoom_step(self.pixel_size, steps), (event.x, event.y))
+
+    # --- ZOOM ---
+    # pixel_size is this tab's screen pixels per cell; the project's own
+    # pixel size (app.pixel_size, used for exports) is not changed by zooming.
+    def set_zoom(self, pixel_size, anchor=None):
+        """
+        Shows the frame at another pixel size, keeping the cell under `anchor`
+        (widget x, y; default: the middle of the view) in place. Levels seen
+        before come from the renderer's cache, so nothing is re-rasterized.
+        """
+        pixel_size = max(1, min(pixel_size, max_zoom(self.rows, self.cols)))
+        old = self.pixel_size
+        if pixel_size == old: return
+        self.pixel_size = pixel_size
+        if self.canvas is None: return # Drawn at this size when the tab is shown
+        self.flush_motion()
+        if self.dirty_rect: self.flush_render()
+
+        if anchor is None:
+            anchor = (self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2)
+        ax, ay = anchor
+        gx, gy = self.canvas.canvasx(ax) / old, self.canvas.canvasy(ay) / old
+        width, height = self.cols * pixel_size, self.rows * pixel_size
+        self.canvas.config(scrollregion=(0, 0, width, height))
+        self.renderer.set_zoom(pixel_size)
+        self.canvas.delete("grid")
+        if self.app.show_grid:
+            self.renderer.draw_grid()
+        _trim_views(self)
+        self.draw_selection_overlay()
+        self.canvas.xview_moveto((gx * pixel_size - ax) / width)
+        self.canvas.yview_moveto((gy * pixel_size - ay) / height)
+
+    def zoom_to_fit(self):
+        """Largest pixel size at which the whole frame fits in the view."""
+        if self.canvas is None: return
+        fit = min(self.canvas.winfo_width() // self.cols, self.canvas.winfo_height() // self.rows)
+        self.set_zoom(fit)
+
+    def zoom_by(self, steps):
+        self.set_zoom(zoom_step(self.pixel_size, steps))
+
+    # --- RENDER SCHEDULING ---
+    def draw_pixel(self, r, c, color=None):
+        """
+        Updates only the on-screen image for (r, c), leaving the data alone.
+        Used by tool previews; color=None restores the stored color.
+        """
+        if self.canvas and 0 <= r < self.rows and 0 <= c < self.cols:
+            # A pending flush would paint over the preview, so apply it first
+            if self.dirty_rect: self.flush_render()
+            if color is None:
+                color = self.composite.get(r, c)
+            self.renderer.paint_cell(r, c, color)
+
+    def invalidate(self, r1, c1, r2=None, c2=None):
         """
-        Central method to paint a pixel. 
-        Handles Bounds Checking, Visual Updates, and Symmetry.
+        Marks the cells (r1, c1)-(r2, c2) as changed. All invalidations made
+        before Tk goes idle are merged and repainted by one flush_render().
         """
-        # 1. Paint the primary pixel
-        self._set_single_pixel(r, c, color)
-
-        # 2. Handle Mirror X
-        if self.mirror_x:
-            mirror_c = (self.cols - 1) - c
-            self._set_single_pixel(r, mirror_c, color)
-            
-        # 3. Handle Mirror Y
-        if self.mirror_y:
-            mirror_r = (self.rows - 1) - r
-            self._set_single_pixel(mirror_r, c, color)
-            
-        # 4. Handle Mirror X + Y (The diagonal corner)
-        if self.mirror_x and self.mirror_y:
-            mirror_c = (self.cols - 1) - c
-            mirror_r = (self.rows - 1) - r
-            self._set_single_pixel(mirror_r, mirror_c, color)
-
-    def _set_single_pixel(self, r, c, color):
-        """Internal helper to actually set data and canvas."""
-        if 0 <= r < self.rows and 0 <= c < self.cols:
-            if self.grid_data[r][c] != color:
-                self.grid_data[r][c] = color
-                if (r, c) in self.rects:
-                    self.canvas.itemconfig(self.rects[(r, c)], fill=color)
\ No newline at end of file
+        super().invalidate(r1, c1, r2, c2)
+        if r2 is None: r2, c2 = r1, c1
+        self.dirty_rect = _union_rect(self.dirty_rect, r1, c1, r2, c2)
+        if self._render_job is None:
+            self._render_job = self.frame.after_idle(self.flush_render)
+
+    def flush_render(self):
+        """Repaints the accumulated dirty rectangle (clipped to the grid)."""
+        self._render_job = None
+        if not self.dirty_rect or self.canvas is None: return
+        start = tracer.now() if tracer.enabled else None
+        r1, c1, r2, c2 = self.dirty_rect
+        self.dirty_rect = None
+        r1, c1 = max(r1, 0), max(c1, 0)
+        r2, c2 = min(r2, self.rows - 1), min(c2, self.cols - 1)
+        if r1 <= r2 and c1 <= c2:
+            self.renderer.paint_region(self.composite, r1, c1, r2, c2)
+        if start is not None: tracer.flushed(start, (r1, c1, r2, c2))
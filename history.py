@@ -1,59 +1,209 @@
 # history.py
-import copy
+import weakref
+from array import array
+from collections import deque
+from settings import HISTORY_BUDGET_BYTES
+
+EDIT_OVERHEAD_BYTES = 128 # Rough cost of one _Edit object besides its arrays
+
+class _Edit:
+    """
+    One undoable operation.
+
+    Pixel edits store only the cells that changed: either densely over
+    their bounding box, or as a sparse list of positions when that is
+    smaller. Edits that replace the whole buffer (e.g. resizing the grid)
+    keep the before/after PixelBuffers instead.
+    """
+    __slots__ = ("seq", "bounds", "positions", "before", "after", "nbytes")
+
+    def __init__(self, seq, bounds, positions, before, after):
+        self.seq = seq
+        self.bounds = bounds        # (r1, c1, r2, c2) or None for a buffer swap
+        self.positions = positions  # array of flat indices, or None if dense
+        self.before = before
+        self.after = after
+        if bounds is None:
+            self.nbytes = before.nbytes + after.nbytes + EDIT_OVERHEAD_BYTES
+        else:
+            self.nbytes = (len(before) + len(after)) * before.itemsize + EDIT_OVERHEAD_BYTES
+            if positions is not None:
+                self.nbytes += len(positions) * positions.itemsize
+
+class HistoryBudget:
+    """
+    A byte budget shared by several HistoryManagers (one per tab).
+    When the total goes over the limit, the oldest edits across all
+    tabs are evicted first.
+    """
+    def __init__(self, limit_bytes=HISTORY_BUDGET_BYTES):
+        self.limit_bytes = limit_bytes
+        self.used_bytes = 0
+        self.managers = weakref.WeakSet()
+        self._next_seq = 0
+
+    def next_seq(self):
+        self._next_seq += 1
+        return self._next_seq
+
+    def charge(self, nbytes):
+        self.used_bytes += nbytes
+        while self.used_bytes > self.limit_bytes:
+            if not self._evict_oldest(): break
+
+    def _evict_oldest(self):
+        oldest, oldest_stack = None, None
+        for manager in self.managers:
+            for stack in (manager.history, manager.redo_stack):
+                if stack and (oldest is None or stack[0].seq < oldest.seq):
+                    oldest, oldest_stack = stack[0], stack
+        if oldest is None: return False
+        oldest_stack.popleft()
+        self.used_bytes -= oldest.nbytes
+        return True
+
+shared_budget = HistoryBudget()
 
 class HistoryManager:
     """
-    Manages the Undo/Redo stacks for a grid of data.
+    Manages the Undo/Redo stacks for a PixelBuffer as deltas.
+
+    push_state() opens a new edit and turns on the buffer's undo_log, so
+    every write records the cell's old value. The edit is closed (and
+    reduced to the cells that really changed) on the next push/undo/redo.
     """
-    def __init__(self, max_depth=50):
-        self.history = []     # Past states
-        self.redo_stack = []  # Future states (after undo)
+    def __init__(self, max_depth=50, budget=None):
+        self.history = deque()     # Past edits (oldest first)
+        self.redo_stack = deque()  # Undone edits (most recent last)
         self.max_depth = max_depth
+        self.budget = budget if budget is not None else shared_budget
+        self.budget.managers.add(self)
+        self._open = None          # Buffer currently recording an edit
 
     def push_state(self, current_grid):
-        """Saves the current state before a change occurs."""
-        if not current_grid: return
-        
-        # Deep copy to ensure we save a snapshot, not a reference
-        snapshot = [row[:] for row in current_grid]
-        
-        self.history.append(snapshot)
-        if len(self.history) > self.max_depth:
-            self.history.pop(0)
-            
-        # Pushing a new action always clears the Redo history
-        self.redo_stack.clear()
+        """Starts recording a new edit on `current_grid` before a change occurs."""
+        if current_grid is None: return
+        self._close_open_edit()
+        current_grid.undo_log = {}
+        self._open = current_grid
+
+    def record_replace(self, old_buffer, new_buffer):
+        """Records an edit that swaps the whole buffer (e.g. a grid resize)."""
+        self._close_open_edit()
+        self._append(_Edit(self.budget.next_seq(), None, None, old_buffer, new_buffer))
+
+    def clear(self):
+        """Drops every edit and any open one (e.g. after a change that cannot be undone)."""
+        if self._open is not None:
+            self._open.undo_log = None
+            self._open = None
+        for stack in (self.history, self.redo_stack):
+            for edit in stack:
+                self.budget.used_bytes -= edit.nbytes
+            stack.clear()
+
+    def drop_buffer_swaps(self):
+        """
+        Forgets whole-buffer edits (record_replace) together with the edits
+        on the far side of them, which only fit the buffer's other size.
+        Used when a swap can no longer be undone alone (e.g. the frame got
+        more layers, which the swap would not resize).
+        """
+        self._close_open_edit()
+        swaps = [i for i, edit in enumerate(self.history) if edit.bounds is None]
+        for _ in range(swaps[-1] + 1 if swaps else 0): # Undone last: the oldest edits
+            self.budget.used_bytes -= self.history.popleft().nbytes
+        swaps = [i for i, edit in enumerate(self.redo_stack) if edit.bounds is None]
+        for _ in range(swaps[-1] + 1 if swaps else 0): # Redone last: the bottom of the stack
+            self.budget.used_bytes -= self.redo_stack.popleft().nbytes
 
     def undo(self, current_grid):
         """
-        Returns the previous state grid. 
-        Also saves 'current_grid' into the Redo stack.
-        Returns None if nothing to undo.
+        Reverts the most recent edit.
+        Returns (buffer, region): the buffer now holding the frame (a different
+        object only for whole-buffer edits) and the (r1, c1, r2, c2) region that
+        changed, or None if everything did. Returns None if nothing to undo.
         """
+        self._close_open_edit()
         if not self.history:
             return None
-        
-        # 1. Push current state to Redo
-        redo_snapshot = [row[:] for row in current_grid]
-        self.redo_stack.append(redo_snapshot)
-        
-        # 2. Pop previous state from History
-        prev_state = self.history.pop()
-        return prev_state
+        edit = self.history.pop()
+        self.redo_stack.append(edit)
+        return self._apply(edit, current_grid, edit.before)
 
     def redo(self, current_grid):
-        """
-        Returns the next state grid.
-        Also saves 'current_grid' back into History.
-        Returns None if nothing to redo.
-        """
+        """Re-applies the most recently undone edit. Same return value as undo()."""
+        self._close_open_edit()
         if not self.redo_stack:
             return None
+        edit = self.redo_stack.pop()
+        self.history.append(edit)
+        return self._apply(edit, current_grid, edit.after)
+
+    # --- INTERNALS ---
+    def _append(self, edit):
+        self.history.append(edit)
+        if len(self.history) > self.max_depth:
+            self.budget.used_bytes -= self.history.popleft().nbytes
+
+        # Pushing a new action always clears the Redo history
+        for undone in self.redo_stack:
+            self.budget.used_bytes -= undone.nbytes
+        self.redo_stack.clear()
+        self.budget.charge(edit.nbytes)
+
+    def _close_open_edit(self):
+        buf = self._open
+        if buf is None: return
+        self._open = None
+        log = buf.undo_log
+        buf.undo_log = None
+        data = buf.data
+
+        # Ignore cells that ended up back at their original value
+        changed = {pos: old for pos, old in log.items() if data[pos] != old}
+        if not changed: return
+
+        cols = buf.cols
+        rows_touched = [pos // cols for pos in changed]
+        cols_touched = [pos % cols for pos in changed]
+        r1, r2 = min(rows_touched), max(rows_touched)
+        c1, c2 = min(cols_touched), max(cols_touched)
+        bounds = (r1, c1, r2, c2)
+        width = c2 - c1 + 1
+        area = (r2 - r1 + 1) * width
+
+        if len(changed) * (4 + 2 * data.itemsize) < area * 2 * data.itemsize:
+            # Sparse: flat positions plus old/new value per changed cell
+            positions = array("I", changed)
+            before = array(data.typecode, changed.values())
+            after = array(data.typecode, [data[pos] for pos in positions])
+        else:
+            # Dense: old/new values over the bounding box
+            positions = None
+            after = array(data.typecode)
+            for r in range(r1, r2 + 1):
+                start = r * cols + c1
+                after.extend(data[start:start + width])
+            before = array(data.typecode, after)
+            for pos, old in changed.items():
+                before[(pos // cols - r1) * width + (pos % cols - c1)] = old
+        self._append(_Edit(self.budget.next_seq(), bounds, positions, before, after))
 
-        # 1. Push current state back to History
-        history_snapshot = [row[:] for row in current_grid]
-        self.history.append(history_snapshot)
-        
-        # 2. Pop next state from Redo
-        next_state = self.redo_stack.pop()
-        return next_state
\ No newline at end of file
+    def _apply(self, edit, current_grid, values):
+        if edit.bounds is None:
+            return values, None
+        data = current_grid.data
+        if values.typecode != data.typecode:
+            values = array(data.typecode, values)
+        if edit.positions is not None:
+            for pos, value in zip(edit.positions, values):
+                data[pos] = value
+        else:
+            r1, c1, r2, c2 = edit.bounds
+            width = c2 - c1 + 1
+            cols = current_grid.cols
+            for i, r in enumerate(range(r1, r2 + 1)):
+                start = r * cols + c1
+                data[start:start + width] = values[i * width:(i + 1) * width]
+        return current_grid, edit.bounds
@@ -0,0 +1,585 @@
+# image_export.py
+# Reads and writes frames as image files (PNG frames, sprite sheets and atlases, animated GIFs).
+# Pure Python + zlib, no tkinter, so it runs in batch jobs and worker processes.
+import json
+import os
+import struct
+import zlib
+from array import array
+from document import _union_rect
+from pixel_buffer import PixelBuffer
+from settings import EMPTY_COLOR
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def _rgb(color):
+    return bytes.fromhex(color.lstrip("#")[:6])
+
+def _scaled_rows(buf, scale):
+    """Yields each output row (scale x scale per pixel) as RGB bytes."""
+    palette = [_rgb(color) * scale for color in buf.colors]
+    for r in range(buf.rows):
+        start = r * buf.cols
+        line = b"".join([palette[i] for i in buf.data[start:start + buf.cols]])
+        for _ in range(scale):
+            yield line
+
+# --- PNG ---
+PNG_IDAT_BYTES = 64 * 1024 # Compressed bytes per IDAT chunk while streaming
+
+def _png_chunk(kind, payload):
+    return (struct.pack(">I", len(payload)) + kind + payload
+            + struct.pack(">I", zlib.crc32(kind + payload)))
+
+def _index_rows(buf, scale):
+    """Yields each output row (scale x scale per pixel) as 1-byte palette indices."""
+    widen = [bytes([i]) * scale for i in range(256)]
+    for r in range(buf.rows):
+        start = r * buf.cols
+        row = buf.data[start:start + buf.cols]
+        line = row.tobytes() if scale == 1 else b"".join([widen[i] for i in row])
+        for _ in range(scale):
+            yield line
+
+def write_png(path, buf, scale=1, transparent=False):
+    """
+    Writes a PixelBuffer as a PNG, each pixel scale x scale. Frames with up
+    to 256 colors are written as indexed PNG straight from the frame's color
+    table; others as RGB. With transparent=True, EMPTY_COLOR cells are
+    transparent. Rows are compressed and written one at a time, so memory
+    stays at one output row however large the image is.
+    """
+    width, height = buf.cols * scale, buf.rows * scale
+    indexed = buf.data.typecode == "B"
+    with open(path, "wb") as f:
+        f.write(PNG_SIGNATURE)
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8,
+                                                3 if indexed else 2, 0, 0, 0)))
+        if indexed:
+            f.write(_png_chunk(b"PLTE", b"".join(_rgb(color) for color in buf.colors)))
+            if transparent:
+                f.write(_png_chunk(b"tRNS", b"\x00")) # Index 0 is always EMPTY_COLOR
+            rows = _index_rows(buf, scale)
+        else:
+            if transparent:
+                f.write(_png_chunk(b"tRNS", struct.pack(">HHH", *_rgb(EMPTY_COLOR))))
+            rows = _scaled_rows(buf, scale)
+
+        compressor = zlib.compressobj(6)
+        pending = bytearray()
+        for line in rows:
+            pending += compressor.compress(b"\x00" + line)
+            if len(pending) >= PNG_IDAT_BYTES:
+                f.write(_png_chunk(b"IDAT", bytes(pending)))
+                pending.clear()
+        pending += compressor.flush()
+        f.write(_png_chunk(b"IDAT", bytes(pending)))
+        f.write(_png_chunk(b"IEND", b""))
+
+def _unfilter(kind, line, prev, bpp):
+    """Reverses one PNG scanline filter in place (line and prev are bytearrays)."""
+    if kind == 0:
+        return
+    n = len(line)
+    if kind == 1:
+        for i in range(bpp, n):
+            line[i] = (line[i] + line[i - bpp]) & 0xFF
+    elif kind == 2:
+        for i in range(n):
+            line[i] = (line[i] + prev[i]) & 0xFF
+    elif kind == 3:
+        for i in range(n):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+    elif kind == 4:
+        for i in range(n):
+            a = line[i - bpp] if i >= bpp else 0
+            b = prev[i]
+            c = prev[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+            line[i] = (line[i] + pred) & 0xFF
+    else:
+        raise ValueError(f"Bad PNG filter type {kind}.")
+
+def _png_chunks(f):
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file.")
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("Truncated PNG file.")
+        length, kind = struct.unpack(">I4s", header)
+        payload = f.read(length)
+        f.read(4) # crc
+        yield kind, payload
+        if kind == b"IEND":
+            return
+
+def _png_image(f):
+    """
+    Reads a PNG's header and the chunks before its image data.
+    Returns (info, lines): info holds width, height, depth, color_type,
+    palette (RGB triples) and alpha (the tRNS payload); lines yields each
+    unfiltered scanline as IDAT chunks are decompressed.
+    """
+    chunks = _png_chunks(f)
+    kind, ihdr = next(chunks)
+    if kind != b"IHDR":
+        raise ValueError("PNG is missing its header.")
+    width, height, depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+    if interlace:
+        raise ValueError("Interlaced PNGs are not supported.")
+    info = {"width": width, "height": height, "depth": depth, "color_type": color_type,
+            "palette": [], "alpha": b""}
+    for kind, payload in chunks:
+        if kind == b"PLTE":
+            info["palette"] = [payload[i:i + 3] for i in range(0, len(payload), 3)]
+        elif kind == b"tRNS":
+            info["alpha"] = payload
+        elif kind == b"IDAT":
+            break
+    else:
+        raise ValueError("PNG has no image data.")
+    bits = depth * {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    return info, _png_lines(chunks, payload, height, (width * bits + 7) // 8, max(1, bits // 8))
+
+def _png_lines(chunks, payload, height, stride, bpp):
+    decompressor = zlib.decompressobj()
+    pending = bytearray(decompressor.decompress(payload))
+    prev = bytearray(stride)
+    row = 0
+    while row < height:
+        while len(pending) > stride and row < height:
+            line = pending[1:stride + 1]
+            _unfilter(pending[0], line, prev, bpp)
+            del pending[:stride + 1]
+            yield line
+            prev = line
+            row += 1
+        if row < height:
+            kind, payload = next(chunks, (None, None))
+            if kind is None:
+                raise ValueError("PNG image data is incomplete.")
+            if kind == b"IDAT":
+                pending += decompressor.decompress(payload)
+
+def read_png(path):
+    """
+    Reads a PNG into a PixelBuffer (one cell per image pixel). Pixels with
+    alpha below 50% become EMPTY_COLOR. The image is decompressed and
+    unfiltered row by row as IDAT chunks arrive.
+    Supports all non-interlaced color types at bit depth 8 (and 1/2/4 for
+    palette/grayscale, 16 for the others).
+    """
+    with open(path, "rb") as f:
+        info, lines = _png_image(f)
+        buf = PixelBuffer(info["height"], info["width"])
+        lookup = _png_lookup(buf, info["color_type"], info["depth"], info["palette"], info["alpha"])
+        for r, line in enumerate(lines):
+            _store_png_row(buf, r, line, info["color_type"], info["depth"], lookup)
+    return buf
+
+def _png_lookup(buf, color_type, depth, palette, alpha):
+    """Maps raw sample values to buffer indices where that is a small table."""
+    if color_type == 3:
+        table = []
+        for i, rgb in enumerate(palette):
+            opaque = i >= len(alpha) or alpha[i] >= 128
+            table.append(buf.index_of("#" + rgb.hex().upper()) if opaque else 0)
+        return table + [0] * (256 - len(table))
+    if color_type == 0 and depth <= 8:
+        levels = (1 << depth) - 1
+        key = struct.unpack(">H", alpha)[0] if len(alpha) == 2 else None
+        return [0 if v == key else buf.index_of("#" + ("%02X" % (v * 255 // levels)) * 3)
+                for v in range(levels + 1)]
+    return None
+
+def _store_png_row(buf, r, line, color_type, depth, lookup):
+    cols = buf.cols
+    start = r * cols
+    if lookup is not None:
+        if depth < 8:
+            per_byte = 8 // depth
+            mask = (1 << depth) - 1
+            samples = [(byte >> (8 - depth * (k + 1))) & mask for byte in line for k in range(per_byte)]
+        else:
+            samples = line
+        values = [lookup[v] for v in samples[:cols]]
+    else:
+        step = depth // 8 # Keep the high byte of 16-bit samples
+        channels = {0: 1, 2: 3, 4: 2, 6: 4}[color_type]
+        samples = line[::step] if step > 1 else line
+        values = []
+        index_of = buf.index_of
+        for c in range(cols):
+            px = samples[c * channels:(c + 1) * channels]
+            if color_type in (4, 6) and px[-1] < 128:
+                values.append(0)
+            elif color_type in (0, 4):
+                values.append(index_of("#" + ("%02X" % px[0]) * 3))
+            else:
+                values.append(index_of("#" + bytes(px[:3]).hex().upper()))
+    # index_of may have widened the array, so read buf.data afterwards
+    buf.data[start:start + cols] = array(buf.data.typecode, values)
+
+# --- TRUE-COLOR INPUT ---
+def _rgba_line(line, info):
+    """Converts one unfiltered PNG scanline to RGBA bytes, mostly with C-level slicing."""
+    width, depth, color_type = info["width"], info["depth"], info["color_type"]
+    if color_type == 3 or depth < 8:
+        if color_type == 3:
+            alpha = info["alpha"]
+            table = [rgb + bytes([alpha[i] if i < len(alpha) else 255])
+                     for i, rgb in enumerate(info["palette"])]
+        else:
+            levels = (1 << depth) - 1
+            key = struct.unpack(">H", info["alpha"])[0] if len(info["alpha"]) == 2 else None
+            table = [bytes([v * 255 // levels] * 3 + [0 if v == key else 255]) for v in range(levels + 1)]
+        table += [b"\0\0\0\0"] * (256 - len(table))
+        if depth < 8:
+            mask = (1 << depth) - 1
+            line = [(byte >> shift) & mask for byte in line for shift in range(8 - depth, -1, -depth)]
+        return b"".join([table[i] for i in line[:width]])
+
+    if depth == 16:
+        line = line[0::2] # Keep the high byte of each sample
+    if color_type == 6:
+        return bytes(line)
+    out = bytearray(b"\xff" * (4 * width))
+    if color_type == 2:
+        out[0::4], out[1::4], out[2::4] = line[0::3], line[1::3], line[2::3]
+    elif color_type == 0:
+        out[0::4] = out[1::4] = out[2::4] = line
+    else: # 4: gray + alpha
+        out[0::4] = out[1::4] = out[2::4] = line[0::2]
+        out[3::4] = line[1::2]
+    if info["alpha"] and color_type in (0, 2): # Color key, 16 bits per sample
+        key = info["alpha"][0::2] if depth == 16 else info["alpha"][1::2]
+        key = key * 3 if color_type == 0 else key
+        for pos in range(0, len(out), 4):
+            if out[pos:pos + 3] == key:
+                out[pos + 3] = 0
+    return bytes(out)
+
+def _ppm_tokens(data, count):
+    """Reads `count` whitespace-separated header fields (skipping # comments). Returns (fields, end offset)."""
+    fields, pos = [], 0
+    while len(fields) < count:
+        while data[pos:pos + 1].isspace(): pos += 1
+        if data[pos:pos + 1] == b"#":
+            pos = data.index(b"\n", pos)
+            continue
+        start = pos
+        while pos < len(data) and not data[pos:pos + 1].isspace(): pos += 1
+        fields.append(data[start:pos])
+    return fields, pos + 1
+
+def _read_ppm(path):
+    """Reads a binary (P5/P6) or ASCII (P2/P3) PGM/PPM file as RGBA rows."""
+    with open(path, "rb") as f: data = f.read()
+    (magic, width, height, maxval), pos = _ppm_tokens(data, 4)
+    width, height, maxval = int(width), int(height), int(maxval)
+    channels = 3 if magic in (b"P3", b"P6") else 1
+    count = width * height * channels
+    if magic in (b"P5", b"P6"):
+        samples = data[pos:pos + count * (2 if maxval > 255 else 1)]
+        if maxval > 255:
+            samples = [samples[i] << 8 | samples[i + 1] for i in range(0, len(samples), 2)]
+    elif magic in (b"P2", b"P3"):
+        samples = [int(v) for v in data[pos:].split()[:count]]
+    else:
+        raise ValueError("Not a PGM/PPM file.")
+    if len(samples) < count:
+        raise ValueError("PGM/PPM image data is incomplete.")
+    samples = bytes(samples) if maxval == 255 else bytes(v * 255 // maxval for v in samples)
+    info = {"width": width, "depth": 8, "color_type": 2 if channels == 3 else 0, "alpha": b""}
+    stride = width * channels
+    return width, height, [_rgba_line(samples[r * stride:(r + 1) * stride], info) for r in range(height)]
+
+def downscale_rgba(width, height, rows, factor):
+    """Keeps one pixel (the top-left) of every factor x factor block of RGBA rows."""
+    rows = [array("I", row)[::factor].tobytes() for row in rows[:height // factor * factor:factor]]
+    return width // factor, height // factor, [row[:width // factor * 4] for row in rows]
+
+def read_rgba(path):
+    """
+    Reads a PNG or PGM/PPM image as (width, height, rows), each row being
+    4 bytes (R, G, B, A) per pixel. Used by the importer, which quantizes
+    the colors itself.
+    """
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            return _read_ppm(path)
+        f.seek(0)
+        info, lines = _png_image(f)
+        return info["width"], info["height"], [_rgba_line(line, info) for line in lines]
+
+# --- SPRITE SHEETS ---
+def sprite_sheet(frames, columns=None):
+    """Lays equally sized frames out left to right, top to bottom, in one buffer."""
+    count = len(frames)
+    columns = columns or max(1, int(count ** 0.5 + 0.999))
+    rows = (count + columns - 1) // columns
+    fr, fc = frames[0].rows, frames[0].cols
+    sheet = PixelBuffer(rows * fr, columns * fc)
+    for i, frame in enumerate(frames):
+        sheet.paste(frame, (i // columns) * fr, (i % columns) * fc)
+    return sheet
+
+def _skyline_pack(sizes, width):
+    """
+    Places (w, h) rectangles, in the given order, into a strip `width` wide.
+    Each goes where its top edge is lowest (then leftmost) on the skyline of
+    the ones already placed. Returns ([(x, y)], used height).
+    """
+    skyline = [(0, 0, width)]  # (x, y, length) segments, left to right
+    positions = []
+    for w, h in sizes:
+        best = None
+        for i, (x, _, _) in enumerate(skyline):
+            if x + w > width: break
+            # Height of the skyline under [x, x + w)
+            top, reach, j = 0, 0, i
+            while reach < w:
+                top = max(top, skyline[j][1])
+                reach += skyline[j][2]
+                j += 1
+            if best is None or (top + h, x) < (best[0] + h, best[1]):
+                best = (top, x, i)
+        y, x, i = best
+        positions.append((x, y))
+        # Replace the covered segments with the new top edge
+        j, reach = i, 0
+        while reach < w:
+            reach += skyline[j][2]
+            j += 1
+        tail = reach - w
+        new = [(x, y + h, w)]
+        if tail:
+            last = skyline[j - 1]
+            new.append((x + w, last[1], tail))
+        skyline[i:j] = new
+    height = max((y + h for (x, y), (w, h) in zip(positions, sizes)), default=0)
+    return positions, height
+
+def pack_sprites(frames, trim=True, padding=1):
+    """
+    Packs frames into an atlas, storing identical frames once.
+    With trim, each frame is cut down to its non-empty bounding box first.
+
+    Returns (sheet, entries). Entry i describes frames[i]: its rectangle in
+    the sheet ("x", "y", "w", "h"), where that rectangle sits in the
+    original frame ("offset_x", "offset_y"), and "duplicate_of" when an
+    earlier frame has the same content. A fully empty trimmed frame gets a
+    0 x 0 rectangle.
+    """
+    entries, sprites, first = [], [], {}  # sprites: (entry index, cropped buffer)
+    for i, frame in enumerate(frames):
+        digest = frame.content_hash()
+        if digest in first:
+            entries.append(dict(entries[first[digest]], duplicate_of=first[digest]))
+            continue
+        first[digest] = i
+        box = frame.content_bounds() if trim else (0, 0, frame.rows - 1, frame.cols - 1)
+        if box is None:
+            entries.append({"x": 0, "y": 0, "w": 0, "h": 0, "offset_x": 0, "offset_y": 0})
+            continue
+        r1, c1, r2, c2 = box
+        entries.append({"x": 0, "y": 0, "w": c2 - c1 + 1, "h": r2 - r1 + 1, "offset_x": c1, "offset_y": r1})
+        sprites.append((i, frame.crop(r1, c1, r2, c2)))
+
+    # Tallest first; try a few strip widths and keep the smallest atlas
+    sprites.sort(key=lambda s: (-s[1].rows, -s[1].cols))
+    sizes = [(buf.cols + padding, buf.rows + padding) for _, buf in sprites]
+    area = sum(w * h for w, h in sizes)
+    widest = max((w for w, _ in sizes), default=0)
+    best = None
+    for factor in (1.0, 1.1, 1.25, 1.4, 1.6, 2.0):
+        width = max(widest, int((area ** 0.5) * factor))
+        positions, height = _skyline_pack(sizes, width)
+        used_w = max((x + w for (x, _), (w, _) in zip(positions, sizes)), default=0)
+        key = (used_w * height, abs(used_w - height))
+        if best is None or key < best[0]:
+            best = (key, positions, used_w, height)
+    _, positions, width, height = best
+
+    sheet = PixelBuffer(max(height - padding, 1), max(width - padding, 1))
+    for (i, buf), (x, y) in zip(sprites, positions):
+        sheet.paste(buf, y, x)
+        entries[i]["x"], entries[i]["y"] = x, y
+    for entry in entries:
+        if "duplicate_of" in entry:
+            original = entries[entry["duplicate_of"]]
+            entry["x"], entry["y"] = original["x"], original["y"]
+    return sheet, entries
+
+def write_sprite_atlas(path, frames, scale=1, trim=True, padding=1, transparent=True):
+    """
+    Writes a packed sprite sheet as a PNG plus a JSON map (same name, .json)
+    from frame index to atlas rectangle and offset, in output pixels.
+    Returns the JSON path.
+    """
+    sheet, entries = pack_sprites(frames, trim, padding)
+    write_png(path, sheet, scale, transparent)
+    scaled = [{key: value * scale if key != "duplicate_of" else value for key, value in entry.items()}
+              for entry in entries]
+    atlas = {
+        "image": os.path.basename(path),
+        "size": {"w": sheet.cols * scale, "h": sheet.rows * scale},
+        "frame_size": {"w": frames[0].cols * scale, "h": frames[0].rows * scale},
+        "frames": {str(i): entry for i, entry in enumerate(scaled)},
+    }
+    json_path = os.path.splitext(path)[0] + ".json"
+    with open(json_path, "w") as f:
+        json.dump(atlas, f, indent=4)
+    return json_path
+
+# --- GIF ---
+def _lzw_encode(indices, min_code_size):
+    """GIF-flavoured LZW: variable code width, little-endian bit packing."""
+    clear = 1 << min_code_size
+    end = clear + 1
+    table = {}  # (prefix code << 8) | next index -> code
+    next_code = end + 1
+    width = min_code_size + 1
+    out = bytearray()
+    bits, nbits = clear, width  # Start with a clear code
+    prefix = indices[0]
+    for i in indices[1:]:
+        key = (prefix << 8) | i
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        bits |= prefix << nbits
+        nbits += width
+        if next_code < 4096:
+            table[key] = next_code
+            next_code += 1
+            if next_code > (1 << width) and width < 12:
+                width += 1
+        else:
+            bits |= clear << nbits
+            nbits += width
+            table.clear()
+            next_code = end + 1
+            width = min_code_size + 1
+        while nbits >= 8:
+            out.append(bits & 0xFF)
+            bits >>= 8
+            nbits -= 8
+        prefix = i
+    bits |= prefix << nbits
+    nbits += width
+    bits |= end << nbits
+    nbits += width
+    while nbits > 0:
+        out.append(bits & 0xFF)
+        bits >>= 8
+        nbits -= 8
+    return bytes(out)
+
+def _gif_sub_blocks(data):
+    return b"".join(bytes([len(data[i:i + 255])]) + data[i:i + 255]
+                    for i in range(0, len(data), 255)) + b"\x00"
+
+def _nonzero_span(mask, length):
+    """First and last byte positions that are non-zero in a big-endian int of `length` bytes."""
+    first = length - 1 - (mask.bit_length() - 1) // 8
+    last = length - 1 - ((mask & -mask).bit_length() - 1) // 8
+    return first, last
+
+class _GifFrame:
+    """A frame waiting to be written: its global-index rows, rectangle, delay and disposal."""
+    def __init__(self, rows, rect, delay_ms):
+        self.rows = rows
+        self.rect = rect  # (r1, c1, r2, c2) in cells
+        self.delay_ms = delay_ms
+        self.dispose = 1  # 1: keep, 2: clear the rectangle to transparent afterwards
+
+def write_gif(path, frames, delay_ms=200, scale=1, loop=0, transparent=False):
+    """
+    Writes frames as a looping animated GIF (at most 256 colors in total).
+
+    After the first frame only the rectangle that changed since the previous
+    frame is encoded, and a frame identical to the previous one only extends
+    the previous frame's delay. With transparent=True, EMPTY_COLOR cells are
+    transparent; a frame that clears cells makes the previous frame restore
+    its rectangle to transparent first.
+    """
+    # Only colors still on some frame count: color tables keep erased colors
+    colors = sorted({EMPTY_COLOR}.union(*(frame.used_colors() for frame in frames)))
+    if len(colors) > 256:
+        raise ValueError("GIF export supports at most 256 colors.")
+    lookup = {color: i for i, color in enumerate(colors)}
+    table_bits = max(1, (len(colors) - 1).bit_length())
+    table = b"".join(_rgb(color) for color in colors).ljust(3 << table_bits, b"\x00")
+    min_code_size = max(2, table_bits)
+    rows, cols = frames[0].rows, frames[0].cols
+    empty_index = lookup[EMPTY_COLOR] if transparent else None
+    # Byte value 1 where a row holds the empty color, 0 elsewhere
+    empty_mask = bytes([i == empty_index for i in range(256)])
+
+    def write_frame(f, frame):
+        r1, c1, r2, c2 = frame.rect
+        flags = frame.dispose << 2 | (1 if transparent else 0)
+        delay = min(0xFFFF, max(1, round(frame.delay_ms / 10))) # In 1/100 s
+        f.write(b"\x21\xF9\x04" + struct.pack("<BHBB", flags, delay, empty_index or 0, 0))
+        f.write(b"\x2C" + struct.pack("<HHHHB", c1 * scale, r1 * scale,
+                                      (c2 - c1 + 1) * scale, (r2 - r1 + 1) * scale, 0))
+        indices = bytearray()
+        for r in range(r1, r2 + 1):
+            line = frame.rows[r][c1:c2 + 1]
+            if scale > 1:
+                line = bytes(b for b in line for _ in range(scale))
+            indices += line * scale
+        f.write(bytes([min_code_size]) + _gif_sub_blocks(_lzw_encode(indices, min_code_size)))
+
+    with open(path, "wb") as f:
+        f.write(b"GIF89a" + struct.pack("<HHBBB", cols * scale, rows * scale,
+                                        0x80 | (table_bits - 1), 0, 0))
+        f.write(table)
+        f.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+
+        pending = None
+        for frame in frames:
+            remap = bytes(lookup.get(color, 0) for color in frame.colors) # Unused entries never appear
+            if frame.data.typecode == "B":
+                remap = remap.ljust(256, b"\x00")
+                lines = [frame.data[r * cols:(r + 1) * cols].tobytes().translate(remap)
+                         for r in range(rows)]
+            else:
+                lines = [bytes([remap[i] for i in frame.data[r * cols:(r + 1) * cols]])
+                         for r in range(rows)]
+            if pending is None:
+                pending = _GifFrame(lines, (0, 0, rows - 1, cols - 1), delay_ms)
+                continue
+
+            # Bounding box of the cells that differ from the previous frame,
+            # and of those that become empty (only transparency can't paint over)
+            changed = cleared = None
+            for r, (old, new) in enumerate(zip(pending.rows, lines)):
+                if old == new: continue
+                a, b = _nonzero_span(int.from_bytes(old, "big") ^ int.from_bytes(new, "big"), cols)
+                changed = _union_rect(changed, r, a, r, b)
+                if transparent:
+                    gone = (int.from_bytes(new.translate(empty_mask), "big")
+                            & ~int.from_bytes(old.translate(empty_mask), "big"))
+                    if gone:
+                        a, b = _nonzero_span(gone, cols)
+                        cleared = _union_rect(cleared, r, a, r, b)
+            if changed is None:
+                pending.delay_ms += delay_ms
+                continue
+            if cleared:
+                # Widen the previous frame to cover the cleared cells and let it
+                # restore its rectangle to transparent; this frame then repaints it
+                pending.rect = _union_rect(pending.rect, *cleared)
+                pending.dispose = 2
+                changed = _union_rect(changed, *pending.rect)
+            write_frame(f, pending)
+            pending = _GifFrame(lines, changed, delay_ms)
+        write_frame(f, pending)
+        f.write(b"\x3B")
@@ -0,0 +1,178 @@
+# journal.py
+# Crash-recovery journal.
+#
+# The recovery folder holds a snapshot of the whole project (a .pxp written
+# by project_format) and a journal of the pixel changes made since. Each
+# journal record is a rectangle of cells:
+#     header  blob length, crc32, frame index, r1, c1, r2, c2
+#     blob    the cells as a project_format frame blob
+# Recovery loads the snapshot and pastes the records over it in order. A
+# torn record at the end (crash mid-write) is detected by its length/crc
+# and ignored.
+#
+# Every editor session journals into its own folder under a per-user root,
+# named after the project it has open. The writer thread touches an "alive"
+# file every RECOVERY_HEARTBEAT_MS, so a folder whose heartbeat stopped
+# belongs to a session that crashed, not to another running editor.
+import hashlib
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+import zlib
+from project_format import ProjectReader, decode_frame, encode_frame, write_project
+from settings import RECOVERY_HEARTBEAT_MS, RECOVERY_STALE_MS
+
+SNAPSHOT_FILE = "autosave.pxp"
+JOURNAL_FILE = "journal.bin"
+ALIVE_FILE = "alive"
+RECORD = struct.Struct("<IIIHHHH")
+
+# --- LOCATIONS ---
+def recovery_root():
+    """The per-user folder holding the recovery folders of all sessions."""
+    base = (os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_STATE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".local", "state"))
+    return os.path.join(base, "gemini-pixel-editor", "recovery")
+
+def new_session_id():
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+def session_folder(root, project_path, session):
+    """
+    The recovery folder of one session: "<project>-<path hash>.<session>",
+    or "untitled.<session>" before the project has a path.
+    """
+    if project_path:
+        path = os.path.abspath(project_path)
+        digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:10]
+        key = f"{os.path.basename(os.path.normpath(path))}-{digest}"
+    else:
+        key = "untitled"
+    return os.path.join(root, f"{key}.{session}")
+
+def recovery_label(folder):
+    """The project name a recovery folder was named after."""
+    key = os.path.basename(os.path.normpath(folder)).rsplit(".", 1)[0]
+    return key.rsplit("-", 1)[0]
+
+def stale_recoveries(root, stale_ms=RECOVERY_STALE_MS):
+    """Recovery folders of sessions that stopped without closing, newest first."""
+    if not os.path.isdir(root): return []
+    found = []
+    now = time.time()
+    for name in os.listdir(root):
+        folder = os.path.join(root, name)
+        if not has_recovery(folder): continue
+        alive = os.path.join(folder, ALIVE_FILE)
+        beat = os.path.getmtime(alive) if os.path.exists(alive) else 0
+        if (now - beat) * 1000 > stale_ms:
+            found.append((beat, folder))
+    return [folder for _, folder in sorted(found, reverse=True)]
+
+class RecoveryJournal:
+    """
+    Appends pixel deltas to the journal on a background thread, so the UI
+    only pays for queueing them. checkpoint() replaces the snapshot and
+    empties the journal.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.snapshot_path = os.path.join(folder, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(folder, JOURNAL_FILE)
+        self.alive_path = os.path.join(folder, ALIVE_FILE)
+        self.error = None # Last OSError from the writer thread, if any
+        os.makedirs(folder, exist_ok=True)
+        open(self.alive_path, "a").close()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="recovery-journal", daemon=True)
+        self._thread.start()
+
+    def record(self, frame_index, r1, c1, cells):
+        """Journals `cells` (a PixelBuffer, e.g. from crop()) placed at (r1, c1) of a frame."""
+        self._queue.put(("delta", frame_index, r1, c1, cells))
+
+    def checkpoint(self, meta, frames):
+        """Writes a full snapshot (arguments as for write_project) and clears the journal."""
+        self._queue.put(("snapshot", meta, frames))
+
+    def close(self, discard=False):
+        """Finishes pending writes. discard=True deletes the recovery files (clean exit)."""
+        self._queue.put(("close", discard))
+        self._thread.join()
+
+    def _run(self):
+        f = open(self.journal_path, "ab")
+        while True:
+            try:
+                batch = [self._queue.get(timeout=RECOVERY_HEARTBEAT_MS / 1000)]
+            except queue.Empty:
+                batch = []
+            try:
+                os.utime(self.alive_path)
+            except OSError as e:
+                self.error = e
+            if not batch: continue
+            while True:
+                try: batch.append(self._queue.get_nowait())
+                except queue.Empty: break
+
+            for item in batch:
+                try:
+                    if item[0] == "delta":
+                        _, index, r1, c1, cells = item
+                        blob = encode_frame(cells, level=1)
+                        f.write(RECORD.pack(len(blob), zlib.crc32(blob), index, r1, c1,
+                                            r1 + cells.rows - 1, c1 + cells.cols - 1) + blob)
+                    elif item[0] == "snapshot":
+                        write_project(self.snapshot_path, item[1], item[2])
+                        f.seek(0)
+                        f.truncate()
+                    else:
+                        f.close()
+                        if item[1]: discard_recovery(self.folder)
+                        return
+                except OSError as e:
+                    self.error = e
+            try:
+                f.flush()
+                os.fsync(f.fileno())
+            except OSError as e:
+                self.error = e
+
+def has_recovery(folder):
+    """True if a previous session left recovery files behind (it did not exit cleanly)."""
+    return os.path.exists(os.path.join(folder, SNAPSHOT_FILE))
+
+def discard_recovery(folder):
+    for name in (SNAPSHOT_FILE, JOURNAL_FILE, ALIVE_FILE):
+        path = os.path.join(folder, name)
+        if os.path.exists(path): os.remove(path)
+    try:
+        os.rmdir(folder)
+    except OSError:
+        pass # Not empty (files we did not write) or already gone
+
+def recover(folder):
+    """Rebuilds the last session: returns (meta, frames) with the journal replayed."""
+    reader = ProjectReader(os.path.join(folder, SNAPSHOT_FILE))
+    try:
+        meta = reader.meta
+        frames = [reader.read_frame(i) for i in range(len(reader))]
+    finally:
+        reader.close()
+
+    journal_path = os.path.join(folder, JOURNAL_FILE)
+    if os.path.exists(journal_path):
+        with open(journal_path, "rb") as f: data = f.read()
+        pos = 0
+        while pos + RECORD.size <= len(data):
+            length, crc, index, r1, c1, r2, c2 = RECORD.unpack_from(data, pos)
+            blob = data[pos + RECORD.size:pos + RECORD.size + length]
+            if len(blob) < length or zlib.crc32(blob) != crc: break
+            pos += RECORD.size + length
+            if index < len(frames):
+                frames[index].paste(decode_frame(blob, r2 - r1 + 1, c2 - c1 + 1), r1, c1)
+    return meta, frames
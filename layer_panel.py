@@ -0,0 +1,114 @@
+# layer_panel.py
+import tkinter as tk
+from tkinter import messagebox, simpledialog
+from settings import *
+
+class LayerPanel:
+    """The "Layers" popup: the active frame's layer stack, top layer first."""
+    def __init__(self, app_ref):
+        self.app = app_ref
+        self.win = None
+
+    def open_window(self):
+        if self.win and tk.Toplevel.winfo_exists(self.win):
+            self.refresh()
+            self.win.deiconify()
+            return
+
+        self.win = tk.Toplevel(self.app.root)
+        self.win.withdraw()
+        # HIDE instead of destroy on close
+        self.win.protocol("WM_DELETE_WINDOW", self.hide_window)
+        self.win.transient(self.app.root)
+        self.win.title("Layers")
+        self.win.geometry("280x320+200+200")
+
+        self.rows_frame = tk.Frame(self.win)
+        self.rows_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        ctrl = tk.Frame(self.win)
+        ctrl.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=10)
+        tk.Button(ctrl, text="+ Layer", command=self.add_layer).pack(side=tk.LEFT)
+        tk.Button(ctrl, text="Delete", fg="red", command=self.delete_layer).pack(side=tk.LEFT, padx=2)
+        tk.Button(ctrl, text="▼", command=lambda: self.move_layer(-1)).pack(side=tk.RIGHT)
+        tk.Button(ctrl, text="▲", command=lambda: self.move_layer(1)).pack(side=tk.RIGHT, padx=2)
+        tk.Label(self.win, text="(Double-click a name to rename)", fg="gray").pack(side=tk.BOTTOM)
+
+        self.refresh()
+        self.win.update_idletasks()
+        self.win.deiconify()
+
+    def hide_window(self):
+        self.win.withdraw()
+
+    def refresh(self):
+        """Rebuilds the rows for the active frame (also called when another frame is selected)."""
+        if not self.win or not tk.Toplevel.winfo_exists(self.win): return
+        for w in self.rows_frame.winfo_children(): w.destroy()
+        tab = self.app.active_tab()
+        if not tab:
+            tk.Label(self.rows_frame, text="No frame selected", fg="gray").pack()
+            return
+        for i in reversed(range(len(tab.layers))):
+            layer = tab.layers[i]
+            active = i == tab.active_layer
+            row = tk.Frame(self.rows_frame)
+            row.pack(fill=tk.X, pady=1)
+            tk.Button(row, text="👁" if layer.visible else "—", width=2,
+                      command=lambda i=i: self.toggle_visible(i)).pack(side=tk.LEFT)
+            tk.Button(row, text="🔒" if layer.locked else "🔓", width=2,
+                      command=lambda i=i: self.toggle_locked(i)).pack(side=tk.LEFT, padx=2)
+            name = tk.Button(row, text=layer.name, anchor="w", relief=tk.SUNKEN if active else tk.RAISED,
+                             bg="#e1f5fe" if active else None, command=lambda i=i: self.select_layer(i))
+            name.bind("<Double-Button-1>", lambda e, i=i: self.rename_layer(i))
+            name.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+    # --- ACTIONS ---
+    def select_layer(self, i):
+        tab = self.app.active_tab()
+        if tab:
+            tab.select_layer(i)
+            self.refresh()
+
+    def add_layer(self):
+        tab = self.app.active_tab()
+        if tab:
+            tab.add_layer()
+            self.refresh()
+
+    def delete_layer(self):
+        tab = self.app.active_tab()
+        if not tab: return
+        if len(tab.layers) <= 1:
+            self.app.show_toast("A frame needs at least one layer.")
+            return
+        layer = tab.layers[tab.active_layer]
+        if messagebox.askyesno("Delete Layer", f"Delete '{layer.name}'? This cannot be undone.", parent=self.win):
+            tab.remove_layer(tab.active_layer)
+            self.refresh()
+
+    def move_layer(self, step):
+        tab = self.app.active_tab()
+        if tab:
+            tab.move_layer(tab.active_layer, step)
+            self.refresh()
+
+    def toggle_visible(self, i):
+        tab = self.app.active_tab()
+        if tab:
+            tab.set_layer_visible(i, not tab.layers[i].visible)
+            self.refresh()
+
+    def toggle_locked(self, i):
+        tab = self.app.active_tab()
+        if tab:
+            tab.set_layer_locked(i, not tab.layers[i].locked)
+            self.refresh()
+
+    def rename_layer(self, i):
+        tab = self.app.active_tab()
+        if not tab: return
+        name = simpledialog.askstring("Rename Layer", "Layer name:", initialvalue=tab.layers[i].name, parent=self.win)
+        if name:
+            tab.layers[i].name = name
+            self.refresh()
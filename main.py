@@ -3,13 +3,18 @@ import tkinter as tk
 from tkinter import messagebox, filedialog, ttk
 import json
 import os
+import time
 
 # Import modules
 from settings import *
 from editor_tab import EditorTab
 from palette_manager import PaletteManager
+from layer_panel import LayerPanel
 from project_manager import ProjectManager
 from animation_preview import AnimationPreview
+from journal import (RecoveryJournal, discard_recovery, new_session_id, recover, recovery_label,
+                     recovery_root, session_folder, stale_recoveries)
+from tracing import tracer
 import icons 
 
 # Tool Imports
@@ -55,10 +60,20 @@ class PixelEditor:
         self.brush_color = "#000000" 
         self.active_color = "#000000"
         self.show_grid = True
+        # Bucket / Magic Wand matching options
+        self.fill_connectivity = 4
+        self.fill_tolerance = 0
+        self.fill_contiguous = True
         self.settings_win = None
         self.current_project_path = None 
         self.clipboard = None 
         self.preview_window = None 
+        self._preview_job = None
+        self.preview_speed_ms = PREVIEW_SPEED_MS # Kept while the preview is closed
+        self._hud_tab = None # Tab currently showing the latency HUD
+        self.journal = None
+        self._journal_state = None # Tabs/sizes covered by the last snapshot
+        self._last_checkpoint = 0
 
         # --- INITIALIZE TOOLS ---
         self.tool_instances = {
@@ -94,6 +109,7 @@ class PixelEditor:
 
         # MANAGERS
         self.palette_manager = PaletteManager(self)
+        self.layer_panel = LayerPanel(self)
         self.project_manager = ProjectManager(self)
 
         self.saved_palettes = self.project_manager.app.load_palettes_from_disk() if hasattr(self, 'load_palettes_from_disk') else self.load_palettes_from_disk_internal()
@@ -106,6 +122,8 @@ class PixelEditor:
         
         self.add_new_tab("Frame 1")
         self.setup_plus_tab()
+        self.start_journal()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Bindings
         self.root.bind("<Control-z>", lambda e: self.trigger_undo())
@@ -113,6 +131,13 @@ class PixelEditor:
         self.root.bind("<Control-s>", lambda e: self.project_manager.save_project())
         self.root.bind("<Control-c>", self.copy_selection)
         self.root.bind("<Control-v>", self.paste_selection)
+        self.root.bind("<Control-0>", lambda e: self.zoom_active("fit"))
+        self.root.bind("<Control-1>", lambda e: self.zoom_active("actual"))
+        self.root.bind("<Control-equal>", lambda e: self.zoom_active("in"))
+        self.root.bind("<Control-plus>", lambda e: self.zoom_active("in"))
+        self.root.bind("<Control-minus>", lambda e: self.zoom_active("out"))
+        self.root.bind("<F3>", self.toggle_latency_hud)
+        self.root.bind("<Shift-F3>", self.dump_latency_trace)
         
         for widget in [self.root, self.notebook]:
             widget.bind("<Left>", lambda e: self.nudge_selection(0, -1))
@@ -171,8 +196,21 @@ class PixelEditor:
         self.btn_grab = tk.Button(top_frame, text="✋", width=3, command=self.select_grab)
         self.btn_grab.pack(side=tk.LEFT, padx=1)
 
+        # --- FILL OPTIONS (Bucket + Wand) ---
+        tk.Frame(top_frame, width=10).pack(side=tk.LEFT)
+        tk.Label(top_frame, text="Tol:").pack(side=tk.LEFT)
+        self.var_fill_tolerance = tk.IntVar(value=0)
+        self.var_fill_tolerance.trace_add("write", lambda *args: self.update_fill_options())
+        tk.Spinbox(top_frame, from_=0, to=255, width=4, textvariable=self.var_fill_tolerance,
+                   command=self.update_fill_options).pack(side=tk.LEFT)
+        self.var_fill_8way = tk.BooleanVar(value=False)
+        tk.Checkbutton(top_frame, text="8-Way", variable=self.var_fill_8way, command=self.update_fill_options).pack(side=tk.LEFT)
+        self.var_fill_global = tk.BooleanVar(value=False)
+        tk.Checkbutton(top_frame, text="Global", variable=self.var_fill_global, command=self.update_fill_options).pack(side=tk.LEFT)
+
         tk.Frame(top_frame, width=10).pack(side=tk.LEFT) 
         tk.Button(top_frame, text="🎨 Palette", command=self.palette_manager.open_window, bg="#FFEB3B").pack(side=tk.LEFT, padx=2)
+        tk.Button(top_frame, text="📚 Layers", command=self.layer_panel.open_window).pack(side=tk.LEFT, padx=2)
 
         tk.Button(top_frame, text=" Play", image=self.img_play, compound=tk.LEFT, 
                   command=self.open_animation_preview).pack(side=tk.LEFT, padx=10)
@@ -185,6 +223,8 @@ class PixelEditor:
                   command=self.project_manager.save_project).pack(side=tk.LEFT, padx=2)
         tk.Button(top_frame, text=" Export", image=self.img_gemini, compound=tk.LEFT, bg="#9C27B0", fg="white", 
                   command=self.project_manager.export_for_gemini).pack(side=tk.LEFT, padx=2)
+        tk.Button(top_frame, text="🧩 Sheet", bg="#FF9800", fg="white",
+                  command=self.project_manager.export_sprite_atlas).pack(side=tk.LEFT, padx=2)
 
         # Quick Palette
         self.quick_palette_frame = tk.Frame(self.root, bd=1, relief=tk.GROOVE, bg="#f0f0f0")
@@ -200,6 +240,7 @@ class PixelEditor:
         self.notebook.bind("<Button-1>", self.on_tab_left_click)
         self.notebook.bind("<Button-3>", self.on_tab_right_click)
         self.notebook.bind("<Button-2>", self.on_tab_middle_click)
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self.layer_panel.refresh())
 
     # --- TAB SYSTEM ---
     def setup_plus_tab(self):
@@ -233,6 +274,8 @@ class PixelEditor:
                 menu.add_separator()
                 menu.add_command(label="Copy Code to Clipboard", 
                                  command=self.project_manager.export_active_tab)
+                menu.add_command(label="Export Frame as PNG...", command=self.project_manager.export_frame_png)
+                menu.add_command(label="Import Image...", command=self.project_manager.import_image)
                 menu.post(event.x_root, event.y_root)
         except: pass
 
@@ -267,8 +310,7 @@ class PixelEditor:
         target_tab = getattr(target_widget, "tab_obj", None)
         if target_tab:
             new_tab = self.add_new_tab()
-            new_tab.grid_data = [row[:] for row in target_tab.grid_data]
-            new_tab.draw_grid_lines()
+            new_tab.copy_layers_from(target_tab)
             self.show_toast(f"Duplicated {self.notebook.tab(index, 'text')}")
 
     def close_tab_by_index(self, index):
@@ -284,6 +326,15 @@ class PixelEditor:
         for i in range(len(tabs) - 1): 
             self.notebook.tab(tabs[i], text=f"Frame {i+1}")
 
+    # --- ZOOM ---
+    def zoom_active(self, how):
+        """Ctrl+0 fit, Ctrl+1 one screen pixel per cell, Ctrl+= / Ctrl+- one zoom level in / out."""
+        tab = self.active_tab()
+        if not tab: return
+        if how == "fit": tab.zoom_to_fit()
+        elif how == "actual": tab.set_zoom(1)
+        else: tab.zoom_by(1 if how == "in" else -1)
+
     # --- UNDO / REDO ---
     def trigger_undo(self):
         tab = self.active_tab()
@@ -302,6 +353,9 @@ class PixelEditor:
     def paste_selection(self, event=None):
         tab = self.active_tab()
         if tab and self.clipboard:
+            if tab.layer_locked:
+                self.show_toast(f"{tab.layers[tab.active_layer].name} is locked")
+                return
             self.select_selection_tool()
             tab.paste_from_clipboard(self.clipboard)
             self.show_toast("Pasted!")
@@ -315,8 +369,109 @@ class PixelEditor:
 
     # --- LIVE SYNC HELPER ---
     def notify_preview(self):
+        """
+        Schedules a preview sync. Calls made within one display refresh
+        (e.g. every pixel of a brush stroke) collapse into a single sync.
+        """
+        if self.preview_window and self._preview_job is None:
+            self._preview_job = self.root.after(PREVIEW_REFRESH_MS, self._sync_preview)
+
+    def _sync_preview(self):
+        self._preview_job = None
         if self.preview_window:
+            start = tracer.now() if tracer.enabled else None
             self.preview_window.update_from_editor()
+            if start is not None: tracer.span("preview", "sync", start)
+
+    # --- LATENCY HUD ---
+    def toggle_latency_hud(self, event=None):
+        """F3: turns latency tracing and its on-canvas HUD on or off."""
+        tracer.enabled = not tracer.enabled
+        if tracer.enabled:
+            tracer.reset()
+            self._hud_tick()
+        elif self._hud_tab:
+            self._hud_tab.clear_hud()
+            self._hud_tab = None
+
+    def _hud_tick(self):
+        if not tracer.enabled: return
+        tab = self.active_tab()
+        if self._hud_tab and self._hud_tab is not tab:
+            self._hud_tab.clear_hud()
+        self._hud_tab = tab
+        if tab:
+            tab.draw_hud(tracer.summary_lines())
+        self.root.after(HUD_REFRESH_MS, self._hud_tick)
+
+    def dump_latency_trace(self, event=None):
+        """Shift+F3: saves the traced spans and latency summary as JSON."""
+        if not tracer.records:
+            self.show_toast("No trace yet (press F3 and draw).")
+            return
+        path = filedialog.asksaveasfilename(title="Save Latency Trace", initialfile="latency_trace.json",
+                                            filetypes=[("JSON", "*.json")], defaultextension=".json")
+        if not path: return
+        tracer.dump(path)
+        self.show_toast("Trace saved!")
+
+    # --- CRASH RECOVERY ---
+    def start_journal(self):
+        """
+        Offers to restore sessions that did not close properly (newest first,
+        until one is restored), then starts journaling this one.
+        """
+        self._recovery_root = RECOVERY_DIR or recovery_root()
+        for folder in stale_recoveries(self._recovery_root):
+            if not messagebox.askyesno("Recover Work", f"The editor did not close properly while editing "
+                                       f"'{recovery_label(folder)}'.\nRecover the unsaved work?"):
+                discard_recovery(folder)
+                continue
+            try:
+                self.project_manager.open_frames(*recover(folder))
+                discard_recovery(folder) # This session journals the recovered work from now on
+                self.show_toast("Work Recovered!")
+                break
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Recovery Error", f"Could not recover:\n{str(e)}")
+        self._journal_session = new_session_id()
+        self.journal = RecoveryJournal(self._journal_folder())
+        self._journal_tick()
+
+    def _journal_folder(self):
+        return session_folder(self._recovery_root, self.current_project_path, self._journal_session)
+
+    def _journal_tick(self):
+        """
+        Hands the cells changed since the last tick to the journal thread. Frame
+        structure changes (tabs added/closed/reordered, resizes) and the periodic
+        checkpoint write a full snapshot instead.
+        """
+        self.root.after(JOURNAL_FLUSH_MS, self._journal_tick)
+        if self.project_manager.load_job: return
+        folder = self._journal_folder()
+        if folder != self.journal.folder:
+            # Saved under / opened from another path: journal into that project's folder
+            self.journal.close(discard=True)
+            self.journal = RecoveryJournal(folder)
+            self._journal_state = None # Forces a full snapshot below
+        tabs = self.project_manager.frame_tabs()
+        state = [(tab, tab.rows, tab.cols) for tab in tabs]
+        due = time.monotonic() - self._last_checkpoint > JOURNAL_CHECKPOINT_MS / 1000
+        if state != self._journal_state or (due and any(tab.journal_dirty for tab in tabs)):
+            for tab in tabs: tab.journal_dirty = None
+            self.journal.checkpoint(*self.project_manager.recovery_snapshot())
+            self._journal_state = state
+            self._last_checkpoint = time.monotonic()
+            return
+        for i, tab in enumerate(tabs):
+            for region in tab.take_journal_dirty():
+                self.journal.record(i, region[0], region[1], tab.flattened_crop(*region))
+
+    def on_close(self):
+        if self.journal:
+            self.journal.close(discard=True)
+        self.root.destroy()
 
     # --- UI HELPERS ---
     def show_toast(self, message, parent=None, color="#333333"):
@@ -385,6 +540,12 @@ class PixelEditor:
         self.active_tool = self.tool_instances["picker"]
         self.btn_picker.config(relief=tk.SUNKEN, bg="#ddd")
     
+    def update_fill_options(self):
+        try: self.fill_tolerance = max(0, min(255, int(self.var_fill_tolerance.get())))
+        except (tk.TclError, ValueError): self.fill_tolerance = 0
+        self.fill_connectivity = 8 if self.var_fill_8way.get() else 4
+        self.fill_contiguous = not self.var_fill_global.get()
+
     def toggle_mirror(self):
         tab = self.active_tab()
         if tab:
@@ -460,12 +621,11 @@ class PixelEditor:
             if self.notebook.tab(tab_id, "text") == " + ": continue
             tab = getattr(self.root.nametowidget(tab_id), "tab_obj", None)
             if tab:
-                tab.save_state()
-                tab.cols = new_c; tab.rows = new_r; tab.pixel_size = new_px
-                new_grid = [[EMPTY_COLOR for _ in range(new_c)] for _ in range(new_r)]
-                for r in range(min(len(tab.grid_data), new_r)):
-                    for c in range(min(len(tab.grid_data[0]), new_c)): new_grid[r][c] = tab.grid_data[r][c]
-                tab.grid_data = new_grid; tab.draw_grid_lines()
+                tab.pixel_size = new_px
+                if (new_r, new_c) != (tab.pixels.rows, tab.pixels.cols):
+                    tab.resize(new_r, new_c)
+                else:
+                    tab.draw_grid_lines()
         self.settings_win.destroy()
 
     def refresh_quick_palette(self):
@@ -0,0 +1,124 @@
+# onion.py
+# Onion skins for the animation preview: for every frame, the other frames
+# shown faded underneath it, merged into one buffer. The skins are built
+# once and then patched only where a source frame changes, so playback
+# just shows the ready skin of each frame.
+from pixel_buffer import PixelBuffer
+from settings import EMPTY_COLOR, ONION_ALPHA
+
+ONION_MODES = ("off", "prev", "all", "range")
+
+def fade(color, strength):
+    """Mixes `color` toward white: strength 1 keeps it, 0 gives white."""
+    value = int(color.lstrip("#")[:6], 16)
+    channels = (value >> 16, (value >> 8) & 0xFF, value & 0xFF)
+    return "#" + "".join(f"{round(255 - (255 - ch) * strength):02X}" for ch in channels)
+
+def faded(buf, strength):
+    """`buf` with every color faded. Shares the pixel data, only the color table is new."""
+    colors = [EMPTY_COLOR] + [fade(color, strength) for color in buf.colors[1:]]
+    return PixelBuffer.from_indices(buf.rows, buf.cols, colors, buf.data)
+
+def onion_sources(index, count, mode, before=1, after=1):
+    """
+    The frames shown under frame `index` as [(frame, strength)], in drawing
+    order: later entries cover earlier ones.
+
+    "prev" is the previous frame; "all" every other frame, where the lowest
+    frame with a pixel wins. "range" is up to `before` frames back and
+    `after` frames ahead; the nearest are strongest and drawn on top, and
+    the strength falls off linearly to ONION_ALPHA / span at the far end.
+    Frame numbers wrap around, like playback.
+    """
+    if count < 2 or mode == "off": return []
+    if mode == "prev":
+        return [((index - 1) % count, ONION_ALPHA)]
+    if mode == "all":
+        return [(i, ONION_ALPHA) for i in reversed(range(count)) if i != index]
+    span = max(before, after)
+    steps = sorted([(d, (index - d) % count) for d in range(1, before + 1)] +
+                   [(d, (index + d) % count) for d in range(1, after + 1)])
+    sources, seen = [], {index}
+    for d, frame in steps:
+        if frame in seen: continue
+        seen.add(frame)
+        sources.append((frame, ONION_ALPHA * (span - d + 1) / span))
+    return sources[::-1]
+
+class OnionSkins:
+    """
+    The onion skin of every frame (None where a frame shows no other frame).
+    `frames` are the preview's cached frame buffers.
+    """
+    def __init__(self, mode="off", before=1, after=1):
+        self.mode, self.before, self.after = mode, before, after
+        self.sources = [] # Per frame: onion_sources()
+        self.skins = []
+
+    def configure(self, frames, mode, before=1, after=1):
+        """Switches the mode / range and rebuilds every skin."""
+        self.mode, self.before, self.after = mode, before, after
+        self.rebuild(frames)
+
+    def rebuild(self, frames):
+        count = len(frames)
+        self.sources = [onion_sources(i, count, self.mode, self.before, self.after) for i in range(count)]
+        self.skins = [PixelBuffer(frame.rows, frame.cols) if self.sources[i] else None
+                      for i, frame in enumerate(frames)]
+        for i in range(count):
+            if self.skins[i] and self.mode != "all":
+                self._compose(frames, i, 0, 0, frames[i].rows - 1, frames[i].cols - 1)
+        if self.mode == "all" and count > 1:
+            self._compose_all(frames, 0, 0, frames[0].rows - 1, frames[0].cols - 1)
+
+    def frame_changed(self, frames, index, region):
+        """
+        Patches `region` (r1, c1, r2, c2) of every skin that shows frame
+        `index`. Returns the frames whose skin changed.
+        """
+        changed = [i for i, sources in enumerate(self.sources) if any(j == index for j, _ in sources)]
+        if self.mode == "all" and changed:
+            self._compose_all(frames, *region)
+        else:
+            for i in changed:
+                self._compose(frames, i, *region)
+        return changed
+
+    def _compose(self, frames, i, r1, c1, r2, c2):
+        skin = self.skins[i]
+        r2, c2 = min(r2, skin.rows - 1), min(c2, skin.cols - 1)
+        if r1 > r2 or c1 > c2: return
+        skin.clear_rect(r1, c1, r2, c2)
+        for j, strength in self.sources[i]:
+            if (frames[j].rows, frames[j].cols) == (skin.rows, skin.cols):
+                skin.overlay_from(faded(frames[j], strength), r1, c1, r2, c2)
+
+    def _compose_all(self, frames, r1, c1, r2, c2):
+        """
+        "all" for every skin at once. Under frame i goes the first frame
+        before i with a pixel, else the first one after it. Both are kept
+        as running merges of the region, so each frame is read a constant
+        number of times instead of once per other frame.
+        """
+        rows, cols = frames[0].rows, frames[0].cols
+        r2, c2 = min(r2, rows - 1), min(c2, cols - 1)
+        if r1 > r2 or c1 > c2: return
+        h, w = r2 - r1 + 1, c2 - c1 + 1
+        parts = [faded(f, ONION_ALPHA).crop(r1, c1, r2, c2) if (f.rows, f.cols) == (rows, cols)
+                 else PixelBuffer(h, w) for f in frames]
+        after = [None] * len(frames) # after[i]: frames i+1.. merged, the lowest on top
+        merged = PixelBuffer(h, w)
+        for i in reversed(range(len(frames))):
+            after[i] = merged
+            merged = merged.copy()
+            merged.overlay_from(parts[i], 0, 0, h - 1, w - 1)
+        before = PixelBuffer(h, w)   # Frames ..i-1 merged, the lowest on top
+        for i, part in enumerate(parts):
+            skin = self.skins[i]
+            if skin is not None and (skin.rows, skin.cols) == (rows, cols):
+                region = after[i].copy()
+                region.overlay_from(before, 0, 0, h - 1, w - 1)
+                skin.paste(region, r1, c1)
+            merged = part.copy()
+            merged.overlay_from(before, 0, 0, h - 1, w - 1)
+            before = merged
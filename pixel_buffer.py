@@ -0,0 +1,260 @@
+# pixel_buffer.py
+import hashlib
+from array import array
+from settings import EMPTY_COLOR
+
+class PixelBuffer:
+    """
+    Compact storage for a single frame.
+
+    Pixels live in one flat `array` of palette indices (row-major) and
+    each buffer carries its own color table. Index 0 is always EMPTY_COLOR.
+    The array starts as 1 byte per pixel and is widened to 2 bytes only if
+    the frame ever holds more than 256 distinct colors.
+    """
+    def __init__(self, rows, cols, fill=EMPTY_COLOR):
+        self.rows = rows
+        self.cols = cols
+        self.colors = [EMPTY_COLOR]           # index -> hex string
+        self.color_lookup = {EMPTY_COLOR: 0}  # hex string -> index
+        # While a HistoryManager edit is open: flat index -> value before the edit
+        self.undo_log = None
+        self.data = array("B", [0]) * (rows * cols)
+        if fill != EMPTY_COLOR:
+            idx = self.index_of(fill)
+            self.data = array(self.data.typecode, [idx]) * (rows * cols)
+
+    # --- CONSTRUCTION ---
+    @classmethod
+    def from_grid(cls, grid):
+        """Builds a buffer from a legacy list-of-rows grid of hex strings."""
+        rows = len(grid)
+        cols = len(grid[0]) if rows > 0 else 0
+        buf = cls(rows, cols)
+        for r, row in enumerate(grid):
+            base = r * cols
+            for c, color in enumerate(row[:cols]):
+                if color != EMPTY_COLOR:
+                    # index_of may widen (replace) buf.data, so look it up after
+                    idx = buf.index_of(color)
+                    buf.data[base + c] = idx
+        return buf
+
+    @classmethod
+    def from_indices(cls, rows, cols, colors, data):
+        """Wraps an existing index array and its color table (no copying)."""
+        buf = cls(0, 0)
+        buf.rows, buf.cols = rows, cols
+        buf.colors = list(colors)
+        buf.color_lookup = {color: i for i, color in enumerate(buf.colors)}
+        buf.data = data
+        return buf
+
+    def copy(self):
+        """Returns an independent copy. The pixels are copied as one buffer."""
+        clone = PixelBuffer.__new__(PixelBuffer)
+        clone.rows = self.rows
+        clone.cols = self.cols
+        clone.colors = self.colors[:]
+        clone.color_lookup = self.color_lookup.copy()
+        clone.data = self.data[:]
+        clone.undo_log = None
+        return clone
+
+    def resized(self, rows, cols):
+        """Returns a new buffer of the given size, keeping the top-left overlap."""
+        new_buf = PixelBuffer(rows, cols)
+        new_buf.colors = self.colors[:]
+        new_buf.color_lookup = self.color_lookup.copy()
+        new_buf.data = array(self.data.typecode, [0]) * (rows * cols)
+        keep_c = min(cols, self.cols)
+        for r in range(min(rows, self.rows)):
+            src = r * self.cols
+            dst = r * cols
+            new_buf.data[dst:dst + keep_c] = self.data[src:src + keep_c]
+        return new_buf
+
+    def downscaled(self, factor):
+        """Returns a buffer keeping one cell (the top-left) of every factor x factor block."""
+        rows, cols = self.rows // factor, self.cols // factor
+        data = array(self.data.typecode)
+        for r in range(rows):
+            start = r * factor * self.cols
+            data.extend(self.data[start:start + cols * factor:factor])
+        return PixelBuffer.from_indices(rows, cols, self.colors, data)
+
+    # --- COLOR TABLE ---
+    def index_of(self, color):
+        """Returns the palette index for a color, adding it to the table if new."""
+        idx = self.color_lookup.get(color)
+        if idx is not None:
+            return idx
+        idx = len(self.colors)
+        if idx > 0xFFFF:
+            raise ValueError("Frame color table is full (65536 colors).")
+        if idx > 0xFF and self.data.typecode == "B":
+            self.data = array("H", self.data)
+        self.colors.append(color)
+        self.color_lookup[color] = idx
+        return idx
+
+    def used_colors(self):
+        """Returns the set of non-empty colors actually present in the frame."""
+        return {self.colors[i] for i in set(self.data) if i != 0}
+
+    # --- PIXEL ACCESS ---
+    def in_bounds(self, r, c):
+        return 0 <= r < self.rows and 0 <= c < self.cols
+
+    def get(self, r, c):
+        """Returns the hex color at (r, c). No bounds checking."""
+        return self.colors[self.data[r * self.cols + c]]
+
+    def set(self, r, c, color):
+        """Sets the color at (r, c). Returns True if the pixel changed."""
+        idx = self.index_of(color)
+        pos = r * self.cols + c
+        old = self.data[pos]
+        if old == idx:
+            return False
+        if self.undo_log is not None and pos not in self.undo_log:
+            self.undo_log[pos] = old
+        self.data[pos] = idx
+        return True
+
+    def fill_pixels(self, pixels, color):
+        """Sets every (r, c) in `pixels` to one color."""
+        idx = self.index_of(color)
+        data, cols, log = self.data, self.cols, self.undo_log
+        for r, c in pixels:
+            pos = r * cols + c
+            if log is not None and pos not in log:
+                log[pos] = data[pos]
+            data[pos] = idx
+
+    def blit_from(self, src, r1, c1, r2, c2):
+        """
+        Copies the inclusive rectangle (r1, c1)-(r2, c2) from another buffer of
+        the same size. Indices are remapped through the color tables unless the
+        two tables agree, in which case each row is one slice copy.
+        """
+        remap = [self.index_of(color) for color in src.colors]
+        identity = all(i == idx for i, idx in enumerate(remap))
+        data, cols, log = self.data, self.cols, self.undo_log
+        for r in range(r1, r2 + 1):
+            start = r * cols
+            if log is not None:
+                for pos in range(start + c1, start + c2 + 1):
+                    if pos not in log: log[pos] = data[pos]
+            span = src.data[start + c1:start + c2 + 1]
+            if identity:
+                data[start + c1:start + c2 + 1] = array(data.typecode, span)
+            else:
+                data[start + c1:start + c2 + 1] = array(data.typecode, [remap[i] for i in span])
+
+    def overlay_from(self, src, r1, c1, r2, c2):
+        """Like blit_from, but cells that are empty in `src` keep their value (layer compositing)."""
+        remap = [self.index_of(color) for color in src.colors]
+        data, cols, log = self.data, self.cols, self.undo_log
+        width = c2 - c1 + 1
+        for r in range(r1, r2 + 1):
+            start = r * cols + c1
+            span = src.data[start:start + width]
+            if not any(span): continue
+            line = data[start:start + width]
+            for i, idx in enumerate(span):
+                if idx:
+                    if log is not None and start + i not in log: log[start + i] = line[i]
+                    line[i] = remap[idx]
+            data[start:start + width] = line
+
+    def clear_rect(self, r1, c1, r2, c2):
+        """Sets the inclusive rectangle (r1, c1)-(r2, c2) to EMPTY_COLOR."""
+        data, cols, log = self.data, self.cols, self.undo_log
+        blank = array(data.typecode, [0]) * (c2 - c1 + 1)
+        for r in range(r1, r2 + 1):
+            start = r * cols
+            if log is not None:
+                for pos in range(start + c1, start + c2 + 1):
+                    if pos not in log: log[pos] = data[pos]
+            data[start + c1:start + c2 + 1] = blank
+
+    def crop(self, r1, c1, r2, c2):
+        """Returns the inclusive rectangle (r1, c1)-(r2, c2) as a new buffer."""
+        width = c2 - c1 + 1
+        part = PixelBuffer.from_indices(r2 - r1 + 1, width, self.colors, array(self.data.typecode))
+        for r in range(r1, r2 + 1):
+            start = r * self.cols + c1
+            part.data.extend(self.data[start:start + width])
+        return part
+
+    def paste(self, src, r, c):
+        """Copies all of `src` with its top-left corner at (r, c), clipped to this buffer."""
+        remap = [self.index_of(color) for color in src.colors]
+        data, cols, log = self.data, self.cols, self.undo_log
+        c_lo, c_hi = max(c, 0), min(c + src.cols, cols)
+        if c_lo >= c_hi: return
+        for sr in range(src.rows):
+            dr = r + sr
+            if not 0 <= dr < self.rows: continue
+            start = dr * cols
+            if log is not None:
+                for pos in range(start + c_lo, start + c_hi):
+                    if pos not in log: log[pos] = data[pos]
+            src_start = sr * src.cols - c
+            span = src.data[src_start + c_lo:src_start + c_hi]
+            data[start + c_lo:start + c_hi] = array(data.typecode, [remap[i] for i in span])
+
+    def content_bounds(self):
+        """Returns the (r1, c1, r2, c2) box around every non-empty cell, or None if the frame is empty."""
+        cols, data = self.cols, self.data
+        box = None
+        for r in range(self.rows):
+            line = data[r * cols:(r + 1) * cols]
+            if not any(line): continue
+            if data.typecode == "B":
+                raw = line.tobytes()
+                c1, c2 = cols - len(raw.lstrip(b"\0")), len(raw.rstrip(b"\0")) - 1
+            else:
+                used = [c for c, idx in enumerate(line) if idx]
+                c1, c2 = used[0], used[-1]
+            if box is None:
+                box = [r, c1, r, c2]
+            else:
+                box = [box[0], min(box[1], c1), r, max(box[3], c2)]
+        return tuple(box) if box else None
+
+    def row(self, r):
+        """Returns row `r` as a list of hex strings."""
+        colors = self.colors
+        start = r * self.cols
+        return [colors[i] for i in self.data[start:start + self.cols]]
+
+    def to_grid(self):
+        """Returns the frame as a list-of-rows grid of hex strings."""
+        return [self.row(r) for r in range(self.rows)]
+
+    def content_hash(self):
+        """
+        Returns a digest of the frame's visible content. It does not depend on
+        the order of the color table, so a frame reloaded from disk hashes the
+        same as the frame that was saved.
+        """
+        used = sorted(set(self.data), key=self.colors.__getitem__)
+        rank = {idx: i for i, idx in enumerate(used)}
+        if self.data.typecode == "B":
+            table = bytearray(256)
+            for idx, i in rank.items(): table[idx] = i
+            canonical = self.data.tobytes().translate(table)
+        elif len(used) <= 256:
+            canonical = bytes([rank[i] for i in self.data])
+        else:
+            canonical = array("H", [rank[i] for i in self.data]).tobytes()
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{self.rows}x{self.cols}|{'|'.join(self.colors[i] for i in used)}|".encode("utf-8"))
+        h.update(canonical)
+        return h.hexdigest()
+
+    @property
+    def nbytes(self):
+        return len(self.data) * self.data.itemsize
@@ -0,0 +1,302 @@
+# project_format.py
+# Single-file binary project container (.pxp).
+#
+# Layout (all integers little-endian):
+#     header       magic, version, rows, cols, pixel_size, entry_count,
+#                  index_offset, meta_length
+#     metadata     JSON (palette and any other project settings)
+#     frames       one compressed blob per frame (its visible layers merged)
+#     layers       version 2 only: one blob per layer of the frames listed in
+#                  the metadata's "layers", after all frames ("frame_count")
+#     frame index  (offset, length) per entry, written last
+#
+# A frame blob is its color table followed by the zlib-compressed palette
+# indices. Readers mmap the file and decode a frame only when asked for it.
+#
+# Also holds the frame parser and the bookkeeping for incremental saves of
+# folder projects (project_data.json + one frame_N.txt per frame).
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+from array import array
+from pixel_buffer import PixelBuffer
+from settings import EMPTY_COLOR
+
+PROJECT_EXTENSION = ".pxp"
+MAGIC = b"PXPJ"
+VERSION = 2 # Files without layers are still written as version 1
+HEADER = struct.Struct("<4sHIIIIQI")
+INDEX_ENTRY = struct.Struct("<QI")
+BLOB_HEADER = struct.Struct("<BHI")  # index itemsize, color count, color table length
+
+# --- FRAME BLOBS ---
+def encode_frame(buf, level=6):
+    """Compresses a PixelBuffer into a frame blob."""
+    table = "\n".join(buf.colors).encode("utf-8")
+    data = buf.data
+    if data.itemsize > 1 and sys.byteorder == "big":
+        data = array(data.typecode, data)
+        data.byteswap()
+    return (BLOB_HEADER.pack(data.itemsize, len(buf.colors), len(table)) + table
+            + zlib.compress(data.tobytes(), level))
+
+def decode_frame(blob, rows, cols):
+    """Rebuilds a PixelBuffer from a frame blob."""
+    itemsize, color_count, table_len = BLOB_HEADER.unpack_from(blob, 0)
+    start = BLOB_HEADER.size
+    colors = bytes(blob[start:start + table_len]).decode("utf-8").split("\n")[:color_count]
+    data = array("B" if itemsize == 1 else "H")
+    data.frombytes(zlib.decompress(blob[start + table_len:]))
+    if itemsize > 1 and sys.byteorder == "big":
+        data.byteswap()
+    if len(data) != rows * cols:
+        raise ValueError("Frame data does not match the project size.")
+
+    return PixelBuffer.from_indices(rows, cols, colors, data)
+
+class FrameBlob:
+    """An in-memory compressed frame, decoded only when load() is called."""
+    def __init__(self, blob, rows, cols):
+        self._blob = blob
+        self.rows = rows
+        self.cols = cols
+
+    def blob(self):
+        return self._blob
+
+    def load(self):
+        return decode_frame(self._blob, self.rows, self.cols)
+
+class LoadedFrame:
+    """A frame that is already decoded but not yet shown in a tab."""
+    def __init__(self, buf):
+        self.buf = buf
+
+    def blob(self):
+        return encode_frame(self.buf)
+
+    def load(self):
+        return self.buf
+
+class MappedFrame:
+    """A frame still sitting in a ProjectReader's mmap."""
+    def __init__(self, reader, index):
+        self.reader = reader
+        self.index = index
+
+    def blob(self):
+        return self.reader.frame_blob(self.index)
+
+    def load(self):
+        return self.reader.read_frame(self.index)
+
+# --- READ / WRITE ---
+def write_project(path, meta, frames):
+    """
+    Writes a container atomically (temp file + rename).
+    `frames` may mix PixelBuffers and already-encoded frame blobs (bytes).
+    """
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    tmp_path = path + ".tmp"
+    entries = []
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        f.write(meta_bytes)
+        for frame in frames:
+            blob = frame if isinstance(frame, (bytes, bytearray)) else encode_frame(frame)
+            entries.append((f.tell(), len(blob)))
+            f.write(blob)
+        index_offset = f.tell()
+        for offset, length in entries:
+            f.write(INDEX_ENTRY.pack(offset, length))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION if meta.get("layers") else 1,
+                            meta["rows"], meta["cols"], meta.get("pixel_size", 0),
+                            len(entries), index_offset, len(meta_bytes)))
+    os.replace(tmp_path, path)
+
+class ProjectReader:
+    """
+    Opens a container with mmap. Only the header, metadata and frame index
+    are parsed up front; frames are decoded on demand.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            (magic, version, self.rows, self.cols, self.pixel_size, frame_count,
+             index_offset, meta_length) = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError("Not a pixel project file.")
+            if version > VERSION:
+                raise ValueError(f"Project file version {version} is newer than this editor.")
+            self.meta = json.loads(self._map[HEADER.size:HEADER.size + meta_length].decode("utf-8"))
+            self.index = [INDEX_ENTRY.unpack_from(self._map, index_offset + i * INDEX_ENTRY.size)
+                          for i in range(frame_count)]
+        except Exception:
+            self.close()
+            raise
+
+    def __len__(self):
+        """The number of frames (layer entries come after them)."""
+        return self.meta.get("frame_count", len(self.index))
+
+    def frame_blob(self, i):
+        offset, length = self.index[i]
+        return self._map[offset:offset + length]
+
+    def read_frame(self, i):
+        return decode_frame(self.frame_blob(i), self.rows, self.cols)
+
+    def lazy_frame(self, i):
+        return MappedFrame(self, i)
+
+    def close(self):
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        if self._file:
+            self._file.close()
+            self._file = None
+
+# --- FOLDER PROJECTS ---
+META_FILE = "project_data.json"
+FRAME_SYMBOLS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789@%&*"
+GRID_PATTERN = re.compile(r'my_pixel_art\s*=\s*"""(.*?)"""', re.DOTALL)
+PALETTE_PATTERN = re.compile(r"palette\s*=\s*\{(.*?)\}", re.DOTALL)
+SYMBOL_PATTERN = re.compile(r"'(\S)':\s*'([^']*)'")
+
+def parse_frame_text(content, rows, cols):
+    """Parses one frame_N.txt into a PixelBuffer (cells outside rows x cols are dropped)."""
+    buf = PixelBuffer(rows, cols)
+    grid_match = GRID_PATTERN.search(content)
+    if not grid_match: return buf
+
+    lut = {}  # symbol -> palette index in buf
+    pal_match = PALETTE_PATTERN.search(content)
+    if pal_match:
+        for sym, hex_val in SYMBOL_PATTERN.findall(pal_match.group(1)):
+            lut[sym] = buf.index_of(EMPTY_COLOR if hex_val == "Transparent" else hex_val)
+
+    data = buf.data
+    for r, line in enumerate(grid_match.group(1).strip().split("\n")[:rows]):
+        line = line[:cols]
+        start = r * cols
+        data[start:start + len(line)] = array(data.typecode, [lut.get(ch, 0) for ch in line])
+    return buf
+
+def read_frame_file(path, rows, cols):
+    """Reads and parses a frame file. Runs in the loader's worker processes."""
+    with open(path, "r") as f:
+        return parse_frame_text(f.read(), rows, cols)
+
+def frame_to_text(buf):
+    """Formats a frame as a frame_N.txt (a symbol legend plus one line of symbols per row)."""
+    color_map = {}
+    legend_str = "palette = {\n    '.': 'Transparent',\n"
+    for i, color in enumerate(sorted(buf.used_colors())):
+        sym = FRAME_SYMBOLS[i] if i < len(FRAME_SYMBOLS) else "?"
+        color_map[color] = sym
+        legend_str += f"    '{sym}': '{color}',\n"
+    legend_str += "}"
+    
+    ascii_art = 'my_pixel_art = """\n'
+    for r in range(buf.rows):
+        line = "".join("." if cell == EMPTY_COLOR else color_map[cell] for cell in buf.row(r))
+        ascii_art += line + "\n"
+    ascii_art += '"""'
+    return f"{legend_str}\n\n{ascii_art}"
+
+def read_folder(folder):
+    """Returns (meta, frame file paths in frame order) of a folder project."""
+    with open(os.path.join(folder, META_FILE), "r") as f: meta = json.load(f)
+    files = [f for f in os.listdir(folder)
+             if f.startswith("frame_") and f.endswith(".txt") and re.search(r'\d+', f)]
+    files.sort(key=lambda x: int(re.search(r'\d+', x).group()))
+    return meta, [os.path.join(folder, f) for f in files]
+
+def _saved_frame_hashes(folder, json_path):
+    """Maps every frame file in the folder to its recorded hash (None if unknown)."""
+    recorded = {}
+    if os.path.exists(json_path):
+        try:
+            with open(json_path, "r") as f: recorded = json.load(f).get("frames", {})
+        except (ValueError, AttributeError):
+            recorded = {}
+    return {f: recorded.get(f) for f in os.listdir(folder)
+            if f.startswith("frame_") and f.endswith(".txt")}
+
+def save_folder(folder, meta, buffers):
+    """
+    Saves a folder project incrementally. project_data.json records a content
+    hash per frame file, and only new or changed frames are written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    json_path = os.path.join(folder, META_FILE)
+    saved = _saved_frame_hashes(folder, json_path)
+
+    frames = [(f"frame_{i+1}.txt", buf.content_hash()) for i, buf in enumerate(buffers)]
+    renames, writes, deletes = plan_folder_save(saved, frames)
+
+    if renames or writes or deletes:
+        # Forget the old hashes first: if the save is interrupted, the
+        # next one rewrites everything instead of trusting stale files.
+        write_text_atomic(json_path, json.dumps(meta, indent=4))
+    apply_renames(folder, renames)
+    for i in writes:
+        write_text_atomic(os.path.join(folder, frames[i][0]), frame_to_text(buffers[i]))
+    for filename in deletes:
+        os.remove(os.path.join(folder, filename))
+
+    write_text_atomic(json_path, json.dumps(dict(meta, frames=dict(frames)), indent=4))
+
+def write_text_atomic(path, text):
+    """Writes a text file via a temp file + rename, so it is never half-written."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def plan_folder_save(saved, frames):
+    """
+    Works out the minimal file operations for an incremental folder save.
+
+    `saved` maps each frame file already on disk to its content hash;
+    `frames` lists the (filename, hash) the folder should end up with.
+    Returns (renames, writes, deletes): (src, dst) moves for frames that were
+    only reordered, the indices into `frames` that need writing, and the old
+    files that are no longer used.
+    """
+    unchanged = {name for name, h in frames if saved.get(name) == h}
+    spare = {}  # hash -> old files free to be moved
+    for name, h in saved.items():
+        if name not in unchanged:
+            spare.setdefault(h, []).append(name)
+
+    renames, writes = [], []
+    for i, (name, h) in enumerate(frames):
+        if name in unchanged: continue
+        if spare.get(h):
+            renames.append((spare[h].pop(), name))
+        else:
+            writes.append(i)
+
+    targets = {name for name, _ in frames}
+    moved = {src for src, _ in renames}
+    deletes = [name for name in saved if name not in targets and name not in moved]
+    return renames, writes, deletes
+
+def apply_renames(folder, renames):
+    """Moves files in two steps, so swaps and cycles (1->2, 2->1) are safe."""
+    staged = []
+    for src, dst in renames:
+        tmp_name = src + ".move"
+        os.replace(os.path.join(folder, src), os.path.join(folder, tmp_name))
+        staged.append((tmp_name, dst))
+    for tmp_name, dst in staged:
+        os.replace(os.path.join(folder, tmp_name), os.path.join(folder, dst))
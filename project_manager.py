@@ -1,17 +1,36 @@
 # project_manager.py
 import tkinter as tk
-from tkinter import filedialog, messagebox
-import json
+from tkinter import filedialog, messagebox, ttk
 import os
-import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from settings import *
+from document import container_entries, recovery_frames, restore_saved_layers
 from editor_tab import EditorTab
+from project_format import (PROJECT_EXTENSION, META_FILE, ProjectReader, FrameBlob, LoadedFrame,
+                            write_project, read_folder, save_folder, read_frame_file, frame_to_text)
+from image_export import downscale_rgba, read_rgba, write_gif, write_png, write_sprite_atlas
+from quantize import quantize
+
+class FrameLoadJob:
+    """State of a folder load that is still parsing frames in the background."""
+    def __init__(self, folder_path, executor, futures, total):
+        self.folder_path = folder_path
+        self.executor = executor
+        self.futures = futures  # One per frame after the first, in order
+        self.total = total
+        self.attached = 1       # Frame 1 is parsed before the job starts
+        self.widget = None      # Progress bar + Cancel button
+        self.bar = None
+        self.label = None
 
 class ProjectManager:
     """Handles all File I/O: Saving, Loading, and Exporting."""
     
     def __init__(self, app_ref):
         self.app = app_ref 
+        self.reader = None # Open ProjectReader while frames of a .pxp are still undecoded
+        self.load_job = None # Running FrameLoadJob, if any
 
     # --- SAVE SYSTEM ---
     def save_project(self):
@@ -24,14 +43,21 @@ class ProjectManager:
         file_path = filedialog.asksaveasfilename(
             title="Save Project (Type a Name for the Folder)",
             initialfile="project_data.json",
-            filetypes=[("Project Data", "project_data.json"), ("All Files", "*.*")],
+            filetypes=[("Project Data", "project_data.json"), 
+                       ("Pixel Project File", f"*{PROJECT_EXTENSION}"),
+                       ("All Files", "*.*")],
             defaultextension=".json"
         )
         if not file_path: return
         
         filename = os.path.basename(file_path)
         
-        if filename == "project_data.json":
+        if filename.endswith(PROJECT_EXTENSION):
+            # Scenario C: Single-file binary project
+            self.app.current_project_path = file_path
+            self._perform_save(file_path)
+            return
+        elif filename == "project_data.json":
             # Scenario A: User navigated INTO a folder and clicked 'Save'
             folder_path = os.path.dirname(file_path)
         else:
@@ -42,34 +68,30 @@ class ProjectManager:
         self.app.current_project_path = folder_path
         self._perform_save(folder_path)
 
-    def _perform_save(self, folder_path):
-        meta_data = {
+    def _project_meta(self):
+        return {
             "rows": self.app.rows, 
             "cols": self.app.cols, 
             "pixel_size": self.app.pixel_size,
             "palette": self.app.current_palette
         }
-        try:
-            os.makedirs(folder_path, exist_ok=True)
 
-            json_path = os.path.join(folder_path, "project_data.json")
-            with open(json_path, "w") as f:
-                json.dump(meta_data, f, indent=4)
-            
-            if os.path.exists(folder_path):
-                for f in os.listdir(folder_path):
-                    if f.startswith("frame_") and f.endswith(".txt"): 
-                        os.remove(os.path.join(folder_path, f))
-
-            tabs = self.app.notebook.tabs()
-            for i in range(len(tabs) - 1): 
-                tab_widget = self.app.root.nametowidget(tabs[i])
-                tab = getattr(tab_widget, "tab_obj", None)
-                if tab:
-                    content = self.generate_tab_content(tab)
-                    filename = f"frame_{i+1}.txt"
-                    with open(os.path.join(folder_path, filename), "w") as f: 
-                        f.write(content)
+    def frame_tabs(self):
+        """Returns the EditorTab of every frame, in order (skips the '+' tab)."""
+        frame_tabs = []
+        tabs = self.app.notebook.tabs()
+        for i in range(len(tabs) - 1): 
+            tab = getattr(self.app.root.nametowidget(tabs[i]), "tab_obj", None)
+            if tab: frame_tabs.append(tab)
+        return frame_tabs
+
+    def _perform_save(self, folder_path):
+        if folder_path.endswith(PROJECT_EXTENSION):
+            self._perform_container_save(folder_path)
+            return
+        try:
+            # Folder projects hold one image per frame: layers are saved merged
+            save_folder(folder_path, self._project_meta(), [tab.composite for tab in self.frame_tabs()])
             
             project_name = os.path.basename(folder_path)
             self.app.root.title(f"Gemini Pixel Editor - [{project_name}]")
@@ -78,6 +100,34 @@ class ProjectManager:
         except Exception as e: 
             messagebox.showerror("Save Error", f"Could not save project:\n{str(e)}")
 
+    def recovery_snapshot(self):
+        """Returns (meta, frames) describing the open project, for the recovery journal."""
+        meta = self._project_meta()
+        meta["project_path"] = self.app.current_project_path
+        return meta, recovery_frames(self.frame_tabs())
+
+    def _perform_container_save(self, file_path):
+        try:
+            tabs = self.frame_tabs()
+            for tab in tabs:
+                for layer in tab.layers:
+                    if layer.source:
+                        # Never viewed since loading: copy the compressed blob as-is.
+                        # Detach it from the mmap first so the file can be replaced.
+                        layer.source = FrameBlob(bytes(layer.source.blob()), tab.rows, tab.cols)
+            entries, extra = container_entries(tabs)
+            if self.reader:
+                self.reader.close()
+                self.reader = None
+
+            write_project(file_path, dict(self._project_meta(), **extra), entries)
+
+            project_name = os.path.basename(file_path)
+            self.app.root.title(f"Gemini Pixel Editor - [{project_name}]")
+            self.app.show_toast(f"Saved to '{project_name}'")
+        except Exception as e: 
+            messagebox.showerror("Save Error", f"Could not save project:\n{str(e)}")
+
     # --- LOAD SYSTEM ---
     # --- LOAD SYSTEM ---
     def load_project_folder(self):
@@ -86,107 +136,184 @@ class ProjectManager:
         file_path = filedialog.askopenfilename(
             title="Open Project",
             filetypes=[
-                ("Project Files", "*.json *.txt"), 
+                ("Project Files", f"*.json *.txt *{PROJECT_EXTENSION}"), 
                 ("All Files", "*.*")
             ]
         )
         
         if not file_path: return
+
+        if file_path.endswith(PROJECT_EXTENSION):
+            self.load_project_file(file_path)
+            return
         
         # Robustness: We find the folder regardless of which file they clicked.
         folder_path = os.path.dirname(file_path)
         
         try:
-            meta_path = os.path.join(folder_path, "project_data.json")
+            meta_path = os.path.join(folder_path, META_FILE)
             
             if not os.path.exists(meta_path):
                 messagebox.showerror("Error", "Could not find 'project_data.json' in this folder.\nPlease select the main project file.")
                 return
             
-            with open(meta_path, "r") as f: meta = json.load(f)
-            
-            # Apply Settings
-            self.app.rows = meta.get("rows", 33)
-            self.app.cols = meta.get("cols", 45)
-            self.app.pixel_size = meta.get("pixel_size", 15)
-            self.app.current_palette = meta.get("palette", self.app.current_palette)
-            self.app.refresh_quick_palette()
-            
-            # Clear existing tabs
-            for tab in self.app.notebook.tabs(): 
-                self.app.notebook.forget(tab)
+            meta, paths = read_folder(folder_path)
             
-            # Load Files
-            files = []
-            for f in os.listdir(folder_path):
-                if f.startswith("frame_") and f.endswith(".txt"):
-                    if re.search(r'\d+', f):
-                        files.append(f)
-            
-            files.sort(key=lambda x: int(re.search(r'\d+', x).group()))
+            self._apply_meta(meta)
+            self._clear_tabs()
+            self.app.current_project_path = None # Set once every frame is in
 
-            if not files:
+            if not paths:
                 self.app.add_new_tab("Frame 1") 
+                self._finish_folder_load(folder_path)
             else:
-                for i, filename in enumerate(files):
-                    self.load_frame_file(os.path.join(folder_path, filename), f"Frame {i+1}")
-            
-            self.app.setup_plus_tab() 
-            self.app.current_project_path = folder_path
-            self.app.root.title(f"Gemini Pixel Editor - [{os.path.basename(folder_path)}]")
-            self.app.show_toast("Project Loaded!")
+                self._start_frame_load(folder_path, paths)
         except Exception as e: 
             messagebox.showerror("Load Error", f"Error loading project:\n{str(e)}")
 
-    def load_frame_file(self, filepath, title):
-        new_tab = EditorTab(self.app.notebook, self.app, self.app.rows, self.app.cols, self.app.pixel_size, title)
-        new_tab.frame.tab_obj = new_tab 
-        self.app.notebook.add(new_tab.frame, text=title) 
-        
-        with open(filepath, "r") as f: content = f.read()
-        grid_match = re.search(r'my_pixel_art\s*=\s*"""(.*?)"""', content, re.DOTALL)
-        if not grid_match: return 
-        
-        pal_match = re.search(r"palette\s*=\s*\{(.*?)\}", content, re.DOTALL)
-        file_map = {}
-        if pal_match:
-            raw_pal_str = pal_match.group(1)
-            for sym, hex_val in re.findall(r"'(\S)':\s*'([^']*)'", raw_pal_str):
-                if hex_val == 'Transparent': hex_val = EMPTY_COLOR
-                file_map[sym] = hex_val
-                
-        raw_grid = grid_match.group(1).strip().split('\n')
-        for r, line in enumerate(raw_grid):
-            if r < self.app.rows:
-                for c, char in enumerate(line):
-                    if c < self.app.cols and char in file_map: 
-                        new_tab.grid_data[r][c] = file_map[char]
-        new_tab.draw_grid_lines()
+    def _start_frame_load(self, folder_path, paths):
+        """
+        Parses frame 1 right away so it is editable immediately, then parses
+        the rest in worker processes. _poll_frame_load attaches them in order.
+        """
+        rows, cols = self.app.rows, self.app.cols
+        self._attach_frame(read_frame_file(paths[0], rows, cols), 0)
+        self.app.setup_plus_tab()
+        self.app.notebook.select(0)
+        if len(paths) == 1:
+            self._finish_folder_load(folder_path)
+            return
+
+        executor = ProcessPoolExecutor(max_workers=LOAD_WORKERS)
+        futures = [executor.submit(read_frame_file, path, rows, cols) for path in paths[1:]]
+        job = FrameLoadJob(folder_path, executor, futures, len(paths))
+        self.load_job = job
+        self._show_load_progress(job)
+        self.app.root.after(LOAD_POLL_MS, self._poll_frame_load, job)
+
+    def _attach_frame(self, buffer, index):
+        """Adds a parsed frame as a tab (before the '+' tab). Drawing waits until it is shown."""
+        title = f"Frame {index+1}"
+        new_tab = EditorTab(self.app.notebook, self.app, self.app.rows, self.app.cols,
+                            self.app.pixel_size, title, pixel_source=LoadedFrame(buffer))
+        new_tab.frame.tab_obj = new_tab
+        total = len(self.app.notebook.tabs())
+        if total > 0 and self.app.notebook.tab(total-1, "text") == " + ":
+            self.app.notebook.insert(total-1, new_tab.frame, text=title)
+        else:
+            self.app.notebook.add(new_tab.frame, text=title)
+
+    def _poll_frame_load(self, job):
+        if job is not self.load_job: return # Cancelled or replaced
+        deadline = time.perf_counter() + LOAD_ATTACH_MS / 1000
+        try:
+            while job.attached < job.total:
+                future = job.futures[job.attached - 1]
+                if not future.done(): break
+                self._attach_frame(future.result(), job.attached)
+                job.attached += 1
+                if time.perf_counter() > deadline: break
+        except Exception as e:
+            self._end_frame_load()
+            messagebox.showerror("Load Error", f"Error loading frame {job.attached + 1}:\n{str(e)}")
+            return
+
+        if job.attached == job.total:
+            self._end_frame_load()
+            self._finish_folder_load(job.folder_path)
+        else:
+            job.bar.config(value=job.attached)
+            job.label.config(text=f"Loading frames {job.attached}/{job.total}")
+            self.app.root.after(LOAD_POLL_MS, self._poll_frame_load, job)
+
+    def _show_load_progress(self, job):
+        job.widget = tk.Frame(self.app.root, bg="#333333", padx=10, pady=6)
+        job.label = tk.Label(job.widget, text=f"Loading frames 1/{job.total}", bg="#333333", fg="white",
+                             font=("Arial", 10, "bold"))
+        job.label.pack(side=tk.LEFT)
+        job.bar = ttk.Progressbar(job.widget, length=160, maximum=job.total, value=1)
+        job.bar.pack(side=tk.LEFT, padx=8)
+        tk.Button(job.widget, text="Cancel", command=self.cancel_frame_load).pack(side=tk.LEFT)
+        job.widget.place(relx=0.5, rely=0.9, anchor="center")
+
+    def cancel_frame_load(self):
+        """Stops a background load, keeping the frames attached so far (unsaved)."""
+        job = self.load_job
+        if not job: return
+        self._end_frame_load()
+        name = os.path.basename(job.folder_path)
+        self.app.root.title(f"Gemini Pixel Editor - [{name}] (partially loaded)")
+        self.app.show_toast(f"Loading cancelled ({job.attached}/{job.total} frames)")
+
+    def _end_frame_load(self):
+        job = self.load_job
+        self.load_job = None
+        job.executor.shutdown(wait=False, cancel_futures=True)
+        if job.widget: job.widget.destroy()
+
+    def _finish_folder_load(self, folder_path):
+        self.app.setup_plus_tab() 
+        self.app.current_project_path = folder_path
+        self.app.root.title(f"Gemini Pixel Editor - [{os.path.basename(folder_path)}]")
+        self.app.show_toast("Project Loaded!")
+
+    def open_frames(self, meta, buffers):
+        """Replaces the open project with already decoded frames (e.g. recovered ones)."""
+        self._apply_meta(meta)
+        self._clear_tabs()
+        for i, buffer in enumerate(buffers):
+            self._attach_frame(buffer, i)
+        self.app.setup_plus_tab()
+        self.app.notebook.select(0)
+        self.app.current_project_path = meta.get("project_path")
+        if self.app.current_project_path:
+            self.app.root.title(f"Gemini Pixel Editor - [{os.path.basename(self.app.current_project_path)}] (recovered)")
+
+    def _apply_meta(self, meta):
+        self.app.rows = meta.get("rows", 33)
+        self.app.cols = meta.get("cols", 45)
+        self.app.pixel_size = meta.get("pixel_size", 15)
+        self.app.current_palette = meta.get("palette", self.app.current_palette)
+        self.app.refresh_quick_palette()
+
+    def _clear_tabs(self):
+        if self.load_job:
+            self._end_frame_load()
+        for tab in self.app.notebook.tabs(): 
+            self.app.notebook.forget(tab)
+        if self.reader:
+            self.reader.close()
+            self.reader = None
+
+    def load_project_file(self, file_path):
+        """
+        Opens a single-file (.pxp) project. Only the header and frame index are
+        read here; each frame is decoded the first time its tab is shown.
+        """
+        try:
+            reader = ProjectReader(file_path)
+            self._apply_meta(reader.meta)
+            self._clear_tabs()
+            self.reader = reader
+
+            for i in range(len(reader)):
+                title = f"Frame {i+1}"
+                new_tab = EditorTab(self.app.notebook, self.app, self.app.rows, self.app.cols,
+                                    self.app.pixel_size, title, pixel_source=reader.lazy_frame(i))
+                restore_saved_layers(new_tab, reader, i)
+                new_tab.frame.tab_obj = new_tab
+                self.app.notebook.add(new_tab.frame, text=title)
+
+            self.app.setup_plus_tab()
+            self.app.current_project_path = file_path
+            self.app.root.title(f"Gemini Pixel Editor - [{os.path.basename(file_path)}]")
+            self.app.show_toast("Project Loaded!")
+        except Exception as e: 
+            messagebox.showerror("Load Error", f"Error loading project:\n{str(e)}")
 
     # --- EXPORT SYSTEM ---
     def generate_tab_content(self, tab):
-        unique_colors = set()
-        for row in tab.grid_data:
-            for cell in row:
-                if cell != EMPTY_COLOR: unique_colors.add(cell)
-        
-        symbols = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789@%&*"
-        color_map = {}
-        legend_str = "palette = {\n    '.': 'Transparent',\n"
-        for i, color in enumerate(sorted(unique_colors)):
-            sym = symbols[i] if i < len(symbols) else "?"
-            color_map[color] = sym
-            legend_str += f"    '{sym}': '{color}',\n"
-        legend_str += "}"
-        
-        ascii_art = 'my_pixel_art = """\n'
-        for row in tab.grid_data:
-            line = ""
-            for cell in row:
-                line += "." if cell == EMPTY_COLOR else color_map[cell]
-            ascii_art += line + "\n"
-        ascii_art += '"""'
-        return f"{legend_str}\n\n{ascii_art}"
+        return frame_to_text(tab.composite)
 
     def export_active_tab(self):
         tab = self.app.active_tab()
@@ -196,6 +323,148 @@ class ProjectManager:
             self.app.root.clipboard_append(content)
             self.app.show_toast("Code Copied!")
 
+    def export_frame_png(self):
+        """Saves the active frame as a PNG, each cell pixel_size x pixel_size."""
+        tab = self.app.active_tab()
+        if not tab: return
+        path = filedialog.asksaveasfilename(
+            title="Export Frame as PNG",
+            initialfile=f"{self.app.notebook.tab(tab.frame, 'text').strip()}.png",
+            filetypes=[("PNG Image", "*.png")],
+            defaultextension=".png"
+        )
+        if not path: return
+        try:
+            write_png(path, tab.get_flattened_data(), scale=self.app.pixel_size, transparent=True)
+            self.app.show_toast("PNG Exported!")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Could not export PNG:\n{str(e)}")
+
+    def import_image(self):
+        """
+        Imports PNG/PPM images: into the active frame at the top-left corner
+        (undoable), or as new frames (always, when several files are picked).
+        Colors are kept, matched to the current palette, or reduced to N
+        colors. An image exactly N times the grid size, such as one exported
+        by export_frame_png, is scaled back down to one cell per block.
+        """
+        paths = filedialog.askopenfilenames(
+            title="Import Image",
+            filetypes=[("Images", "*.png *.ppm *.pgm *.pnm"), ("All Files", "*.*")]
+        )
+        if not paths: return
+        options = self._ask_import_options(new_frames=len(paths) > 1)
+        if not options: return
+        tab = self.app.active_tab()
+        if not options["new_frames"] and tab and tab.layer_locked:
+            self.app.show_toast(f"{tab.layers[tab.active_layer].name} is locked")
+            return
+
+        for n, path in enumerate(paths):
+            try:
+                width, height, rows = read_rgba(path)
+                factor = height // self.app.rows
+                if factor > 1 and (height, width) == (factor * self.app.rows, factor * self.app.cols):
+                    width, height, rows = downscale_rgba(width, height, rows, factor)
+                image = quantize(width, height, rows, **options["quantize"])
+            except Exception as e:
+                messagebox.showerror("Import Error", f"Could not import {os.path.basename(path)}:\n{str(e)}")
+                return
+
+            if options["new_frames"]:
+                tab = self.app.add_new_tab()
+                tab.pixels.paste(image, 0, 0)
+                tab.draw_grid_lines()
+            else:
+                tab = self.app.active_tab()
+                if not tab: return
+                tab.commit_selection()
+                tab.save_state()
+                tab.pixels.paste(image, 0, 0)
+                tab.invalidate(0, 0, min(image.rows, tab.rows) - 1, min(image.cols, tab.cols) - 1)
+        self.app.notify_preview()
+        self.app.show_toast(f"Imported {len(paths)} image(s)")
+
+    def _ask_import_options(self, new_frames):
+        """Modal dialog for import_image. Returns the chosen options, or None if cancelled."""
+        win = tk.Toplevel(self.app.root)
+        win.title("Import Image")
+        win.transient(self.app.root)
+        win.grab_set()
+        frame = tk.Frame(win, padx=20, pady=15)
+        frame.pack(fill=tk.BOTH, expand=True)
+
+        var_colors = tk.StringVar(value="palette")
+        tk.Label(frame, text="Colors:").pack(anchor=tk.W)
+        tk.Radiobutton(frame, text="Match current palette", variable=var_colors, value="palette").pack(anchor=tk.W)
+        row = tk.Frame(frame)
+        row.pack(anchor=tk.W)
+        tk.Radiobutton(row, text="Reduce to", variable=var_colors, value="reduce").pack(side=tk.LEFT)
+        count_entry = tk.Entry(row, width=4)
+        count_entry.insert(0, "16")
+        count_entry.pack(side=tk.LEFT)
+        tk.Label(row, text="colors").pack(side=tk.LEFT)
+        tk.Radiobutton(frame, text="Keep exact colors", variable=var_colors, value="exact").pack(anchor=tk.W)
+
+        var_target = tk.StringVar(value="new" if new_frames else "frame")
+        tk.Label(frame, text="Into:").pack(anchor=tk.W, pady=(10, 0))
+        tk.Radiobutton(frame, text="Active frame", variable=var_target, value="frame",
+                       state=tk.DISABLED if new_frames else tk.NORMAL).pack(anchor=tk.W)
+        tk.Radiobutton(frame, text="New frame(s)", variable=var_target, value="new").pack(anchor=tk.W)
+
+        result = {}
+        def accept():
+            mode = var_colors.get()
+            if mode == "palette":
+                options = {"palette": list(self.app.current_palette)}
+            elif mode == "reduce":
+                try: options = {"colors": max(1, int(count_entry.get()))}
+                except ValueError: return
+            else:
+                options = {"colors": None}
+            result.update(quantize=options, new_frames=var_target.get() == "new")
+            win.destroy()
+
+        tk.Button(frame, text="Import", command=accept).pack(pady=(10, 0))
+        win.wait_window()
+        return result or None
+
+    def export_gif(self):
+        """Saves every frame as an animated GIF, timed by the preview's speed setting."""
+        tabs = self.frame_tabs()
+        if not tabs: return
+        path = filedialog.asksaveasfilename(
+            title="Export Animated GIF",
+            initialfile="animation.gif",
+            filetypes=[("GIF Image", "*.gif")],
+            defaultextension=".gif"
+        )
+        if not path: return
+        try:
+            write_gif(path, [tab.get_flattened_data() for tab in tabs], self.app.preview_speed_ms,
+                      scale=self.app.pixel_size, transparent=True)
+            self.app.show_toast("GIF Exported!")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Could not export GIF:\n{str(e)}")
+
+    def export_sprite_atlas(self):
+        """Saves all frames as one packed sprite sheet PNG plus its JSON frame map."""
+        tabs = self.frame_tabs()
+        if not tabs: return
+        path = filedialog.asksaveasfilename(
+            title="Export Sprite Sheet",
+            initialfile="spritesheet.png",
+            filetypes=[("PNG Image", "*.png")],
+            defaultextension=".png"
+        )
+        if not path: return
+        try:
+            json_path = write_sprite_atlas(path, [tab.get_flattened_data() for tab in tabs],
+                                           scale=self.app.pixel_size)
+            self.app.show_toast(f"Sprite sheet + {os.path.basename(json_path)} exported!")
+        except Exception as e:
+            messagebox.showerror("Export Error", f"Could not export sprite sheet:\n{str(e)}")
+
     def export_for_gemini(self):
         path = filedialog.asksaveasfilename(
             title="Export for Gemini", 
@@ -220,7 +489,9 @@ class ProjectManager:
             tab = getattr(self.app.root.nametowidget(tabs[i]), "tab_obj", None)
             if tab:
                 content.append(f"### FRAME {i+1} ###")
-                for row in tab.grid_data:
+                composite = tab.composite
+                for r in range(composite.rows):
+                    row = composite.row(r)
                     content.append("".join("." if c == EMPTY_COLOR else symbol_map.get(c, "?") for c in row))
                 content.append("-" * 20 + "\n")
                 
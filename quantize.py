@@ -0,0 +1,171 @@
+# quantize.py
+# Maps true-color images onto frame colors for the importer: the exact
+# colors, a given palette, or an N-color median-cut palette of the image.
+# Uses NumPy when it is installed; otherwise a cached nearest-color lookup
+# over the image's distinct colors.
+import sys
+from array import array
+from collections import Counter
+from pixel_buffer import PixelBuffer
+from settings import EMPTY_COLOR
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EXACT_COLOR_LIMIT = 32768 # Above this many distinct colors, match 15-bit color cells instead
+
+def _rgb(color):
+    value = int(color.lstrip("#")[:6], 16)
+    return (value >> 16, (value >> 8) & 0xFF, value & 0xFF)
+
+def _hex(r, g, b):
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+def _cell(value):
+    """The 15-bit color cell of a packed 0xBBGGRR value."""
+    return ((value >> 3) & 0x1F) | ((value >> 6) & 0x3E0) | ((value >> 9) & 0x7C00)
+
+# --- PALETTE ---
+def median_cut(histogram, count):
+    """
+    Builds a palette of at most `count` colors from [(r, g, b, weight)].
+    The box holding the most pixels (that still spans more than one color)
+    is split at the weighted median of its widest channel until there are
+    `count` boxes; each box contributes its weighted mean color.
+    """
+    boxes = [list(histogram)] if histogram else []
+    while len(boxes) < count:
+        splittable = [b for b in boxes if len(b) > 1]
+        if not splittable: break
+        box = max(splittable, key=lambda b: sum(e[3] for e in b))
+        spans = [max(e[ch] for e in box) - min(e[ch] for e in box) for ch in range(3)]
+        channel = spans.index(max(spans))
+        box.sort(key=lambda e: e[channel])
+        half, seen = sum(e[3] for e in box) / 2, 0
+        for cut, entry in enumerate(box[:-1], 1):
+            seen += entry[3]
+            if seen >= half: break
+        boxes.remove(box)
+        boxes += [box[:cut], box[cut:]]
+
+    palette = []
+    for box in boxes:
+        total = sum(e[3] for e in box)
+        color = _hex(*(round(sum(e[ch] * e[3] for e in box) / total) for ch in range(3)))
+        if color not in palette:
+            palette.append(color)
+    return palette
+
+def _nearest(rgb, palette_rgb):
+    r, g, b = rgb
+    best, best_d = 0, None
+    for i, (pr, pg, pb) in enumerate(palette_rgb):
+        d = (r - pr) ** 2 + (g - pg) ** 2 + (b - pb) ** 2
+        if best_d is None or d < best_d:
+            best, best_d = i, d
+    return best
+
+def _frame_colors(palette):
+    """Color table for the result (EMPTY_COLOR first) and each palette entry's index in it."""
+    index = {EMPTY_COLOR: 0}
+    for color in palette:
+        index.setdefault(color, len(index))
+    if len(index) > 0x10000:
+        raise ValueError("The image has more than 65536 colors. Reduce it to a palette first.")
+    return list(index), [index[color] for color in palette]
+
+# --- QUANTIZE ---
+def quantize(width, height, rows, palette=None, colors=16):
+    """
+    Builds a PixelBuffer from RGBA rows (4 bytes per pixel). Pixels under
+    50% alpha become EMPTY_COLOR. Opaque pixels are mapped to the nearest
+    color of `palette` (hex strings); with no palette, to a median-cut
+    palette of `colors` entries, or kept exact when `colors` is None.
+    """
+    if np is not None:
+        return _quantize_numpy(width, height, rows, palette, colors)
+
+    pixels = array("I")
+    for row in rows:
+        pixels.frombytes(row)
+    if sys.byteorder == "big":
+        pixels.byteswap()
+    counts = Counter(pixels)  # 0xAABBGGRR -> pixel count
+    opaque = Counter()        # 0xBBGGRR -> pixel count
+    for value, n in counts.items():
+        if value >> 24 >= 128:
+            opaque[value & 0xFFFFFF] += n
+
+    exact = palette is None and colors is None
+    if exact:
+        palette = [_hex(v & 0xFF, (v >> 8) & 0xFF, v >> 16) for v in opaque]
+    elif palette is None:
+        bins = {}  # 15-bit cell -> [weight, r sum, g sum, b sum]
+        for value, n in opaque.items():
+            entry = bins.setdefault(_cell(value), [0, 0, 0, 0])
+            entry[0] += n
+            entry[1] += (value & 0xFF) * n
+            entry[2] += ((value >> 8) & 0xFF) * n
+            entry[3] += (value >> 16) * n
+        palette = median_cut([(r / n, g / n, b / n, n) for n, r, g, b in bins.values()], colors)
+
+    frame_colors, target = _frame_colors(palette)
+    palette_rgb = [_rgb(color) for color in palette]
+    # Colors already matched: the image's own colors in exact mode
+    cells = {v: target[i] for i, v in enumerate(opaque)} if exact else {}
+    exact = exact or len(opaque) <= EXACT_COLOR_LIMIT
+    lookup = {}  # 0xAABBGGRR -> index in frame_colors
+    for value in counts:
+        if value >> 24 < 128:
+            lookup[value] = 0
+            continue
+        key = value & 0xFFFFFF if exact else _cell(value)
+        idx = cells.get(key)
+        if idx is None:
+            if exact:
+                rgb = (value & 0xFF, (value >> 8) & 0xFF, (value >> 16) & 0xFF)
+            else:
+                rgb = ((key & 0x1F) << 3 | 4, (key >> 5 & 0x1F) << 3 | 4, (key >> 10) << 3 | 4)
+            idx = cells[key] = target[_nearest(rgb, palette_rgb)]
+        lookup[value] = idx
+    typecode = "B" if len(frame_colors) <= 256 else "H"
+    return PixelBuffer.from_indices(height, width, frame_colors, array(typecode, map(lookup.__getitem__, pixels)))
+
+def _quantize_numpy(width, height, rows, palette, colors):
+    """quantize() on NumPy: the distinct colors are found and matched as whole arrays."""
+    px = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(-1, 4)
+    key = px[:, 0].astype(np.int32) | (px[:, 1].astype(np.int32) << 8) | (px[:, 2].astype(np.int32) << 16)
+    key[px[:, 3] < 128] = -1
+    uniq, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    opaque = uniq >= 0
+    rgb = np.stack([uniq & 0xFF, (uniq >> 8) & 0xFF, (uniq >> 16) & 0xFF], axis=1)[opaque]
+
+    exact = palette is None and colors is None
+    if exact:
+        palette = [_hex(*map(int, c)) for c in rgb]
+    elif palette is None:
+        weights = counts[opaque]
+        cells = ((rgb[:, 0] >> 3) | ((rgb[:, 1] >> 3) << 5) | ((rgb[:, 2] >> 3) << 10))
+        n = np.bincount(cells, weights=weights, minlength=32768)
+        sums = [np.bincount(cells, weights=rgb[:, ch] * weights, minlength=32768) for ch in range(3)]
+        used = np.nonzero(n)[0]
+        palette = median_cut([(sums[0][c] / n[c], sums[1][c] / n[c], sums[2][c] / n[c], n[c]) for c in used],
+                             colors)
+
+    frame_colors, target = _frame_colors(palette)
+    palette_rgb = np.array([_rgb(color) for color in palette], dtype=np.int32).reshape(-1, 3)
+    nearest = np.arange(len(rgb)) if exact else np.empty(len(rgb), dtype=np.int64)
+    for start in range(0, 0 if exact else len(rgb), 4096): # Bounded memory for the distance matrix
+        chunk = rgb[start:start + 4096].astype(np.int32)
+        distance = ((chunk[:, None, :] - palette_rgb[None, :, :]) ** 2).sum(axis=2)
+        nearest[start:start + 4096] = distance.argmin(axis=1)
+
+    lut = np.zeros(len(uniq), dtype=np.uint16)
+    lut[opaque] = np.array(target, dtype=np.uint16)[nearest] if len(rgb) else 0
+    typecode = "B" if len(frame_colors) <= 256 else "H"
+    data = array(typecode)
+    data.frombytes(lut[inverse].astype(np.uint8 if typecode == "B" else np.uint16).tobytes())
+    return PixelBuffer.from_indices(height, width, frame_colors, data)
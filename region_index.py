@@ -0,0 +1,73 @@
+# region_index.py
+from array import array
+from algorithms import match_table, scan_spans
+
+class RegionIndex:
+    """
+    Lazily built connected-region labels for one frame (exact color match).
+
+    Each cell holds the label of the region it belongs to, or 0 if it has
+    not been labelled yet. A region is labelled the first time a cell in it
+    is queried and is then answered from the cache until an edit touches it.
+    Regions are stored as (r, lo, hi) spans, so returning the pixel list
+    costs O(region), never O(frame).
+    """
+    def __init__(self, connectivity=4):
+        self.connectivity = connectivity
+        self.buffer = None
+        self.labels = None    # array('I'), one label per cell
+        self.regions = {}     # label -> (spans, bounds)
+        self._next_label = 1
+
+    def reset(self):
+        self.buffer = None
+        self.labels = None
+        self.regions = {}
+
+    def region_at(self, buf, r, c):
+        """Returns (pixels, bounds) of the region containing (r, c), like flood_fill."""
+        if not buf.in_bounds(r, c):
+            return [], None
+        if buf is not self.buffer or len(self.labels) != buf.rows * buf.cols:
+            self.reset()
+            self.buffer = buf
+            self.labels = array("I", [0]) * (buf.rows * buf.cols)
+
+        label = self.labels[r * buf.cols + c]
+        if label == 0:
+            label = self._label_region(r, c)
+        spans, bounds = self.regions[label]
+        return [(sr, x) for sr, lo, hi in spans for x in range(lo, hi + 1)], bounds
+
+    def invalidate(self, r1, c1, r2, c2):
+        """
+        Forgets every region touching the changed cells (r1, c1)-(r2, c2) or
+        bordering them, since an edit there can split or merge those regions.
+        """
+        if not self.regions: return
+        rows, cols = self.buffer.rows, self.buffer.cols
+        r1, c1 = max(r1 - 1, 0), max(c1 - 1, 0)
+        r2, c2 = min(r2 + 1, rows - 1), min(c2 + 1, cols - 1)
+        if r1 > r2 or c1 > c2: return
+
+        labels = self.labels
+        stale = set()
+        for r in range(r1, r2 + 1):
+            stale.update(labels[r * cols + c1:r * cols + c2 + 1])
+        stale.discard(0)
+
+        zeros = array("I", [0]) * cols
+        for label in stale:
+            spans, _ = self.regions.pop(label)
+            for r, lo, hi in spans:
+                labels[r * cols + lo:r * cols + hi + 1] = zeros[:hi - lo + 1]
+
+    def _label_region(self, r, c):
+        buf = self.buffer
+        label = self._next_label
+        self._next_label += 1
+        match = match_table(buf.colors, buf.get(r, c))
+        self.regions[label] = scan_spans(buf.data, buf.rows, buf.cols, r, c, match,
+                                         self.connectivity, self.labels,
+                                         array("I", [label]) * buf.cols)
+        return label
@@ -0,0 +1,145 @@
+# render_cli.py
+# Batch renderer: converts project folders / .pxp files to images without a display.
+#
+#   python render_cli.py projects/* --format gif --scale 4 --out exports
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from document import Document
+from image_export import sprite_sheet, write_gif, write_png, write_sprite_atlas
+from project_format import META_FILE, PROJECT_EXTENSION
+from settings import PREVIEW_SPEED_MS
+
+FORMATS = ("png", "sheet", "atlas", "gif")
+
+def find_projects(patterns):
+    """Expands paths/globs into project folders and .pxp files (the shell may not expand globs)."""
+    found = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if os.path.basename(path) == META_FILE:
+                path = os.path.dirname(path)
+            is_project = (path.endswith(PROJECT_EXTENSION) and os.path.isfile(path)) or \
+                         os.path.isfile(os.path.join(path, META_FILE))
+            if is_project and path not in found:
+                found.append(path)
+    return found
+
+def project_name(path):
+    name = os.path.basename(os.path.normpath(path))
+    return name[:-len(PROJECT_EXTENSION)] if name.endswith(PROJECT_EXTENSION) else name
+
+def output_names(paths):
+    """
+    The output name of each project: its project name, or where several
+    inputs share one, as many trailing path parts as it takes to tell them
+    apart ("a/walk" -> "a_walk", "walk.pxp" -> "walk_pxp").
+    """
+    names = {path: project_name(path) for path in paths}
+    shared = Counter(names.values())
+    groups = {}
+    for path in paths:
+        if shared[names[path]] > 1:
+            groups.setdefault(names[path], []).append(path)
+    for group in groups.values():
+        parts = {path: [p for p in os.path.abspath(path).replace(".", "_").split(os.sep) if p] for path in group}
+        pending = list(group)
+        for depth in range(1, max(len(p) for p in parts.values()) + 1):
+            candidates = {path: "_".join(parts[path][-depth:]) for path in group}
+            counts = Counter(candidates.values())
+            for path in pending[:]:
+                if counts[candidates[path]] == 1:
+                    names[path] = candidates[path]
+                    pending.remove(path)
+            if not pending: break
+    return names
+
+def render_project(path, fmt, out_dir, scale=1, delay_ms=PREVIEW_SPEED_MS, columns=None, transparent=False,
+                   name=None):
+    """
+    Renders one project. Runs in a worker process. Outputs are named after
+    `name` (default: the project name).
+    Returns (frame count, seconds, output paths).
+    """
+    start = time.perf_counter()
+    doc = Document.load(path)
+    try:
+        frames = [frame.composite for frame in doc.frames]
+    finally:
+        doc.close()
+    name = name or project_name(path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    if fmt == "png":
+        folder = os.path.join(out_dir, name)
+        os.makedirs(folder, exist_ok=True)
+        outputs = []
+        for i, frame in enumerate(frames):
+            outputs.append(os.path.join(folder, f"frame_{i+1:03d}.png"))
+            write_png(outputs[-1], frame, scale, transparent)
+    elif fmt == "sheet":
+        outputs = [os.path.join(out_dir, f"{name}_sheet.png")]
+        write_png(outputs[0], sprite_sheet(frames, columns), scale, transparent)
+    elif fmt == "atlas":
+        outputs = [os.path.join(out_dir, f"{name}_atlas.png")]
+        outputs.append(write_sprite_atlas(outputs[0], frames, scale, transparent=transparent))
+    else:
+        outputs = [os.path.join(out_dir, f"{name}.gif")]
+        write_gif(outputs[0], frames, delay_ms, scale, transparent=transparent)
+    return len(frames), time.perf_counter() - start, outputs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render pixel editor projects to images.")
+    parser.add_argument("projects", nargs="+", help="Project folders, .pxp files or glob patterns")
+    parser.add_argument("--format", choices=FORMATS, default="png",
+                        help="png: one PNG per frame, sheet: frames on a grid, "
+                             "atlas: packed sheet without duplicates + JSON map, gif: animated GIF")
+    parser.add_argument("--out", default="exports", help="Output folder (default: exports)")
+    parser.add_argument("--scale", type=int, default=1, help="Output pixels per project pixel")
+    parser.add_argument("--delay", type=int, default=PREVIEW_SPEED_MS, help="GIF frame delay in ms")
+    parser.add_argument("--columns", type=int, default=None, help="Sprite sheet columns (default: square)")
+    parser.add_argument("--transparent", action="store_true", help="Make empty cells transparent")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    projects = find_projects(args.projects)
+    if not projects:
+        print("No projects found.", file=sys.stderr)
+        return 2
+    names = output_names(projects)
+    clashes = sorted(name for name, n in Counter(names.values()).items() if n > 1)
+    if clashes:
+        print(f"Projects would overwrite each other's output: {', '.join(clashes)}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    total_frames = 0
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = {pool.submit(render_project, path, args.format, args.out, args.scale,
+                               args.delay, args.columns, args.transparent, names[path]): path
+                   for path in projects}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                frames, seconds, outputs = future.result()
+            except Exception as e:
+                failures.append(path)
+                print(f"FAIL  {path}: {e}")
+                continue
+            total_frames += frames
+            print(f"ok    {path}: {frames} frames in {seconds * 1000:.0f} ms "
+                  f"({frames / max(seconds, 1e-9):.0f} frames/s) -> {len(outputs)} file(s)")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(projects) - len(failures)}/{len(projects)} projects, {total_frames} frames "
+          f"in {elapsed:.2f} s ({total_frames / max(elapsed, 1e-9):.0f} frames/s), "
+          f"{len(failures)} failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
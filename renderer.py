@@ -0,0 +1,195 @@
+# renderer.py
+import tkinter as tk
+import weakref
+from document import _union_rect
+from settings import EMPTY_COLOR, GRID_MIN_ZOOM, ZOOM_CACHE_PIXELS, ZOOM_LEVELS
+from tracing import tracer
+
+GRID_COLOR = "#bbbbbb"
+
+def max_zoom(rows, cols):
+    """The largest pixel size whose frame image fits in ZOOM_CACHE_PIXELS."""
+    return max(1, int((ZOOM_CACHE_PIXELS / max(rows * cols, 1)) ** 0.5))
+
+def zoom_step(pixel_size, steps):
+    """The ZOOM_LEVELS entry `steps` levels above (or below, if negative) pixel_size."""
+    if steps > 0:
+        larger = [z for z in ZOOM_LEVELS if z > pixel_size]
+        return larger[min(steps, len(larger)) - 1] if larger else pixel_size
+    smaller = [z for z in ZOOM_LEVELS if z < pixel_size]
+    return smaller[max(steps, -len(smaller))] if smaller and steps else pixel_size
+
+class ZoomBudget:
+    """
+    The image pixels of every tab's renderer, held to one ZOOM_CACHE_PIXELS
+    limit. Over it, the least recently shown zoom levels of any tab are
+    dropped first. A level that a renderer has selected is never dropped
+    here; EditorTab releases hidden views when those alone are too many.
+    """
+    def __init__(self, limit_pixels=ZOOM_CACHE_PIXELS):
+        self.limit_pixels = limit_pixels
+        self.renderers = weakref.WeakSet()
+        self._clock = 0
+
+    def tick(self):
+        self._clock += 1
+        return self._clock
+
+    def used_pixels(self):
+        return sum(renderer.cached_pixels() for renderer in self.renderers)
+
+    def over_limit(self):
+        return self.used_pixels() > self.limit_pixels
+
+    def evict(self):
+        used = self.used_pixels()
+        if used <= self.limit_pixels: return
+        spare = [(entry[3], renderer, ps) for renderer in self.renderers
+                 for ps, entry in renderer.levels.items() if ps != renderer.pixel_size]
+        for _, renderer, ps in sorted(spare, key=lambda item: item[0]):
+            if used <= self.limit_pixels: break
+            used -= renderer.level_pixels(ps)
+            del renderer.levels[ps]
+
+# The budget shared by the renderers of all tabs
+zoom_budget = ZoomBudget()
+
+class RasterRenderer:
+    """
+    Draws a frame onto a canvas as a single PhotoImage.
+
+    `base` holds the frame at one image pixel per grid cell. `image` is the
+    on-screen copy, scaled up by `pixel_size` with Tk's native zoom. The canvas
+    only ever holds a handful of items (frame, grid, floating layer, selection
+    box), no matter how large the grid is.
+
+    Every zoom level shown is kept in `levels`, within the ZOOM_CACHE_PIXELS
+    shared by all tabs (zoom_budget). Paints go to `base` and the current level;
+    the other levels only collect a stale rectangle, which is re-zoomed from
+    `base` when they are shown again. At pixel size 1, `image` is `base`.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.pixel_size = 1
+        self.size = None          # (rows, cols) the images were built for
+        self.base = None
+        self.image = None
+        self.levels = {} # pixel_size -> [image, stale rect or None, grid image or None, last shown]
+        self.float_image = None
+        zoom_budget.renderers.add(self)
+
+    # --- FRAME IMAGE ---
+    def rebuild(self, pixels, pixel_size):
+        """
+        (Re)creates the frame image item and repaints every pixel.
+        The PhotoImages themselves are reused unless the frame size changed.
+        """
+        size = (pixels.rows, pixels.cols)
+        if size != self.size:
+            self.size = size
+            self.base = tk.PhotoImage(master=self.canvas, width=pixels.cols, height=pixels.rows)
+            self.levels.clear()
+        self._select_level(pixel_size, refresh=False)
+        if pixels.rows and pixels.cols:
+            self.paint_region(pixels, 0, 0, pixels.rows - 1, pixels.cols - 1)
+        self.canvas.create_image(0, 0, image=self.image, anchor=tk.NW, tags="frame")
+
+    def set_zoom(self, pixel_size):
+        """Shows the frame at another pixel size, re-zooming only the level's stale cells."""
+        self._select_level(pixel_size)
+        self.canvas.itemconfig("frame", image=self.image)
+
+    def _select_level(self, pixel_size, refresh=True):
+        self.pixel_size = pixel_size
+        if pixel_size == 1:
+            self.image = self.base
+            return
+        rows, cols = self.size
+        entry = self.levels.get(pixel_size)
+        if entry is None:
+            image = tk.PhotoImage(master=self.canvas, width=cols * pixel_size, height=rows * pixel_size)
+            entry = self.levels[pixel_size] = [image, (0, 0, rows - 1, cols - 1) if rows and cols else None, None, 0]
+        entry[3] = zoom_budget.tick()
+        self.image = entry[0]
+        if entry[1] and refresh:
+            self._zoom_copy(*entry[1])
+        entry[1] = None
+        zoom_budget.evict()
+
+    def level_pixels(self, pixel_size):
+        """Image pixels of a cached level, with its grid image."""
+        rows, cols = self.size
+        return rows * cols * pixel_size * pixel_size * (2 if self.levels[pixel_size][2] else 1)
+
+    def cached_pixels(self):
+        """Image pixels of `base` and every cached level."""
+        if self.size is None: return 0
+        rows, cols = self.size
+        return rows * cols + sum(self.level_pixels(ps) for ps in self.levels)
+
+    def _mark_stale(self, r1, c1, r2, c2):
+        """Records a repainted rectangle in every cached level except the one on screen."""
+        for ps, entry in self.levels.items():
+            if ps != self.pixel_size:
+                entry[1] = _union_rect(entry[1], r1, c1, r2, c2)
+
+    def paint_region(self, pixels, r1, c1, r2, c2):
+        """Repaints the inclusive rectangle (r1, c1)-(r2, c2) from the buffer."""
+        colors = pixels.colors
+        data = pixels.data
+        cols = pixels.cols
+        rows_data = []
+        for r in range(r1, r2 + 1):
+            start = r * cols
+            rows_data.append("{" + " ".join([colors[i] for i in data[start + c1:start + c2 + 1]]) + "}")
+        self.base.put(" ".join(rows_data), to=(c1, r1))
+        if self.image is not self.base:
+            self._zoom_copy(r1, c1, r2, c2)
+        self._mark_stale(r1, c1, r2, c2)
+        if tracer.enabled: tracer.count_ops(2)
+
+    def paint_cell(self, r, c, color):
+        """Paints one cell directly (used for single pixels and tool previews)."""
+        ps = self.pixel_size
+        self.base.put(color, to=(c, r, c + 1, r + 1))
+        if self.image is not self.base:
+            self.image.put(color, to=(c * ps, r * ps, (c + 1) * ps, (r + 1) * ps))
+        self._mark_stale(r, c, r, c)
+        if tracer.enabled: tracer.count_ops(2)
+
+    def _zoom_copy(self, r1, c1, r2, c2):
+        """Copies a region of `base` into `image`, scaled up by pixel_size."""
+        ps = self.pixel_size
+        self.canvas.tk.call(str(self.image), "copy", str(self.base),
+                            "-from", c1, r1, c2 + 1, r2 + 1,
+                            "-to", c1 * ps, r1 * ps,
+                            "-zoom", ps, ps)
+
+    # --- OVERLAYS ---
+    def draw_grid(self):
+        """Adds the grid lines as one transparent overlay image (cached with the zoom level)."""
+        rows, cols = self.size
+        ps = self.pixel_size
+        if ps < GRID_MIN_ZOOM: return # The lines would hide the pixels
+        entry = self.levels[ps]
+        if entry[2] is None:
+            width, height = cols * ps + 1, rows * ps + 1
+            entry[2] = grid_image = tk.PhotoImage(master=self.canvas, width=width, height=height)
+            for c in range(cols + 1):
+                grid_image.put(GRID_COLOR, to=(c * ps, 0, c * ps + 1, height))
+            for r in range(rows + 1):
+                grid_image.put(GRID_COLOR, to=(0, r * ps, width, r * ps + 1))
+            zoom_budget.evict()
+        self.canvas.create_image(0, 0, image=entry[2], anchor=tk.NW, tags="grid")
+
+    def draw_floating(self, floating_pixels, offset):
+        """Draws the floating selection layer as one image tagged "floating"."""
+        ps = self.pixel_size
+        h = max(k[0] for k in floating_pixels) + 1
+        w = max(k[1] for k in floating_pixels) + 1
+        self.float_image = tk.PhotoImage(master=self.canvas, width=w * ps, height=h * ps)
+        for (lr, lc), color in floating_pixels.items():
+            if color == EMPTY_COLOR: continue
+            self.float_image.put(color, to=(lc * ps, lr * ps, (lc + 1) * ps, (lr + 1) * ps))
+        fr, fc = offset
+        self.canvas.create_image(fc * ps, fr * ps, image=self.float_image, anchor=tk.NW, tags="floating")
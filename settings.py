@@ -4,4 +4,26 @@ DEFAULT_ROWS = 52
 DEFAULT_COLS = 96
 DEFAULT_PIXEL_SIZE = 14
 EMPTY_COLOR = "#FFFFFF"
-PALETTE_FILE = "my_palettes.json"
\ No newline at end of file
+PALETTE_FILE = "my_palettes.json"
+HISTORY_BUDGET_BYTES = 64 * 1024 * 1024 # Undo memory shared by all tabs
+PREVIEW_REFRESH_MS = 16 # Max one preview sync per display refresh (~60 Hz)
+PREVIEW_SPEED_MS = 200 # Default preview frame time (also the exported GIF frame delay)
+PREVIEW_CACHE_PIXELS = 64 * 1024 * 1024 # Image pixels of pre-rendered preview frames (least recently shown dropped first)
+ONION_ALPHA = 0.5 # Strength of the nearest onion-skin frame in the preview (1 = full color)
+ONION_RANGE = 2 # Default frames before/after the current one in the "Range" onion mode
+LOAD_WORKERS = None # Worker processes for loading frames (None = one per CPU)
+LOAD_POLL_MS = 15 # How often the UI checks for loaded frames
+LOAD_ATTACH_MS = 10 # Max UI time per poll spent attaching loaded frames as tabs
+MAX_LIVE_TABS = 8 # Hidden frames that keep their canvas before it is released
+RECOVERY_DIR = None # Root of the crash-recovery folders (None = per-user state folder, see journal.recovery_root)
+RECOVERY_HEARTBEAT_MS = 2000 # How often a running session marks its recovery folder as alive
+RECOVERY_STALE_MS = 15 * 1000 # A recovery folder without a heartbeat for this long was left by a crash
+JOURNAL_FLUSH_MS = 500 # How often changed cells are handed to the journal thread
+JOURNAL_CHECKPOINT_MS = 60 * 1000 # How often the journal is folded into a fresh snapshot
+JOURNAL_MERGE_SLACK = 64 # Unchanged cells a journal rectangle may include to absorb a neighbouring change
+JOURNAL_MAX_RECTS = 256 # Journal rectangles per frame and tick before they collapse into one
+TRACE_CAPACITY = 4096 # Spans/latencies kept by the latency tracer (F3 HUD)
+HUD_REFRESH_MS = 250 # How often the latency HUD is redrawn
+ZOOM_LEVELS = (1, 2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64) # Screen pixels per cell for Ctrl+wheel
+ZOOM_CACHE_PIXELS = 48 * 1024 * 1024 # Image pixels of cached zoom levels, shared by all tabs (also caps the zoom)
+GRID_MIN_ZOOM = 3 # Grid lines are hidden below this many screen pixels per cell
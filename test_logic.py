@@ -144,15 +144,10 @@ class TestPixelLogic(unittest.TestCase):
         # Should be (Row 2 to 5, Col 2 to 5)
         self.assertEqual(bounds, (2, 2, 5, 5))
 
-if __name__ == '__main__':
-    print("Running Combined Logic Tests...")
-    unittest.main()
-
-    # ... (Previous code above) ...
-
 # Import the actual algorithms to test them
-from algorithms import get_connected_pixels, get_line_pixels
-from history import HistoryManager
+from algorithms import get_connected_pixels, get_line_pixels, flood_fill
+from history import HistoryManager, HistoryBudget
+from pixel_buffer import PixelBuffer
 
 class TestAlgorithmsAndHistory(unittest.TestCase):
     
@@ -182,6 +177,33 @@ class TestAlgorithmsAndHistory(unittest.TestCase):
         result_blue = get_connected_pixels(grid, 2, 2)
         self.assertEqual(len(result_blue), 6)
 
+    def test_flood_fill_options(self):
+        """Scanline fill: bounds, 8-connectivity, tolerance and global mode."""
+        R = "#FF0000"
+        N = "#FA0505" # Near-red
+        B = "#0000FF"
+        grid = [
+            [R, B, R],
+            [B, R, B],
+            [N, B, R]
+        ]
+        pixels, bounds = flood_fill(grid, 0, 0)
+        self.assertEqual(pixels, [(0, 0)])
+        self.assertEqual(bounds, (0, 0, 0, 0))
+
+        # Diagonals connect in 8-way mode
+        pixels, bounds = flood_fill(grid, 0, 0, connectivity=8)
+        self.assertEqual(sorted(pixels), [(0, 0), (0, 2), (1, 1), (2, 2)])
+        self.assertEqual(bounds, (0, 0, 2, 2))
+
+        # Tolerance lets the near-red join too
+        pixels, _ = flood_fill(grid, 0, 0, connectivity=8, tolerance=10)
+        self.assertIn((2, 0), pixels)
+
+        # Global mode ignores connectivity entirely
+        pixels, _ = flood_fill(grid, 0, 1, contiguous=False)
+        self.assertEqual(len(pixels), 4)
+
     # --- TEST 7: LINE ALGORITHM ---
     def test_bresenham_line(self):
         """Test that line generation includes start and end points."""
@@ -202,26 +224,1054 @@ class TestAlgorithmsAndHistory(unittest.TestCase):
     # --- TEST 8: HISTORY (UNDO/REDO) ---
     def test_history_manager(self):
         """Test pushing states, undoing, and redoing."""
-        hist = HistoryManager(max_depth=5)
-        
-        # State 1: Blank Grid
-        grid_state_1 = [["#000"]]
-        hist.push_state(grid_state_1)
+        hist = HistoryManager(max_depth=5, budget=HistoryBudget())
+        grid = PixelBuffer(4, 4)
         
-        # State 2: Painted
-        grid_state_2 = [["#FFF"]]
+        # Edit: paint two pixels after saving state
+        hist.push_state(grid)
+        grid.set(1, 1, "#000000")
+        grid.set(2, 3, "#000000")
         
         # UNDO Check
-        # Undo should return State 1
-        prev = hist.undo(grid_state_2) 
-        self.assertEqual(prev, grid_state_1)
+        # Undo reverts in place and reports the changed region
+        buf, region = hist.undo(grid)
+        self.assertIs(buf, grid)
+        self.assertEqual(region, (1, 1, 2, 3))
+        self.assertEqual(grid.get(1, 1), EMPTY_COLOR)
+        self.assertEqual(grid.get(2, 3), EMPTY_COLOR)
         
         # REDO Check
-        # Redo should return State 2
-        # Note: We pass the 'current' state (State 1) to redo
-        next_state = hist.redo(grid_state_1)
-        self.assertEqual(next_state, grid_state_2)
+        hist.redo(grid)
+        self.assertEqual(grid.get(1, 1), "#000000")
+        self.assertEqual(grid.get(2, 3), "#000000")
+        self.assertIsNone(hist.redo(grid))
+
+    def test_history_stores_only_changes(self):
+        """Edits cost memory proportional to the cells changed, not the grid."""
+        hist = HistoryManager(budget=HistoryBudget())
+        grid = PixelBuffer(256, 256)
+        hist.push_state(grid)
+        grid.set(10, 10, "#FF0000")
+        hist.push_state(grid) # Closes the edit
+        self.assertLess(hist.budget.used_bytes, 1024)
+
+        # An empty edit (nothing changed) is not recorded
+        self.assertEqual(len(hist.history), 1)
+
+    def test_history_budget_evicts_oldest_across_tabs(self):
+        """The shared byte budget drops the globally oldest edits first."""
+        budget = HistoryBudget(limit_bytes=1000)
+        hist_a = HistoryManager(budget=budget)
+        hist_b = HistoryManager(budget=budget)
+        grid_a, grid_b = PixelBuffer(20, 20), PixelBuffer(20, 20)
+        for i in range(5):
+            for hist, grid in ((hist_a, grid_a), (hist_b, grid_b)):
+                hist.push_state(grid)
+                grid.fill_pixels([(i, c) for c in range(20)], "#000000")
+        hist_a.undo(grid_a)
+        hist_b.undo(grid_b)
+        self.assertLessEqual(budget.used_bytes, budget.limit_bytes)
+        self.assertLess(len(hist_a.history) + len(hist_b.history), 8)
+        # The newest edit of each tab always survives
+        self.assertEqual(grid_a.get(4, 0), EMPTY_COLOR)
+        self.assertEqual(grid_b.get(4, 0), EMPTY_COLOR)
+
+
+class TestPixelBuffer(unittest.TestCase):
+
+    # --- TEST 9: PALETTE-INDEXED FRAME STORAGE ---
+    def test_grid_round_trip(self):
+        """A grid survives conversion to a PixelBuffer and back."""
+        R = "#FF0000"
+        grid = [[R, EMPTY_COLOR], [EMPTY_COLOR, "#0000FF"]]
+        buf = PixelBuffer.from_grid(grid)
+        self.assertEqual(buf.to_grid(), grid)
+        self.assertEqual(buf.used_colors(), {R, "#0000FF"})
+        self.assertEqual(buf.nbytes, 4) # 1 byte per pixel
+
+    def test_copy_and_resize(self):
+        """Copies are independent and resizing keeps the top-left corner."""
+        buf = PixelBuffer(3, 3)
+        buf.set(0, 0, "#000000")
+        clone = buf.copy()
+        self.assertFalse(buf.set(0, 0, "#000000")) # No change
+        self.assertTrue(clone.set(0, 0, EMPTY_COLOR))
+        self.assertEqual(buf.get(0, 0), "#000000")
+
+        small = buf.resized(2, 5)
+        self.assertEqual((small.rows, small.cols), (2, 5))
+        self.assertEqual(small.get(0, 0), "#000000")
+        self.assertEqual(small.get(1, 4), EMPTY_COLOR)
+
+    def test_widens_past_256_colors(self):
+        """More than 256 colors switches the index array to 2 bytes per pixel."""
+        buf = PixelBuffer(1, 300)
+        for c in range(300):
+            buf.set(0, c, f"#{c:06X}")
+        self.assertEqual(buf.data.itemsize, 2)
+        self.assertEqual(buf.get(0, 299), "#00012B")
+
+    def test_blit_region_remaps_colors(self):
+        """Copying a region between buffers with different color tables keeps the colors."""
+        src = PixelBuffer(2, 3)
+        src.set(0, 1, "#00FF00")
+        src.set(1, 2, "#0000FF")
+        dest = PixelBuffer(2, 3)
+        dest.set(0, 0, "#FF0000") # Index 1 means red here, green in src
+        dest.blit_from(src, 0, 1, 1, 2)
+        self.assertEqual(dest.to_grid(), [["#FF0000", "#00FF00", EMPTY_COLOR],
+                                          [EMPTY_COLOR, EMPTY_COLOR, "#0000FF"]])
+
+
+from region_index import RegionIndex
+
+class TestRegionIndex(unittest.TestCase):
+
+    # --- TEST 10: CONNECTED-REGION LABEL CACHE ---
+    def test_cached_regions_match_flood_fill(self):
+        """Cached answers agree with flood_fill, before and after an edit."""
+        buf = PixelBuffer(6, 6)
+        buf.fill_pixels([(r, 3) for r in range(6)], "#000000") # Vertical wall
+        index = RegionIndex()
+
+        pixels, bounds = index.region_at(buf, 0, 0)
+        self.assertEqual(sorted(pixels), sorted(flood_fill(buf, 0, 0)[0]))
+        self.assertEqual(bounds, (0, 0, 5, 2))
+        self.assertEqual(len(index.regions), 1)
+
+        # Same region again is served from the cache
+        index.region_at(buf, 5, 2)
+        self.assertEqual(len(index.regions), 1)
+
+        # Punch a hole in the wall: the two sides merge
+        buf.set(2, 3, EMPTY_COLOR)
+        index.invalidate(2, 3, 2, 3)
+        pixels, bounds = index.region_at(buf, 0, 0)
+        self.assertEqual(len(pixels), 31)
+        self.assertEqual(bounds, (0, 0, 5, 5))
+
+
+import tempfile
+from project_format import (ProjectReader, decode_frame, encode_frame, write_project,
+                            plan_folder_save, apply_renames, parse_frame_text)
+
+class TestProjectFormat(unittest.TestCase):
+
+    # --- TEST 11: BINARY PROJECT CONTAINER ---
+    def test_frame_blob_round_trip(self):
+        buf = PixelBuffer(4, 100)
+        for c in range(100):
+            buf.set(c % 4, c, f"#0000{c:02X}")
+        buf.set(0, 0, "#ABCDEF")
+        copy = decode_frame(encode_frame(buf), 4, 100)
+        self.assertEqual(copy.to_grid(), buf.to_grid())
+
+    def test_project_file_round_trip(self):
+        """Frames can be PixelBuffers or raw blobs and are read back lazily."""
+        a = PixelBuffer(3, 5)
+        a.set(1, 2, "#FF0000")
+        b = PixelBuffer(3, 5, fill="#00FF00")
+        meta = {"rows": 3, "cols": 5, "pixel_size": 12, "palette": ["#FF0000"]}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "anim.pxp")
+            write_project(path, meta, [a, encode_frame(b)])
+            self.assertFalse(os.path.exists(path + ".tmp"))
+
+            reader = ProjectReader(path)
+            try:
+                self.assertEqual(len(reader), 2)
+                self.assertEqual((reader.rows, reader.cols, reader.pixel_size), (3, 5, 12))
+                self.assertEqual(reader.meta["palette"], ["#FF0000"])
+                lazy = reader.lazy_frame(1)
+                self.assertEqual(lazy.load().to_grid(), b.to_grid())
+                self.assertEqual(reader.read_frame(0).to_grid(), a.to_grid())
+            finally:
+                reader.close()
+
+    # --- TEST 12: INCREMENTAL FOLDER SAVE ---
+    def test_content_hash_ignores_color_table_order(self):
+        a = PixelBuffer(2, 2)
+        a.set(0, 0, "#FF0000")
+        a.set(1, 1, "#00FF00")
+        b = PixelBuffer(2, 2)
+        b.set(1, 1, "#00FF00")
+        b.set(0, 0, "#FF0000")
+        self.assertEqual(a.content_hash(), b.content_hash())
+        b.set(0, 1, "#FF0000")
+        self.assertNotEqual(a.content_hash(), b.content_hash())
+
+    def test_folder_save_plan(self):
+        """Unchanged frames are skipped, reordered ones renamed, removed ones deleted."""
+        saved = {"frame_1.txt": "A", "frame_2.txt": "B", "frame_3.txt": "C", "frame_4.txt": None}
+        frames = [("frame_1.txt", "A"), ("frame_2.txt", "C"), ("frame_3.txt", "B"), ("frame_4.txt", "D")]
+        renames, writes, deletes = plan_folder_save(saved, frames)
+        self.assertEqual(sorted(renames), [("frame_2.txt", "frame_3.txt"), ("frame_3.txt", "frame_2.txt")])
+        self.assertEqual(writes, [3])
+        self.assertEqual(deletes, [])
+
+        renames, writes, deletes = plan_folder_save(saved, frames[:1])
+        self.assertEqual((renames, writes), ([], []))
+        self.assertEqual(sorted(deletes), ["frame_2.txt", "frame_3.txt", "frame_4.txt"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ("frame_1.txt", "frame_2.txt"):
+                with open(os.path.join(tmp, name), "w") as f: f.write(name)
+            apply_renames(tmp, [("frame_1.txt", "frame_2.txt"), ("frame_2.txt", "frame_1.txt")])
+            with open(os.path.join(tmp, "frame_1.txt")) as f:
+                self.assertEqual(f.read(), "frame_2.txt")
+            self.assertEqual(sorted(os.listdir(tmp)), ["frame_1.txt", "frame_2.txt"])
+
+    # --- TEST 13: FRAME FILE PARSING ---
+    def test_parse_frame_text(self):
+        """Parses the frame_N.txt format, clipping to the project size."""
+        content = ("palette = {\n    '.': 'Transparent',\n    'A': '#000000',\n    'B': '#FF0000',\n}\n\n"
+                   'my_pixel_art = """\nA.B\n.AX\nBBBB\nAAA\n"""')
+        buf = parse_frame_text(content, 3, 3)
+        self.assertEqual(buf.to_grid(), [["#000000", EMPTY_COLOR, "#FF0000"],
+                                         [EMPTY_COLOR, "#000000", EMPTY_COLOR],
+                                         ["#FF0000", "#FF0000", "#FF0000"]])
+        self.assertEqual(parse_frame_text("garbage", 2, 2).to_grid(), PixelBuffer(2, 2).to_grid())
+
+
+import time
+from document import Document, recovery_frames
+from project_format import FrameBlob, LoadedFrame, encode_frame
+from journal import (RecoveryJournal, has_recovery, recover, recovery_label, session_folder,
+                     stale_recoveries)
+
+class TestRecoveryJournal(unittest.TestCase):
+
+    # --- TEST 14: CRASH-RECOVERY JOURNAL ---
+    def test_crop_and_paste(self):
+        buf = PixelBuffer(4, 4)
+        buf.set(1, 1, "#FF0000")
+        part = buf.crop(1, 1, 2, 3)
+        self.assertEqual((part.rows, part.cols), (2, 3))
+        self.assertEqual(part.get(0, 0), "#FF0000")
+        dest = PixelBuffer(4, 4, fill="#000000")
+        dest.paste(part, 3, -1) # Clipped on the left and bottom
+        self.assertEqual(dest.row(2), ["#000000"] * 4)
+        self.assertEqual(dest.row(3), [EMPTY_COLOR, EMPTY_COLOR, "#000000", "#000000"])
+
+    def test_snapshot_plus_journal_replay(self):
+        """Recovery = last snapshot + deltas in order; a torn last record is ignored."""
+        frame = PixelBuffer(3, 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = RecoveryJournal(tmp)
+            journal.checkpoint({"rows": 3, "cols": 3, "pixel_size": 10}, [frame.copy(), frame.copy()])
+            frame.set(1, 1, "#FF0000")
+            journal.record(1, 1, 1, frame.crop(1, 1, 1, 1))
+            frame.fill_pixels([(0, 0), (0, 1)], "#00FF00")
+            journal.record(1, 0, 0, frame.crop(0, 0, 1, 1))
+            journal.close()
+            with open(os.path.join(tmp, "journal.bin"), "ab") as f: f.write(b"\x10\x00")
+
+            self.assertTrue(has_recovery(tmp))
+            meta, frames = recover(tmp)
+            self.assertEqual(meta["pixel_size"], 10)
+            self.assertEqual(frames[0].to_grid(), PixelBuffer(3, 3).to_grid())
+            self.assertEqual(frames[1].to_grid(), frame.to_grid())
+
+            RecoveryJournal(tmp).close(discard=True)
+            self.assertFalse(has_recovery(tmp))
+
+    def test_snapshot_frames_are_not_encoded_on_the_ui_thread(self):
+        """Decoded frames go to the journal as buffer copies; stored blobs as-is."""
+        buf = PixelBuffer(2, 2)
+        buf.set(0, 0, "#FF0000")
+        doc = Document(rows=2, cols=2)
+        loaded = doc.add_frame(LoadedFrame(buf))
+        stored = doc.add_frame(FrameBlob(encode_frame(buf), 2, 2))
+        hidden = doc.add_frame(LoadedFrame(buf))
+        hidden.layers[0].visible = False
+        entries = recovery_frames(doc.frames)
+        self.assertIsInstance(entries[0], PixelBuffer)
+        self.assertIsNot(entries[0], buf)
+        self.assertIsNotNone(loaded.pixel_source)
+        self.assertIsInstance(entries[1], bytes)
+        self.assertIsNotNone(stored.pixel_source)
+        self.assertEqual(entries[2].get(0, 0), EMPTY_COLOR)
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = RecoveryJournal(tmp)
+            journal.checkpoint({"rows": 2, "cols": 2, "pixel_size": 10}, entries)
+            journal.close()
+            frames = recover(tmp)[1]
+            self.assertEqual([f.get(0, 0) for f in frames], ["#FF0000", "#FF0000", EMPTY_COLOR])
+
+    def test_far_apart_edits_are_journaled_separately(self):
+        doc = Document(rows=64, cols=64)
+        frame = doc.add_frame()
+        frame.take_journal_dirty()
+        frame.paint_pixel(0, 0, "#FF0000")
+        frame.paint_pixel(63, 63, "#FF0000")
+        frame.paint_pixel(0, 1, "#FF0000")
+        self.assertEqual(sorted(frame.take_journal_dirty()), [(0, 0, 0, 1), (63, 63, 63, 63)])
+        self.assertEqual(frame.take_journal_dirty(), [])
+
+    def test_recovery_folder_per_project_and_session(self):
+        root = os.path.join("state", "recovery")
+        a = session_folder(root, os.path.join("a", "walk.pxp"), "1")
+        self.assertEqual(recovery_label(a), "walk.pxp")
+        self.assertNotEqual(a, session_folder(root, os.path.join("b", "walk.pxp"), "1"))
+        self.assertNotEqual(a, session_folder(root, os.path.join("a", "walk.pxp"), "2"))
+        self.assertEqual(recovery_label(session_folder(root, None, "1")), "untitled")
+
+    def test_only_sessions_without_heartbeat_are_stale(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            running = RecoveryJournal(os.path.join(tmp, "running.1"))
+            crashed = RecoveryJournal(os.path.join(tmp, "crashed.2"))
+            for journal in (running, crashed):
+                journal.checkpoint({"rows": 1, "cols": 1, "pixel_size": 10}, [PixelBuffer(1, 1)])
+                journal.close()
+            old = time.time() - 60
+            os.utime(crashed.alive_path, (old, old))
+            self.assertEqual(stale_recoveries(tmp, stale_ms=15000), [crashed.folder])
+
+
+import subprocess
+import sys
+from tools.brush import BrushTool
+from tools.bucket import BucketTool
+from tools.line import LineTool
+from tools.select import SelectTool
+from tools.shape import EllipseTool, RectangleTool
+
+class TestHeadlessDocument(unittest.TestCase):
+
+    # --- TEST 15: DOCUMENT CORE WITHOUT TKINTER ---
+    def test_core_does_not_import_tkinter(self):
+        code = ("import sys, document, tools.brush, tools.bucket, tools.wand, tools.select, tools.line, tools.shape; "
+                "sys.exit('tkinter' in sys.modules)")
+        self.assertEqual(subprocess.call([sys.executable, "-c", code],
+                                         cwd=os.path.dirname(os.path.abspath(__file__))), 0)
+
+    def test_tools_edit_and_undo_headless(self):
+        doc = Document(rows=5, cols=5)
+        frame = doc.add_frame()
+        doc.active_color = "#FF0000"
+        brush = BrushTool(doc)
+        brush.on_click(frame, 0, 0)
+        brush.on_drag(frame, 0, 4)
+        brush.on_release(frame)
+        self.assertEqual(frame.pixels.row(0), ["#FF0000"] * 5)
+
+        doc.active_color = "#0000FF"
+        BucketTool(doc).on_click(frame, 3, 3)
+        self.assertEqual(frame.pixels.get(4, 4), "#0000FF")
+        self.assertEqual(frame.preview_dirty, (0, 0, 4, 4))
+
+        frame.perform_undo()
+        self.assertEqual(frame.pixels.get(4, 4), EMPTY_COLOR)
+        self.assertEqual(frame.pixels.get(0, 2), "#FF0000")
+
+    def test_line_and_shapes_headless(self):
+        doc = Document(rows=5, cols=5)
+        doc.active_color = "#FF0000"
+        line, rect, ellipse = LineTool(doc), RectangleTool(doc), EllipseTool(doc)
+        frame = doc.add_frame()
+        line.on_click(frame, 0, 0)
+        line.on_drag(frame, 2, 2)
+        line.on_release(frame, 4, 4)
+        self.assertEqual([frame.pixels.get(i, i) for i in range(5)], ["#FF0000"] * 5)
+
+        frame = doc.add_frame()
+        rect.on_click(frame, 1, 1)
+        rect.on_drag(frame, 3, 3)
+        rect.on_release(frame) # No release cell: ends where the preview did
+        self.assertEqual(frame.pixels.row(1)[1:4], ["#FF0000"] * 3)
+        self.assertEqual(frame.pixels.get(2, 2), EMPTY_COLOR)
+
+        frame = doc.add_frame()
+        ellipse.on_click(frame, 0, 0)
+        ellipse.on_release(frame, 4, 4)
+        self.assertEqual(frame.pixels.get(0, 2), "#FF0000")
+        self.assertEqual(frame.pixels.get(0, 0), EMPTY_COLOR)
+        frame.perform_undo()
+        self.assertEqual(frame.pixels.get(0, 2), EMPTY_COLOR)
+
+    def test_bucket_on_active_color_fills_near_matches(self):
+        doc = Document(rows=1, cols=3)
+        frame = doc.add_frame()
+        frame.pixels.fill_pixels([(0, 0), (0, 2)], "#FF0000")
+        frame.pixels.set(0, 1, "#FA0000")
+        doc.active_color = "#FF0000"
+        doc.fill_tolerance = 10
+        BucketTool(doc).on_click(frame, 0, 0)
+        self.assertEqual(frame.pixels.row(0), ["#FF0000"] * 3)
+
+        frame.pixels.set(0, 1, EMPTY_COLOR)
+        frame.pixels.set(0, 2, "#FA0000")
+        doc.fill_contiguous = False
+        BucketTool(doc).on_click(frame, 0, 0) # Global: the unconnected near match too
+        self.assertEqual(frame.pixels.get(0, 2), "#FF0000")
+
+    def test_selection_move_headless(self):
+        doc = Document(rows=4, cols=4)
+        frame = doc.add_frame()
+        frame.pixels.set(0, 0, "#00FF00")
+        select = SelectTool(doc)
+        select.on_click(frame, 0, 0)
+        select.on_drag(frame, 1, 1)
+        select.on_release(frame)
+        frame.move_selection_by_offset(2, 2)
+        frame.commit_selection()
+        self.assertEqual(frame.pixels.get(2, 2), "#00FF00")
+        self.assertEqual(frame.pixels.get(0, 0), EMPTY_COLOR)
+
+    def test_save_and_load_round_trip(self):
+        doc = Document(rows=3, cols=4, pixel_size=9)
+        doc.add_frame().pixels.set(1, 2, "#123456")
+        doc.add_frame()
+        with tempfile.TemporaryDirectory() as tmp:
+            for path in (os.path.join(tmp, "anim.pxp"), os.path.join(tmp, "anim")):
+                doc.save(path)
+                loaded = Document.load(path)
+                self.assertEqual((loaded.rows, loaded.cols, loaded.pixel_size), (3, 4, 9))
+                self.assertEqual([f.pixels.to_grid() for f in loaded.frames],
+                                 [f.pixels.to_grid() for f in doc.frames])
+                loaded.close()
+
+
+import contextlib
+import io
+import struct
+import zlib
+from image_export import read_png, write_png, write_gif, sprite_sheet, _lzw_encode
+import render_cli
+
+class TestBatchRender(unittest.TestCase):
+
+    # --- TEST 16: IMAGE EXPORT + BATCH CLI ---
+    def test_png_pixels(self):
+        buf = PixelBuffer(2, 3)
+        buf.set(1, 2, "#FF0000")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "f.png")
+            write_png(path, buf, scale=2)
+            with open(path, "rb") as f: data = f.read()
+            loaded = read_png(path)
+        self.assertEqual(struct.unpack(">IIBB", data[16:26]), (6, 4, 8, 3)) # 8-bit indexed
+        self.assertEqual((loaded.rows, loaded.cols), (4, 6))
+        self.assertEqual(loaded.get(3, 5), "#FF0000")
+        self.assertEqual(loaded.get(3, 3), EMPTY_COLOR)
+
+    def test_sprite_sheet_layout(self):
+        a, b, c = PixelBuffer(2, 2), PixelBuffer(2, 2), PixelBuffer(2, 2, fill="#00FF00")
+        sheet = sprite_sheet([a, b, c])
+        self.assertEqual((sheet.rows, sheet.cols), (4, 4))
+        self.assertEqual(sheet.get(3, 1), "#00FF00")
+        self.assertEqual(sheet.get(3, 2), EMPTY_COLOR)
+
+    def test_gif_lzw_compresses_runs(self):
+        data = bytes(i % 3 for i in range(20000))
+        encoded = _lzw_encode(data, 2)
+        self.assertLess(len(encoded), len(data) // 10)
+
+    def test_cli_renders_projects(self):
+        doc = Document(rows=2, cols=2)
+        doc.add_frame().pixels.set(0, 0, "#000000")
+        doc.add_frame()
+        with tempfile.TemporaryDirectory() as tmp:
+            doc.save(os.path.join(tmp, "walk"))
+            doc.save(os.path.join(tmp, "run.pxp"))
+            out = os.path.join(tmp, "out")
+            with contextlib.redirect_stdout(io.StringIO()) as log:
+                code = render_cli.main([os.path.join(tmp, "*"), "--format", "gif", "--out", out, "--jobs", "1"])
+            self.assertEqual(code, 0, log.getvalue())
+            self.assertEqual(sorted(os.listdir(out)), ["run.gif", "walk.gif"])
+            with open(os.path.join(out, "walk.gif"), "rb") as f:
+                self.assertEqual(f.read(6), b"GIF89a")
+
+    def test_cli_names_outputs_of_same_named_projects_apart(self):
+        doc = Document(rows=2, cols=2)
+        doc.add_frame()
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, "a", "walk"), os.path.join(tmp, "b", "walk"), os.path.join(tmp, "a", "walk.pxp")]
+            for path in paths:
+                doc.save(path)
+            self.assertEqual(sorted(render_cli.output_names(paths).values()), ["a_walk", "b_walk", "walk_pxp"])
+            out = os.path.join(tmp, "out")
+            with contextlib.redirect_stdout(io.StringIO()) as log:
+                code = render_cli.main(paths + ["--format", "gif", "--out", out, "--jobs", "1"])
+            self.assertEqual(code, 0, log.getvalue())
+            self.assertEqual(sorted(os.listdir(out)), ["a_walk.gif", "b_walk.gif", "walk_pxp.gif"])
+
+
+import random
+from unittest import mock
+from image_export import _png_chunk, PNG_SIGNATURE
+
+class TestPngCodec(unittest.TestCase):
+
+    # --- TEST 17: STREAMING PNG EXPORT / IMPORT ---
+    def test_round_trips(self):
+        small = PixelBuffer(3, 4)
+        small.set(0, 0, "#123456")
+        small.set(2, 3, "#ABCDEF")
+        many = PixelBuffer(20, 20) # > 256 colors: written as RGB
+        for i in range(300):
+            many.set(i // 20, i % 20, "#%06X" % (i * 40000))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "f.png")
+            for buf in (small, many):
+                for transparent in (False, True):
+                    write_png(path, buf, transparent=transparent)
+                    self.assertEqual(read_png(path).to_grid(), buf.to_grid())
+
+    def test_streams_idat_chunks(self):
+        rng = random.Random(7)
+        buf = PixelBuffer(256, 256)
+        for i in range(256 * 256):
+            buf.set(i // 256, i % 256, "#%06X" % rng.randrange(200))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "big.png")
+            with mock.patch("image_export.PNG_IDAT_BYTES", 1024):
+                write_png(path, buf)
+            with open(path, "rb") as f: data = f.read()
+            self.assertEqual(read_png(path).to_grid(), buf.to_grid())
+            write_png(path, buf, scale=3)
+            scaled = read_png(path)
+        self.assertGreater(data.count(b"IDAT"), 2)
+        self.assertEqual((scaled.rows, scaled.cols), (768, 768))
+        self.assertEqual(scaled.get(3 * 5 + 2, 3 * 7), buf.get(5, 7))
+        self.assertEqual(scaled.downscaled(3).to_grid(), buf.to_grid())
+
+    def test_reads_filtered_rgba(self):
+        """Every filter type, decoded against a forward-filtered RGBA image."""
+        rows = [bytes((r * 40 + c * 7) % 256 for c in range(4 * 5)) for r in range(5)]
+        rows[4] = b"\x00\x00\x00\x00" * 5 # Fully transparent row
+        def paeth(a, b, c):
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            return a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+        raw, prev = b"", bytes(20)
+        for kind, line in enumerate(rows):
+            left = lambda i: line[i - 4] if i >= 4 else 0
+            upleft = lambda i: prev[i - 4] if i >= 4 else 0
+            pred = [0, left, lambda i: prev[i], lambda i: (left(i) + prev[i]) // 2,
+                    lambda i: paeth(left(i), prev[i], upleft(i))][kind]
+            raw += bytes([kind]) + bytes((line[i] - (pred(i) if kind else 0)) % 256 for i in range(20))
+            prev = line
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rgba.png")
+            with open(path, "wb") as f:
+                f.write(PNG_SIGNATURE + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 5, 5, 8, 6, 0, 0, 0))
+                        + _png_chunk(b"IDAT", zlib.compress(raw)) + _png_chunk(b"IEND", b""))
+            loaded = read_png(path)
+        for r in range(4):
+            for c in range(5):
+                px = rows[r][4 * c:4 * c + 4]
+                expected = EMPTY_COLOR if px[3] < 128 else "#" + px[:3].hex().upper()
+                self.assertEqual(loaded.get(r, c), expected)
+        self.assertEqual(loaded.row(4), [EMPTY_COLOR] * 5)
+
+
+def _gif_frames(data):
+    """Returns (disposal, delay, (x, y, w, h)) for every image in a GIF, skipping the pixel data."""
+    frames, pos, gce = [], 13 + 3 * (2 << (data[10] & 7)), None
+    while data[pos] != 0x3B:
+        if data[pos] == 0x21:
+            if data[pos + 1] == 0xF9:
+                gce = ((data[pos + 3] >> 2) & 7, struct.unpack_from("<H", data, pos + 4)[0])
+            pos += 2
+        else:
+            frames.append(gce + (struct.unpack_from("<HHHH", data, pos + 1),))
+            pos += 11
+        while data[pos]: pos += data[pos] + 1
+        pos += 1
+    return frames
+
+class TestGifDeltas(unittest.TestCase):
+
+    # --- TEST 18: GIF DELTA RECTANGLES ---
+    def _export(self, frames, **kwargs):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.gif")
+            write_gif(path, frames, delay_ms=100, **kwargs)
+            with open(path, "rb") as f: return _gif_frames(f.read())
+
+    def test_changed_rectangle_and_held_frames(self):
+        a = PixelBuffer(10, 10, fill="#000000")
+        b = a.copy()
+        b.set(2, 3, "#FF0000")
+        b.set(4, 6, "#FF0000")
+        frames = self._export([a, a, b, b, b], scale=2)
+        self.assertEqual(frames, [(1, 20, (0, 0, 20, 20)), (1, 30, (6, 4, 8, 6))])
+
+    def test_cleared_cells_restore_to_transparent(self):
+        a = PixelBuffer(10, 10)
+        a.set(1, 1, "#FF0000")
+        b = a.copy()
+        b.set(8, 8, "#00FF00")
+        c = b.copy()
+        c.set(1, 1, EMPTY_COLOR)
+        frames = self._export([a, b, c], transparent=True)
+        # b is widened over the cleared cell and disposed; c repaints that area
+        self.assertEqual(frames, [(1, 10, (0, 0, 10, 10)), (2, 10, (1, 1, 8, 8)), (1, 10, (1, 1, 8, 8))])
+        self.assertEqual(self._export([a, b, c])[2], (1, 10, (1, 1, 1, 1)))
+
+    def test_palette_ignores_erased_colors(self):
+        a = PixelBuffer(4, 4)
+        for i in range(300): # Every color is painted over, but stays in the color table
+            a.set(0, 0, f"#{i:06X}")
+        a.set(0, 0, "#FF0000")
+        self.assertGreater(len(a.colors), 256)
+        self.assertEqual(len(self._export([a, a.copy()])), 1)
+
+
+import json
+from image_export import pack_sprites, write_sprite_atlas
+
+class TestSpriteAtlas(unittest.TestCase):
+
+    # --- TEST 19: PACKED SPRITE SHEETS ---
+    def _frame(self, r1, c1, r2, c2, color):
+        buf = PixelBuffer(16, 16)
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                buf.set(r, c, color)
+        return buf
+
+    def test_content_bounds(self):
+        self.assertIsNone(PixelBuffer(4, 4).content_bounds())
+        self.assertEqual(self._frame(2, 5, 3, 9, "#000000").content_bounds(), (2, 5, 3, 9))
+
+    def test_trims_dedupes_and_packs(self):
+        a = self._frame(2, 3, 5, 9, "#FF0000")
+        b = self._frame(0, 0, 15, 1, "#00FF00")
+        frames = [a, a.copy(), b, PixelBuffer(16, 16), a]
+        sheet, entries = pack_sprites(frames, padding=0)
+        self.assertEqual([e.get("duplicate_of") for e in entries], [None, 0, None, None, 0])
+        self.assertEqual((entries[0]["w"], entries[0]["h"], entries[0]["offset_x"], entries[0]["offset_y"]),
+                         (7, 4, 3, 2))
+        self.assertEqual(entries[3]["w"] * entries[3]["h"], 0)
+        self.assertLessEqual(sheet.rows * sheet.cols, 16 * 9) # Smaller than two whole frames
+        for i, frame in enumerate(frames):
+            e = entries[i]
+            for r in range(e["h"]):
+                for c in range(e["w"]):
+                    self.assertEqual(sheet.get(e["y"] + r, e["x"] + c),
+                                     frame.get(e["offset_y"] + r, e["offset_x"] + c))
+
+    def test_writes_json_map(self):
+        frames = [self._frame(1, 1, 2, 2, "#000000"), self._frame(0, 0, 3, 3, "#0000FF")]
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path = write_sprite_atlas(os.path.join(tmp, "hero.png"), frames, scale=2)
+            with open(json_path) as f: atlas = json.load(f)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "hero.png")))
+        self.assertEqual(atlas["image"], "hero.png")
+        self.assertEqual(atlas["frame_size"], {"w": 32, "h": 32})
+        self.assertEqual((atlas["frames"]["0"]["w"], atlas["frames"]["0"]["offset_x"]), (4, 2))
+
+
+from image_export import downscale_rgba, read_rgba
+from quantize import median_cut, quantize
+
+class TestImageImport(unittest.TestCase):
+
+    # --- TEST 20: IMAGE IMPORT + QUANTIZATION ---
+    RED, DARK_RED, BLUE, CLEAR = b"\xff\x00\x00\xff", b"\xc0\x10\x10\xff", b"\x00\x00\xff\xff", b"\x00\x00\x00\x00"
+
+    def test_quantize_modes(self):
+        rows = [self.RED + self.DARK_RED + self.BLUE, self.CLEAR + self.BLUE + self.BLUE]
+        exact = quantize(3, 2, rows, colors=None)
+        self.assertEqual(exact.row(0), ["#FF0000", "#C01010", "#0000FF"])
+        self.assertEqual(exact.get(1, 0), EMPTY_COLOR)
+
+        matched = quantize(3, 2, rows, palette=["#000000", "#EE0000", "#0000AA"])
+        self.assertEqual(matched.row(0), ["#EE0000", "#EE0000", "#0000AA"])
+
+        reduced = quantize(3, 2, rows, colors=2)
+        self.assertEqual(len(reduced.used_colors()), 2)
+        self.assertEqual(reduced.get(0, 0), reduced.get(0, 1)) # The two reds merge
+        self.assertEqual(reduced.get(1, 2), "#0000FF")
+
+    def test_median_cut_splits_the_widest_channel(self):
+        histogram = [(0, 0, 0, 5), (10, 0, 0, 5), (251, 0, 0, 1), (255, 0, 0, 1)]
+        self.assertEqual(sorted(median_cut(histogram, 2)), ["#050000", "#FD0000"])
+
+    def test_reads_ppm_and_png(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            ppm = os.path.join(tmp, "a.ppm")
+            with open(ppm, "wb") as f:
+                f.write(b"P6\n# made by hand\n2 1\n255\n" + b"\xff\x00\x00\x00\x00\xff")
+            self.assertEqual(read_rgba(ppm), (2, 1, [self.RED + self.BLUE]))
+            ascii_pgm = os.path.join(tmp, "a.pgm")
+            with open(ascii_pgm, "wb") as f: f.write(b"P2 2 1 15 15 0")
+            self.assertEqual(read_rgba(ascii_pgm)[2], [b"\xff\xff\xff\xff\x00\x00\x00\xff"])
+
+            buf = PixelBuffer(2, 2)
+            buf.set(0, 1, "#FF0000")
+            png = os.path.join(tmp, "a.png")
+            write_png(png, buf, scale=2, transparent=True)
+            width, height, rows = downscale_rgba(*read_rgba(png), 2)
+            self.assertEqual((width, height), (2, 2))
+            self.assertEqual(rows[0], b"\xff\xff\xff\x00" + self.RED) # EMPTY_COLOR, transparent
+
+
+import benchmarks
+
+class TestBenchmarks(unittest.TestCase):
+
+    # --- TEST 21: BENCHMARK SUITE ---
+    def test_compare_flags_regressions(self):
+        baseline = {"a": {"best": 1.0}, "b": {"best": 1.0}}
+        results = {"a": {"best": 1.1}, "b": {"best": 1.5}, "new": {"best": 9.0}}
+        self.assertEqual([r[0] for r in benchmarks.compare(results, baseline)], ["b"])
+
+    def test_fast_cases_are_timed_in_batches(self):
+        calls = []
+        with mock.patch.object(benchmarks, "MIN_TIME", 0.02):
+            best, mean, runs = benchmarks.time_case(lambda: calls.append(None))
+        self.assertLessEqual(runs, len(calls)) # Calibration calls are not timed samples
+        self.assertGreater(runs, benchmarks.MAX_RUNS) # Not stopped after MAX_RUNS single calls
+        self.assertLessEqual(best, mean)
+
+    def test_runs_and_compares_against_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "bench.json")
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(benchmarks.main(["--quick", "--only", "line_pixels", "--out", out]), 0)
+            with open(out) as f: report = json.load(f)
+            self.assertEqual(sorted(report["results"]), ["line_pixels[256x256]", "line_pixels[32x32]"])
+
+            for entry in report["results"].values(): entry["best"] /= 100 # A much faster "past"
+            with open(out, "w") as f: json.dump(report, f)
+            with contextlib.redirect_stdout(io.StringIO()) as log:
+                self.assertEqual(benchmarks.main(["--quick", "--only", "line_pixels", "--compare", out]), 1)
+            self.assertIn("2 regression(s)", log.getvalue())
+
+
+from types import SimpleNamespace
+from tracing import LatencyTracer, percentile
+
+class TestLatencyTracer(unittest.TestCase):
+
+    # --- TEST 22: LATENCY TRACING ---
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 50), percentile(values, 99)), (51, 100))
+        self.assertIsNone(percentile([], 95))
+
+    def test_events_settle_at_flush(self):
+        tracer = LatencyTracer(capacity=16)
+        for _ in range(3): # Three drags painted by one flush
+            tracer.end_event("drag", tracer.begin_event(SimpleNamespace(time=1000)), awaiting_flush=True)
+        tracer.count_ops(4)
+        tracer.flushed(tracer.now(), (0, 0, 1, 1))
+        tracer.end_event("release", tracer.begin_event(), awaiting_flush=False) # Changed nothing
+
+        summary = tracer.summary()
+        self.assertEqual((summary["events"], summary["coalesced"], summary["idle"]), (4, 2, 1))
+        self.assertEqual(len(tracer.latencies), 3)
+        self.assertAlmostEqual(summary["ops_per_event"], 4 / 3)
+        self.assertGreaterEqual(summary["p50_ms"], 0)
+        self.assertEqual(len(tracer.summary_lines()), 4)
+
+    def test_ring_buffer_and_dump(self):
+        tracer = LatencyTracer(capacity=4)
+        for i in range(10):
+            tracer.span("tool", f"t{i}", tracer.now())
+        self.assertEqual([r[1] for r in tracer.records], ["t6", "t7", "t8", "t9"])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            tracer.dump(path)
+            with open(path) as f: trace = json.load(f)
+        self.assertEqual(len(trace["spans"]), 4)
+        self.assertEqual(trace["spans"][0]["start_ms"], 0)
+        self.assertIn("p95_ms", trace["summary"])
+
+
+from algorithms import get_polyline_pixels
+from tools.eraser import EraserTool
+
+class TestStrokeCoalescing(unittest.TestCase):
+
+    # --- TEST 23: COALESCED BRUSH STROKES ---
+    def test_polyline_has_no_gaps_or_repeats(self):
+        points = [(0, 0), (0, 5), (0, 5), (6, 2), (0, 0)]
+        cells = get_polyline_pixels(points)
+        self.assertEqual(len(cells), len(set(cells)))
+        self.assertEqual(cells[:6], [(0, c) for c in range(6)])
+        for a, b in zip(points, points[1:]):
+            self.assertTrue(set(get_line_pixels(*a, *b)) <= set(cells))
+        self.assertEqual(get_polyline_pixels([(3, 3)]), [(3, 3)])
+
+    def test_stroke_matches_per_event_drags(self):
+        points = [(1, 1), (1, 7), (6, 7), (2, 3), (8, 0)]
+        frames = []
+        for coalesced in (False, True):
+            doc = Document(rows=10, cols=10)
+            frame = doc.add_frame()
+            frame.mirror_x = True
+            doc.active_color = "#FF0000"
+            brush = BrushTool(doc)
+            brush.on_click(frame, 0, 0)
+            if coalesced:
+                brush.on_stroke(frame, points)
+            else:
+                for r, c in points: brush.on_drag(frame, r, c)
+            brush.on_release(frame)
+            frames.append(frame)
+        self.assertEqual(frames[0].pixels.data, frames[1].pixels.data)
+        self.assertEqual(frames[1].pixels.get(8, 9), "#FF0000") # Mirrored end point
+
+    def test_batch_invalidates_changed_bounds_once(self):
+        doc = Document(rows=10, cols=10)
+        frame = doc.add_frame()
+        frame.pixels.set(2, 2, "#00FF00")
+        frame.preview_dirty = None
+        calls = []
+        frame.invalidate = lambda *rect: calls.append(rect)
+        eraser = EraserTool(doc)
+        eraser.prev_pos = (2, 0)
+        eraser.on_stroke(frame, [(2, 4), (5, 4)])
+        self.assertEqual(calls, [(2, 2, 2, 2)]) # Only the one cell that changed
+        self.assertEqual(frame.pixels.get(2, 2), EMPTY_COLOR)
+        eraser.on_stroke(frame, [(9, 9)])
+        self.assertEqual(len(calls), 1) # Nothing changed, nothing invalidated
+
+
+from renderer import RasterRenderer, ZoomBudget, max_zoom, zoom_step
+from settings import ZOOM_CACHE_PIXELS, ZOOM_LEVELS
+
+class TestZoomLevels(unittest.TestCase):
+
+    # --- TEST 24: ZOOM STEPS ---
+    def test_zoom_step(self):
+        self.assertEqual(zoom_step(4, 1), 6)
+        self.assertEqual(zoom_step(5, 1), 6)   # A fitted size between levels
+        self.assertEqual(zoom_step(5, -1), 4)
+        self.assertEqual(zoom_step(4, -2), 2)
+        self.assertEqual(zoom_step(ZOOM_LEVELS[-1], 1), ZOOM_LEVELS[-1])
+        self.assertEqual(zoom_step(1, -1), 1)
+
+    def test_max_zoom_fits_cache(self):
+        for rows, cols in ((16, 16), (1024, 1024), (4096, 4096)):
+            ps = max_zoom(rows, cols)
+            self.assertTrue(ps == 1 or rows * cols * ps * ps <= ZOOM_CACHE_PIXELS)
+            self.assertGreater(rows * cols * (ps + 1) ** 2, ZOOM_CACHE_PIXELS)
+
+    def test_budget_is_shared_by_all_renderers(self):
+        budget = ZoomBudget(limit_pixels=100 * 100 * 40)
+        tabs = []
+        for shown in ((2, 4), (3, 6)): # (older level, selected level) per tab
+            renderer = RasterRenderer(None)
+            renderer.size, renderer.pixel_size = (100, 100), shown[1]
+            for ps in shown:
+                renderer.levels[ps] = [None, None, None, budget.tick()]
+            budget.renderers.add(renderer)
+            tabs.append(renderer)
+        self.assertEqual(budget.used_pixels(), 100 * 100 * (2 + 4 + 16 + 9 + 36))
+        budget.evict()
+        # The oldest unselected levels go first, across tabs; selected ones stay
+        self.assertEqual([sorted(r.levels) for r in tabs], [[4], [6]])
+        self.assertTrue(budget.over_limit()) # Left to EditorTab, which releases hidden views
+
+
+from document import Layer
+from project_format import ProjectReader
+
+class TestLayers(unittest.TestCase):
+
+    # --- TEST 25: LAYER STACK AND CACHED COMPOSITE ---
+    def _layered_frame(self):
+        doc = Document(rows=6, cols=6)
+        frame = doc.add_frame()
+        frame.paint_pixels([(r, 0) for r in range(6)], "#FF0000")   # Layer 1: left column
+        frame.add_layer()
+        frame.paint_pixels([(0, c) for c in range(6)], "#0000FF")   # Layer 2: top row
+        return doc, frame
+
+    def test_single_layer_is_its_own_composite(self):
+        frame = Document(rows=3, cols=3).add_frame()
+        self.assertIs(frame.composite, frame.pixels)
+        frame.set_layer_visible(0, False)
+        self.assertEqual(frame.composite.get(0, 0), EMPTY_COLOR)
+        self.assertIsNot(frame.composite, frame.pixels)
+
+    def test_composite_order_and_visibility(self):
+        doc, frame = self._layered_frame()
+        self.assertEqual(len(frame.layers), 2)
+        self.assertEqual(frame.active_layer, 1)
+        self.assertEqual(frame.pixels.get(1, 0), EMPTY_COLOR) # Tools only see the active layer
+        self.assertEqual((frame.composite.get(0, 0), frame.composite.get(3, 0)), ("#0000FF", "#FF0000"))
+
+        frame.move_layer(1, -1) # Blue row below the red column
+        self.assertEqual(frame.composite.get(0, 0), "#FF0000")
+        self.assertEqual(frame.active_layer, 0)
+        frame.set_layer_visible(1, False)
+        self.assertEqual((frame.composite.get(0, 0), frame.composite.get(0, 3)), ("#0000FF", "#0000FF"))
+        self.assertEqual(frame.composite.get(3, 0), EMPTY_COLOR)
+        self.assertEqual(frame.get_flattened_data().get(0, 3), "#0000FF")
+
+        frame.remove_layer(0)
+        self.assertEqual(len(frame.layers), 1)
+        self.assertEqual(frame.composite.get(0, 3), EMPTY_COLOR) # Only the hidden red layer is left
+
+    def test_composite_recomputed_only_in_dirty_rect(self):
+        doc, frame = self._layered_frame()
+        frame.composite
+        with mock.patch.object(PixelBuffer, "overlay_from", autospec=True,
+                               side_effect=PixelBuffer.overlay_from) as overlay:
+            frame.paint_pixel(4, 4, "#00FF00")
+            self.assertEqual(frame.composite.get(4, 4), "#00FF00")
+            frame.composite # Clean: nothing to redo
+        self.assertEqual(overlay.call_count, 1)
+        self.assertEqual(overlay.call_args[0][2:], (4, 4, 4, 4))
+
+    def test_undo_is_per_layer(self):
+        doc, frame = self._layered_frame()
+        frame.save_state()
+        frame.paint_pixel(5, 5, "#00FF00")
+        frame.select_layer(0)
+        frame.perform_undo() # Layer 1's own history is empty
+        self.assertEqual(frame.composite.get(5, 5), "#00FF00")
+        frame.select_layer(1)
+        frame.perform_undo()
+        self.assertEqual(frame.composite.get(5, 5), EMPTY_COLOR)
+
+    def test_pxp_keeps_layers_and_folder_flattens(self):
+        doc, frame = self._layered_frame()
+        frame.set_layer_locked(0, True)
+        doc.add_frame().paint_pixel(2, 2, "#00FF00") # A plain frame in between
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "layers.pxp")
+            doc.save(path)
+            reader = ProjectReader(path)
+            self.assertEqual(len(reader), 2)
+            self.assertEqual(reader.read_frame(0).get(0, 0), "#0000FF") # Entries hold the composite
+            reader.close()
+
+            loaded = Document.load(path)
+            first = loaded.frames[0]
+            self.assertEqual([(l.name, l.locked) for l in first.layers], [("Layer 1", True), ("Layer 2", False)])
+            self.assertEqual(first.layers[0].pixels.get(0, 0), "#FF0000")
+            self.assertEqual(len(loaded.frames[1].layers), 1)
+            loaded.save() # Re-save with layers still undecoded
+            loaded.close()
+            again = Document.load(path)
+            self.assertEqual(again.frames[0].composite.get(3, 0), "#FF0000")
+            again.close()
+
+            folder = os.path.join(tmp, "flat")
+            doc.save(folder)
+            flat = Document.load(folder)
+            self.assertEqual(len(flat.frames[0].layers), 1)
+            self.assertEqual(flat.frames[0].pixels.get(0, 0), "#0000FF")
+
+    def test_resize_is_not_undone_per_layer(self):
+        doc = Document(rows=10, cols=10)
+        frame = doc.add_frame()
+        frame.save_state()
+        frame.paint_pixel(0, 0, "#FF0000")
+        doc.rows = doc.cols = 6 # As the editor's grid settings do
+        frame.resize(6, 6)
+        frame.add_layer()
+        frame.save_state()
+        frame.paint_pixel(5, 5, "#00FF00")
+        frame.select_layer(0)
+        frame.perform_undo() # Nothing left to undo on layer 0: the resize belongs to the whole frame
+        self.assertEqual([(l.pixels.rows, l.pixels.cols) for l in frame.layers], [(6, 6), (6, 6)])
+        self.assertEqual((frame.rows, frame.cols), (6, 6))
+        self.assertEqual(frame.composite.get(5, 5), "#00FF00")
+        self.assertEqual(frame.composite.get(0, 0), "#FF0000")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "resized.pxp")
+            doc.save(path)
+            loaded = Document.load(path)
+            self.assertEqual(loaded.frames[0].composite.get(5, 5), "#00FF00")
+            loaded.close()
+
+    def test_resize_and_duplicate(self):
+        doc, frame = self._layered_frame()
+        frame.resize(3, 8)
+        self.assertEqual([(l.pixels.rows, l.pixels.cols) for l in frame.layers], [(3, 8), (3, 8)])
+        self.assertEqual(frame.composite.cols, 8)
+        copy = doc.add_frame()
+        copy.copy_layers_from(frame)
+        copy.paint_pixel(2, 7, "#00FF00")
+        self.assertEqual(frame.composite.get(2, 7), EMPTY_COLOR)
+        self.assertEqual(copy.composite.get(0, 0), "#0000FF")
+
+
+from onion import OnionSkins, fade, onion_sources
+from settings import ONION_ALPHA
+
+class TestOnionSkins(unittest.TestCase):
+
+    # --- TEST 26: PRECOMPUTED ONION SKINS ---
+    def _frames(self, count=5, size=6):
+        frames = []
+        for i in range(count):
+            buf = PixelBuffer(size, size)
+            buf.set(i % size, i % size, f"#{i * 40:02X}0000")
+            buf.set(0, size - 1 - i % size, "#0000FF")
+            frames.append(buf)
+        return frames
+
+    def _naive(self, frames, i, sources):
+        """Reference: each cell takes the last source in drawing order with a pixel."""
+        skin = PixelBuffer(frames[i].rows, frames[i].cols)
+        for r in range(skin.rows):
+            for c in range(skin.cols):
+                for j, strength in sources:
+                    if frames[j].get(r, c) != EMPTY_COLOR:
+                        skin.set(r, c, fade(frames[j].get(r, c), strength))
+        return skin
+
+    def _assert_skins(self, skins, frames):
+        for i, skin in enumerate(skins.skins):
+            expected = self._naive(frames, i, skins.sources[i])
+            self.assertEqual(skin.to_grid(), expected.to_grid(), f"frame {i}")
+
+    def test_sources(self):
+        self.assertEqual(onion_sources(0, 4, "prev"), [(3, ONION_ALPHA)])
+        self.assertEqual(onion_sources(1, 1, "all"), [])
+        self.assertEqual([j for j, _ in onion_sources(1, 4, "all")], [3, 2, 0]) # Frame 0 on top
+        window = onion_sources(5, 10, "range", 2, 1)
+        self.assertEqual([j for j, _ in window], [3, 6, 4]) # Nearest last
+        self.assertEqual(window[-1][1], ONION_ALPHA)
+        self.assertLess(window[0][1], window[-1][1])
+        self.assertEqual(sorted(j for j, _ in onion_sources(0, 3, "range", 4, 4)), [1, 2]) # No repeats
+        self.assertEqual(fade("#000000", 0.5), "#808080")
+
+    def test_modes_match_reference(self):
+        frames = self._frames()
+        for mode in ("prev", "all", "range"):
+            skins = OnionSkins()
+            skins.configure(frames, mode, 2, 1)
+            self._assert_skins(skins, frames)
+
+    def test_incremental_update(self):
+        frames = self._frames()
+        for mode in ("prev", "all", "range"):
+            skins = OnionSkins()
+            skins.configure(frames, mode, 1, 1)
+            frames[2].set(4, 1, "#00FF00")
+            frames[2].set(2, 2, EMPTY_COLOR)
+            changed = skins.frame_changed(frames, 2, (2, 1, 4, 2))
+            self.assertNotIn(2, changed)
+            self.assertEqual(sorted(changed), [i for i in range(5) if any(j == 2 for j, _ in skins.sources[i])])
+            self._assert_skins(skins, frames)
+
+
+from animation_preview import color_runs
+
+class TestPreviewFrameImages(unittest.TestCase):
+
+    # --- TEST 27: PREVIEW IMAGE RUNS ---
+    def test_color_runs(self):
+        buf = PixelBuffer(3, 6)
+        for c, color in ((0, "#FF0000"), (1, "#00FF00"), (4, "#0000FF"), (5, "#0000FF")):
+            buf.set(1, c, color)
+        self.assertEqual(list(color_runs(buf, 0, 0, 2, 5)),
+                         [(1, 0, ["#FF0000", "#00FF00"]), (1, 4, ["#0000FF", "#0000FF"])])
+        self.assertEqual(list(color_runs(buf, 1, 1, 1, 4)), [(1, 1, ["#00FF00"]), (1, 4, ["#0000FF"])])
+        self.assertEqual(list(color_runs(buf, 2, 0, 2, 5)), []) # Empty cells stay transparent
+
 
 if __name__ == '__main__':
     print("Running All Logic Tests...")
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -4,6 +4,11 @@ class Tool:
     """
     Abstract base class for all tools.
     """
+    # True: the tab queues drag motion and hands it to on_stroke once per idle tick
+    coalesce_motion = False
+    # False for tools that never change pixels (they still work on locked layers)
+    edits_layer = True
+
     def __init__(self, app_ref):
         self.app = app_ref
 
@@ -15,6 +20,11 @@ class Tool:
         """Called when the mouse is dragged (B1-Motion)."""
         pass
 
-    def on_release(self, tab, event=None):
-        """Called when the mouse is released."""
+    def on_stroke(self, tab, points, event=None):
+        """Called with the (r, c) cells of several coalesced drag events."""
+        for r, c in points:
+            self.on_drag(tab, r, c, event)
+
+    def on_release(self, tab, r=None, c=None, event=None):
+        """Called when the mouse is released, with the cell under it (None if unknown)."""
         pass
\ No newline at end of file
@@ -1,30 +1,30 @@
 # tools/brush.py
 from tools.base import Tool
+from algorithms import get_polyline_pixels
 
 class BrushTool(Tool):
+    coalesce_motion = True
+
     def __init__(self, app_ref):
         super().__init__(app_ref)
         self.prev_pos = None
 
     def on_click(self, tab, r, c, event=None):
-        self.app.active_tab().save_state()
+        tab.save_state()
         self.paint(tab, r, c)
         self.prev_pos = (r, c)
 
     def on_drag(self, tab, r, c, event=None):
-        # (Same interpolation logic as before, just calling self.paint)
-        if self.prev_pos:
-            pr, pc = self.prev_pos
-            if (pr, pc) != (r, c):
-                from algorithms import get_line_pixels
-                pixels = get_line_pixels(pr, pc, r, c)
-                for lr, lc in pixels:
-                    self.paint(tab, lr, lc)
-        else:
-            self.paint(tab, r, c)
-        self.prev_pos = (r, c)
+        self.on_stroke(tab, [(r, c)], event)
+
+    def on_stroke(self, tab, points, event=None):
+        # One batch for the whole polyline from the last position
+        start = [self.prev_pos] if self.prev_pos else []
+        tab.paint_pixels(get_polyline_pixels(start + points), self.app.active_color)
+        tab.app.notify_preview()
+        self.prev_pos = points[-1]
 
-    def on_release(self, tab, event=None):
+    def on_release(self, tab, r=None, c=None, event=None):
         self.prev_pos = None
 
     def paint(self, tab, r, c):
@@ -1,20 +1,26 @@
 # tools/bucket.py
 from tools.base import Tool
-from algorithms import get_connected_pixels
 
 class BucketTool(Tool):
     def on_click(self, tab, r, c, event=None):
-        self.app.active_tab().save_state()
-        
+        if not tab.pixels.in_bounds(r, c): return
         target_color = self.app.active_color
-        current_color = tab.grid_data[r][c]
-        
-        if current_color == target_color: return
+        current_color = tab.pixels.get(r, c)
+
+        # Near matches (tolerance) and other regions (global) may still need the color
+        if current_color == target_color and self.app.fill_tolerance == 0 and self.app.fill_contiguous:
+            return
+
+        tab.save_state()
         
-        pixels = get_connected_pixels(tab.grid_data, r, c)
+        pixels, bounds = tab.find_region(r, c,
+                                         connectivity=self.app.fill_connectivity,
+                                         tolerance=self.app.fill_tolerance,
+                                         contiguous=self.app.fill_contiguous)
+        if not pixels: return
         
-        for pr, pc in pixels:
-            tab.grid_data[pr][pc] = target_color
-            
-        tab.draw_grid_lines()
+        tab.pixels.fill_pixels(pixels, target_color)
+
+        # Repaint only the filled area
+        tab.invalidate(*bounds)
         tab.app.notify_preview()
\ No newline at end of file
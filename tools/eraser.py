@@ -1,30 +1,30 @@
 # tools/eraser.py
 from tools.base import Tool
+from algorithms import get_polyline_pixels
 from settings import EMPTY_COLOR
 
 class EraserTool(Tool):
+    coalesce_motion = True
+
     def __init__(self, app_ref):
         super().__init__(app_ref)
         self.prev_pos = None
 
     def on_click(self, tab, r, c, event=None):
-        self.app.active_tab().save_state()
+        tab.save_state()
         self.erase(tab, r, c)
         self.prev_pos = (r, c)
 
     def on_drag(self, tab, r, c, event=None):
-        if self.prev_pos:
-            pr, pc = self.prev_pos
-            if (pr, pc) != (r, c):
-                from algorithms import get_line_pixels
-                pixels = get_line_pixels(pr, pc, r, c)
-                for lr, lc in pixels:
-                    self.erase(tab, lr, lc)
-        else:
-            self.erase(tab, r, c)
-        self.prev_pos = (r, c)
+        self.on_stroke(tab, [(r, c)], event)
+
+    def on_stroke(self, tab, points, event=None):
+        start = [self.prev_pos] if self.prev_pos else []
+        tab.paint_pixels(get_polyline_pixels(start + points), EMPTY_COLOR)
+        tab.app.notify_preview()
+        self.prev_pos = points[-1]
 
-    def on_release(self, tab, event=None):
+    def on_release(self, tab, r=None, c=None, event=None):
         self.prev_pos = None
 
     def erase(self, tab, r, c):
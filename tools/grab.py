@@ -2,6 +2,8 @@
 from tools.base import Tool
 
 class GrabTool(Tool):
+    edits_layer = False
+
     def on_click(self, tab, r, c, event=None):
         # Start the scan (scroll)
         tab.canvas.scan_mark(event.x, event.y)
@@ -6,6 +6,7 @@ class LineTool(Tool):
     def __init__(self, app_ref):
         super().__init__(app_ref)
         self.start_pos = None
+        self.end_pos = None
         # Stores the set of (r, c) tuples currently highlighted in the preview
         self.prev_pixels = set()
 
@@ -22,29 +23,18 @@ class LineTool(Tool):
         if not self.start_pos: return
         self.update_preview(tab, r, c)
 
-    def on_release(self, tab, event=None):
+    def on_release(self, tab, r=None, c=None, event=None):
         if not self.start_pos: return
 
         # 1. VISUAL CLEANUP: Restore the grid's visual state completely
         # We revert every pixel we touched back to its "true" data color.
         # This prevents "ghost" pixels from getting stuck if the line moved slightly.
         for (pr, pc) in self.prev_pixels:
-            if (pr, pc) in tab.rects:
-                original_color = tab.grid_data[pr][pc]
-                tab.canvas.itemconfig(tab.rects[(pr, pc)], fill=original_color)
+            tab.draw_pixel(pr, pc)
         
         # 2. DATA COMMIT: Calculate the final line and write it to the grid logic
-        # We use the event coordinates for precision if available
-        if event:
-            canvas_x = tab.canvas.canvasx(event.x)
-            canvas_y = tab.canvas.canvasy(event.y)
-            end_c = int(canvas_x // tab.pixel_size)
-            end_r = int(canvas_y // tab.pixel_size)
-        else:
-            # Fallback (rare)
-            # We can't trust r/c passed in args because on_release might be out of bounds
-            # But usually event is present.
-            return 
+        # The release cell (may be out of bounds; paint_pixel clips), else the last previewed end
+        end_r, end_c = (r, c) if r is not None else self.end_pos
 
         sr, sc = self.start_pos
         pixels = get_line_pixels(sr, sc, end_r, end_c)
@@ -56,6 +46,7 @@ class LineTool(Tool):
 
         # Cleanup
         self.start_pos = None
+        self.end_pos = None
         self.prev_pixels = set()
         tab.app.notify_preview()
 
@@ -64,6 +55,7 @@ class LineTool(Tool):
         Calculates the line, applies symmetry, and efficiently updates 
         ONLY the pixels that differ from the last frame.
         """
+        self.end_pos = (end_r, end_c)
         sr, sc = self.start_pos
         raw_pixels = get_line_pixels(sr, sc, end_r, end_c)
         
@@ -94,17 +86,14 @@ class LineTool(Tool):
 
         color = self.app.active_color
 
-        # 4. UPDATE CANVAS
+        # 4. UPDATE CANVAS IMAGE
         # Turn ON
         for (r, c) in to_draw:
-            if (r, c) in tab.rects:
-                tab.canvas.itemconfig(tab.rects[(r, c)], fill=color)
+            tab.draw_pixel(r, c, color)
         
-        # Turn OFF (Restore to what is actually in grid_data)
+        # Turn OFF (Restore to what is actually in the pixel buffer)
         for (r, c) in to_clear:
-            if (r, c) in tab.rects:
-                original_color = tab.grid_data[r][c]
-                tab.canvas.itemconfig(tab.rects[(r, c)], fill=original_color)
+            tab.draw_pixel(r, c)
 
         # 5. Store state for next frame
         self.prev_pixels = valid_pixels
\ No newline at end of file
@@ -2,9 +2,11 @@
 from tools.base import Tool
 
 class EyedropperTool(Tool):
+    edits_layer = False
+
     def on_click(self, tab, r, c, event=None):
         if 0 <= r < tab.rows and 0 <= c < tab.cols:
-            picked_color = tab.grid_data[r][c]
+            picked_color = tab.composite.get(r, c) # The color on screen, from any layer
             
             # Update the main app state with the new color
             self.app.set_active_color(picked_color)
@@ -27,7 +27,7 @@ class SelectTool(Tool):
             if 0 <= r < tab.rows and 0 <= c < tab.cols:
                 tab.sel_start = (r, c)
                 tab.sel_end = (r, c)
-                tab.draw_grid_lines()
+                tab.draw_selection_overlay()
 
     def on_drag(self, tab, r, c, event=None):
         if self.mode == "move":
@@ -47,7 +47,6 @@ class SelectTool(Tool):
                     delta_c = new_fc - tab.floating_offset[1]
                     
                     tab.visual_move_selection(delta_r, delta_c)
-                    tab.floating_offset = (new_fr, new_fc)
                     tab.app.notify_preview()
                 
         elif self.mode == "box":
@@ -56,9 +55,9 @@ class SelectTool(Tool):
                 c = max(0, min(tab.cols - 1, c))
                 
                 tab.sel_end = (r, c)
-                tab.draw_grid_lines()
+                tab.draw_selection_overlay()
 
-    def on_release(self, tab, event=None):
+    def on_release(self, tab, r=None, c=None, event=None):
         self.mode = "none"
         self.drag_start_ref = None
         self.drag_orig_offset = None
\ No newline at end of file
@@ -9,6 +9,7 @@ class ShapeTool(Tool):
     def __init__(self, app_ref):
         super().__init__(app_ref)
         self.start_pos = None
+        self.end_pos = None
         self.prev_pixels = set()
         self.shape_type = "rect" # 'rect' or 'ellipse'
 
@@ -23,23 +24,15 @@ class ShapeTool(Tool):
         if not self.start_pos: return
         self.update_preview(tab, r, c)
 
-    def on_release(self, tab, event=None):
+    def on_release(self, tab, r=None, c=None, event=None):
         if not self.start_pos: return
         
         # 1. VISUAL CLEANUP (Revert highlighted pixels)
         for (pr, pc) in self.prev_pixels:
-            if (pr, pc) in tab.rects:
-                original_color = tab.grid_data[pr][pc]
-                tab.canvas.itemconfig(tab.rects[(pr, pc)], fill=original_color)
+            tab.draw_pixel(pr, pc)
                 
-        # 2. CALCULATE FINAL SHAPE
-        if event:
-            canvas_x = tab.canvas.canvasx(event.x)
-            canvas_y = tab.canvas.canvasy(event.y)
-            end_c = int(canvas_x // tab.pixel_size)
-            end_r = int(canvas_y // tab.pixel_size)
-        else:
-            return
+        # 2. CALCULATE FINAL SHAPE (at the release cell, else the last previewed end)
+        end_r, end_c = (r, c) if r is not None else self.end_pos
 
         sr, sc = self.start_pos
         pixels = self._get_shape_pixels(sr, sc, end_r, end_c)
@@ -50,10 +43,12 @@ class ShapeTool(Tool):
             tab.paint_pixel(r, c, color)
             
         self.start_pos = None
+        self.end_pos = None
         self.prev_pixels = set()
         tab.app.notify_preview()
 
     def update_preview(self, tab, end_r, end_c):
+        self.end_pos = (end_r, end_c)
         sr, sc = self.start_pos
         raw_pixels = self._get_shape_pixels(sr, sc, end_r, end_c)
         
@@ -73,12 +68,10 @@ class ShapeTool(Tool):
         color = self.app.active_color
 
         for (r, c) in to_draw:
-            if (r, c) in tab.rects:
-                tab.canvas.itemconfig(tab.rects[(r, c)], fill=color)
+            tab.draw_pixel(r, c, color)
         
         for (r, c) in to_clear:
-            if (r, c) in tab.rects:
-                tab.canvas.itemconfig(tab.rects[(r, c)], fill=tab.grid_data[r][c])
+            tab.draw_pixel(r, c)
 
         self.prev_pixels = valid_pixels
 
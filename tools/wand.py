@@ -1,7 +1,6 @@
 # tools/wand.py
 from tools.base import Tool
 from settings import EMPTY_COLOR
-from algorithms import get_connected_pixels
 
 class MagicWandTool(Tool):
     def __init__(self, app_ref):
@@ -18,18 +17,18 @@ class MagicWandTool(Tool):
         tab.commit_selection()
         
         if not (0 <= r < tab.rows and 0 <= c < tab.cols): return
-        if tab.grid_data[r][c] == EMPTY_COLOR: return
+        if tab.pixels.get(r, c) == EMPTY_COLOR: return
 
         tab.save_state()
 
-        selected_pixels = get_connected_pixels(tab.grid_data, r, c)
+        selected_pixels, bounds = tab.find_region(r, c,
+                                                  connectivity=self.app.fill_connectivity,
+                                                  tolerance=self.app.fill_tolerance,
+                                                  contiguous=self.app.fill_contiguous)
         
         if not selected_pixels: return
 
-        min_r = min(p[0] for p in selected_pixels)
-        max_r = max(p[0] for p in selected_pixels)
-        min_c = min(p[1] for p in selected_pixels)
-        max_c = max(p[1] for p in selected_pixels)
+        min_r, min_c, max_r, max_c = bounds
         
         tab.floating_pixels = {}
         tab.floating_offset = (min_r, min_c)
@@ -37,15 +36,16 @@ class MagicWandTool(Tool):
         for pr, pc in selected_pixels:
             rel_r = pr - min_r
             rel_c = pc - min_c
-            tab.floating_pixels[(rel_r, rel_c)] = tab.grid_data[pr][pc]
-            tab.grid_data[pr][pc] = EMPTY_COLOR 
+            tab.floating_pixels[(rel_r, rel_c)] = tab.pixels.get(pr, pc)
+        tab.pixels.fill_pixels(selected_pixels, EMPTY_COLOR)
             
         tab.sel_start = (min_r, min_c)
         tab.sel_end = (max_r, max_c)
         
         self.drag_start_ref = (r, c)
         self.drag_orig_offset = tab.floating_offset
-        tab.draw_grid_lines()
+        tab.invalidate(min_r, min_c, max_r, max_c)
+        tab.draw_selection_overlay()
 
     def on_drag(self, tab, r, c, event=None):
         # --- LAG FIX: USE VISUAL MOVE ---
@@ -62,9 +62,8 @@ class MagicWandTool(Tool):
                 delta_c = new_fc - tab.floating_offset[1]
                 
                 tab.visual_move_selection(delta_r, delta_c)
-                tab.floating_offset = (new_fr, new_fc)
                 tab.app.notify_preview()
 
-    def on_release(self, tab, event=None):
+    def on_release(self, tab, r=None, c=None, event=None):
         self.drag_start_ref = None
         self.drag_orig_offset = None
\ No newline at end of file
@@ -0,0 +1,133 @@
+# tracing.py
+# Input-to-pixel latency tracing. Timestamps mouse events, tool handlers,
+# render flushes and preview syncs into a ring buffer, and summarizes them
+# for the on-canvas HUD. Call sites check `tracer.enabled` first, so a
+# disabled tracer costs one attribute lookup.
+import json
+import time
+from collections import deque
+from settings import TRACE_CAPACITY
+
+def percentile(values, p):
+    """Nearest-rank percentile of a sequence (None if it is empty)."""
+    if not values: return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+class LatencyTracer:
+    """
+    Records (kind, name, start, end, detail) spans: kind is "event", "tool",
+    "flush" or "preview"; times are time.perf_counter() seconds.
+
+    An input event whose handler left cells to repaint stays pending until
+    the next render flush; its latency is flush end - event start. Events
+    painted directly (tool previews) end when their handler does, and
+    events that changed nothing on screen are counted as idle.
+    """
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.enabled = False
+        self.records = deque(maxlen=capacity)
+        self.latencies = deque(maxlen=capacity)    # Seconds, one per painted event
+        self.queue_delays = deque(maxlen=capacity) # Seconds an event waited before its handler ran
+        self.ops_per_event = deque(maxlen=capacity)
+        self.reset()
+
+    def reset(self):
+        self.records.clear()
+        self.latencies.clear()
+        self.queue_delays.clear()
+        self.ops_per_event.clear()
+        self.events = 0
+        self.coalesced = 0 # Events painted by a flush that also painted an earlier event
+        self.idle = 0      # Events that changed nothing on screen
+        self.ops = 0       # Image/canvas operations since the last event was settled
+        self._pending = [] # Start times of events waiting for a flush
+        self._clock_offset = None
+
+    def now(self):
+        return time.perf_counter()
+
+    def count_ops(self, n=1):
+        """Counts image/canvas operations (called by the renderer)."""
+        self.ops += n
+
+    # --- EVENTS ---
+    def begin_event(self, event=None):
+        """Returns the event's start time and records how long it sat in Tk's queue."""
+        start = time.perf_counter()
+        stamp = getattr(event, "time", None)
+        if isinstance(stamp, int) and stamp:
+            # Tk event times are in ms on another clock; the smallest offset
+            # seen is taken as "no delay", so the excess is time spent queued.
+            offset = start * 1000 - stamp
+            if self._clock_offset is None or offset < self._clock_offset:
+                self._clock_offset = offset
+            self.queue_delays.append((offset - self._clock_offset) / 1000)
+        return start
+
+    def end_event(self, name, start, awaiting_flush):
+        end = time.perf_counter()
+        self.events += 1
+        self.records.append(("event", name, start, end, None))
+        if awaiting_flush:
+            self._pending.append(start)
+        elif self.ops:
+            self.latencies.append(end - start)
+            self.ops_per_event.append(self.ops)
+            self.ops = 0
+        else:
+            self.idle += 1
+
+    def span(self, kind, name, start, detail=None):
+        self.records.append((kind, name, start, time.perf_counter(), detail))
+
+    def flushed(self, start, region=None):
+        """Called when a render flush finishes: settles every pending event."""
+        end = time.perf_counter()
+        self.records.append(("flush", "render", start, end, region))
+        pending = self._pending
+        if not pending: return
+        for event_start in pending:
+            self.latencies.append(end - event_start)
+        self.coalesced += len(pending) - 1
+        self.ops_per_event.append(self.ops / len(pending))
+        self.ops = 0
+        self._pending = []
+
+    # --- REPORTING ---
+    def summary(self):
+        """Latency percentiles (ms) and counters for the HUD and trace dumps."""
+        ms = [v * 1000 for v in self.latencies]
+        queued = [v * 1000 for v in self.queue_delays]
+        return {
+            "events": self.events,
+            "p50_ms": percentile(ms, 50),
+            "p95_ms": percentile(ms, 95),
+            "p99_ms": percentile(ms, 99),
+            "queue_p95_ms": percentile(queued, 95),
+            "coalesced": self.coalesced,
+            "idle": self.idle,
+            "ops_per_event": sum(self.ops_per_event) / len(self.ops_per_event) if self.ops_per_event else 0,
+        }
+
+    def summary_lines(self):
+        s = self.summary()
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"
+        return [
+            f"latency p50 {fmt(s['p50_ms'])}  p95 {fmt(s['p95_ms'])}  p99 {fmt(s['p99_ms'])} ms",
+            f"queued p95 {fmt(s['queue_p95_ms'])} ms",
+            f"events {s['events']}  coalesced {s['coalesced']}  idle {s['idle']}",
+            f"canvas ops/event {s['ops_per_event']:.1f}",
+        ]
+
+    def dump(self, path):
+        """Writes the summary and every buffered span as JSON (times in ms from the first span)."""
+        origin = self.records[0][2] if self.records else 0
+        spans = [{"kind": kind, "name": name, "start_ms": (start - origin) * 1000,
+                  "duration_ms": (end - start) * 1000, "detail": detail}
+                 for kind, name, start, end, detail in self.records]
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "spans": spans}, f, indent=2)
+
+# The tracer shared by the tabs, renderer and preview
+tracer = LatencyTracer()